@@ -2,11 +2,12 @@ import os
 import logging
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-# Configure logging for debugging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging (LOG_LEVEL=DEBUG logs every search)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 
 class Base(DeclarativeBase):
     pass
@@ -28,10 +29,36 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 # Initialize the app with the extension
 db.init_app(app)
 
+def upgrade_schema():
+    """Lightweight migration: add nullable columns and indexes that models gained after their table was created"""
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                with db.engine.begin() as conn:
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                logging.info(f"Added column {table.name}.{column.name}")
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
 with app.app_context():
     # Import models and routes
     import models  # noqa: F401
     import routes  # noqa: F401
     
+    # Request latency metrics, Server-Timing headers and optional slow-request profiles
+    from instrumentation import instrument_app
+    instrument_app(app)
+    
     # Create all database tables
     db.create_all()
+    upgrade_schema()
+
+# Optionally load the index in a background thread so the server answers (and /ready reports) right away
+if os.environ.get("INDEX_WARMUP", "0").lower() in ('1', 'true', 'on'):
+    from rag_pipeline import rag_pipeline
+    rag_pipeline.start_warmup(app)
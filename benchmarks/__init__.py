@@ -0,0 +1 @@
+"""Performance benchmarks for the RAG assistant (run with ``python -m benchmarks.<name>``)"""
@@ -0,0 +1,97 @@
+"""Recall@k, latency and memory of the approximate FAISS index modes against the flat baseline
+
+Usage: python -m benchmarks.bench_ann --vectors 100000 --dim 256
+"""
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from vector_store import build_faiss_index
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Gaussian blobs, which resemble embedding distributions better than uniform noise"""
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assignments = rng.integers(0, clusters, size=n)
+    vectors = centers[assignments] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors.astype(np.float32)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    hits = sum(len(set(row_found[:k]) & set(row_truth)) for row_found, row_truth in zip(found, truth))
+    return hits / truth.size
+
+
+def measure(index, queries: np.ndarray, k: int, params=None):
+    """Mean single-query latency in milliseconds and the result ids"""
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    start = time.perf_counter()
+    for i in range(len(queries)):
+        _, ids[i:i + 1] = index.search(queries[i:i + 1], k, params=params)
+    latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    return latency_ms, ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vectors', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=256)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--metric', choices=['l2', 'ip'], default='l2')
+    parser.add_argument('--nlist', type=int, default=1024)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--ef-search', type=int, nargs='+', default=[16, 64, 256])
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    data = synthetic_vectors(args.vectors, args.dim, clusters=max(16, args.vectors // 1000), rng=rng)
+    queries = data[rng.choice(len(data), args.queries, replace=False)] + \
+        0.1 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    if args.metric == 'ip':
+        faiss.normalize_L2(data)
+        faiss.normalize_L2(queries)
+    train = data[rng.choice(len(data), min(len(data), args.nlist * 39), replace=False)]
+
+    flat_latency = None
+    truth = None
+    configs = [('flat', None, [None]), ('ivf_flat', 'nprobe', args.nprobe),
+               ('ivf_pq', 'nprobe', args.nprobe), ('hnsw', 'efSearch', args.ef_search)]
+    for index_type, knob, values in configs:
+        index = build_faiss_index(index_type, args.dim, metric=args.metric, nlist=args.nlist)
+        start = time.perf_counter()
+        if not index.is_trained:
+            index.train(train)
+        index.add(data)
+        build_seconds = time.perf_counter() - start
+        memory_mb = faiss.serialize_index(index).nbytes / 1e6
+
+        for value in values:
+            params = None
+            if knob == 'nprobe':
+                params = faiss.SearchParametersIVF(nprobe=value)
+            elif knob == 'efSearch':
+                params = faiss.SearchParametersHNSW(efSearch=value)
+            latency_ms, ids = measure(index, queries, args.k, params)
+            if truth is None:
+                truth, flat_latency = ids, latency_ms
+            print(json.dumps({
+                'index': index_type,
+                knob or 'param': value,
+                'vectors': args.vectors,
+                'dim': args.dim,
+                f'recall@{args.k}': round(recall_at_k(ids, truth), 4),
+                'latency_ms': round(latency_ms, 3),
+                'speedup_vs_flat': round(flat_latency / latency_ms, 1),
+                'memory_mb': round(memory_mb, 1),
+                'build_s': round(build_seconds, 2)
+            }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Vectorized BM25 matrix vs. the posting-list walk: parity of the rankings and per-query latency
+
+Every query is ranked by both scorers; the run fails if any ranking differs
+beyond floating-point summation order.
+
+Usage: python -m benchmarks.bench_bm25_matrix --sizes 10000 100000 --batch 8
+"""
+import argparse
+import copy
+import json
+import math
+import sys
+import time
+from typing import List, Tuple
+
+from benchmarks.corpus import SyntheticCorpus
+from inverted_index import InvertedIndex
+
+
+def same_ranking(expected: List[Tuple[int, float]], actual: List[Tuple[int, float]]) -> bool:
+    """Equal scores position by position; documents may only differ where their scores tie"""
+    if len(expected) != len(actual):
+        return False
+    for (expected_doc, expected_score), (actual_doc, actual_score) in zip(expected, actual):
+        if not math.isclose(expected_score, actual_score, rel_tol=1e-9):
+            return False
+        if expected_doc != actual_doc and not any(doc == actual_doc and math.isclose(score, actual_score, rel_tol=1e-9)
+                                                  for doc, score in expected):
+            return False
+    return True
+
+
+def time_batches(index: InvertedIndex, queries: List[str], batch: int, top_k: int) -> Tuple[float, List]:
+    """Mean milliseconds per query and the rankings"""
+    rankings = []
+    start = time.perf_counter()
+    for offset in range(0, len(queries), batch):
+        rankings.extend(index.search_many(queries[offset:offset + batch], top_k=top_k))
+    return (time.perf_counter() - start) * 1000 / len(queries), rankings
+
+
+def run(sizes: List[int], num_queries: int, batch: int, top_k: int, deleted_share: float, seed: int) -> bool:
+    corpus = SyntheticCorpus(seed=seed)
+    queries = corpus.workload('head', num_queries // 2) + corpus.workload('tail', num_queries - num_queries // 2)
+    all_match = True
+    for size in sizes:
+        index = InvertedIndex()
+        for pub in corpus.publications(size):
+            index.add_document(f"{pub.title} {pub.description}")
+        # Tombstones exercise the masking of removed documents
+        for doc_idx in range(0, size, max(1, int(1 / deleted_share)) if deleted_share else size + 1):
+            index.remove_document(doc_idx)
+
+        # A shallow copy shares the postings but stays uncompiled, so it keeps walking them
+        walker = copy.copy(index)
+        start = time.perf_counter()
+        index.compile()
+        row = {'documents': size, 'terms': len(index.postings), 'compile_s': round(time.perf_counter() - start, 3),
+               'matrix_mb': round(index.get_stats()['matrix_bytes'] / 2 ** 20, 1)}
+        for mode, query_batch in (('single', 1), ('batch', batch)):
+            postings_ms, expected = time_batches(walker, queries, query_batch, top_k)
+            matrix_ms, actual = time_batches(index, queries, query_batch, top_k)
+            mismatches = sum(not same_ranking(e, a) for e, a in zip(expected, actual))
+            all_match = all_match and mismatches == 0
+            row[f'{mode}_postings_ms'] = round(postings_ms, 3)
+            row[f'{mode}_matrix_ms'] = round(matrix_ms, 3)
+            row[f'{mode}_speedup'] = round(postings_ms / max(matrix_ms, 1e-9), 1)
+            row[f'{mode}_mismatches'] = mismatches
+        print(json.dumps(row))
+    return all_match
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=8, help='queries per search_many call in batch mode')
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--deleted-share', type=float, default=0.01, help='share of documents tombstoned')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    if not run(args.sizes, args.queries, args.batch, args.top_k, args.deleted_share, args.seed):
+        print("Rankings differ between the matrix and posting-list scorers", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Startup cost of the pickled document list versus the memory-mapped chunk store
+
+Usage: python -m benchmarks.bench_chunk_store --chunks 200000
+"""
+import argparse
+import json
+import os
+import pickle
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.corpus import SyntheticCorpus
+from chunk_store import ChunkStore
+
+
+def timed(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chunks', type=int, default=200000)
+    parser.add_argument('--lookups', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    documents = {
+        i: {
+            'id': f"{pub.id}_0",
+            'text': f"Title: {pub.title}\n\nAuthor: {pub.username}\n\nDescription: {pub.description}",
+            'metadata': {'title': pub.title, 'username': pub.username, 'license': pub.license, 'pub_id': pub.id}
+        }
+        for i, pub in enumerate(SyntheticCorpus(seed=args.seed).publications(args.chunks, description_words=150))
+    }
+    lookup_ids = list(range(0, args.chunks, max(1, args.chunks // args.lookups)))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        pickle_path = os.path.join(workdir, 'documents.pkl')
+        store_path = os.path.join(workdir, 'documents.chunks')
+        with open(pickle_path, 'wb') as f:
+            pickle.dump(list(documents.values()), f)
+        ChunkStore.write(store_path, documents)
+        del documents
+
+        def load_pickle():
+            with open(pickle_path, 'rb') as f:
+                return pickle.load(f)
+
+        for name, path, load in [('pickle', pickle_path, load_pickle),
+                                 ('mmap_chunk_store', store_path, lambda: ChunkStore.open(store_path))]:
+            loaded, load_seconds, load_peak = timed(load)
+            start = time.perf_counter()
+            for doc_id in lookup_ids:
+                loaded[doc_id]['text']
+            lookup_us = (time.perf_counter() - start) * 1e6 / len(lookup_ids)
+            print(json.dumps({
+                'format': name,
+                'chunks': args.chunks,
+                'file_mb': round(os.path.getsize(path) / 1e6, 1),
+                'load_ms': round(load_seconds * 1000, 2),
+                'load_heap_mb': round(load_peak / 1e6, 1),
+                'lookup_us': round(lookup_us, 2)
+            }))
+            del loaded
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Per-document cost of the legacy eight-pass description cleaner versus text_cleaning
+
+Usage: python -m benchmarks.bench_clean --repeat 20 --workers 1 2 4
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+from benchmarks.corpus import PUBLICATIONS_JSON
+from text_cleaning import clean_description, clean_descriptions
+
+
+def legacy_clean_description(description: str) -> str:
+    """The original PublicationProcessor.clean_description"""
+    if not description:
+        return ""
+    cleaned = re.sub(r'!\[.*?\]\(.*?\)', '', description)
+    cleaned = re.sub(r'--DIVIDER--', '\n\n', cleaned)
+    cleaned = re.sub(r'\*\*(.*?)\*\*', r'\1', cleaned)
+    cleaned = re.sub(r'\*(.*?)\*', r'\1', cleaned)
+    cleaned = re.sub(r'`(.*?)`', r'\1', cleaned)
+    cleaned = re.sub(r'#+ ', '', cleaned)
+    cleaned = re.sub(r':::youtube\[.*?\]\{.*?\}', '', cleaned)
+    cleaned = re.sub(r'\n\s*\n', '\n\n', cleaned)
+    cleaned = cleaned.strip()
+    if len(cleaned) > 5000:
+        cleaned = cleaned[:5000] + "..."
+    return cleaned
+
+
+# Markup and pieces of markers, so one pattern's match can span, split or complete another's
+# (e.g. "`#` heading", "**#**  x", "--DIV![a](b)IDER--", ":::you`tube`[a]{b}")
+FUZZ_TOKENS = ['#', '# ', '## ', '**', '*', '`', '![a](b)', '![', '!', '[', ']', '](', '(', ')', '--DIVIDER--',
+               '--DIV', 'IDER--', '-', ':::youtube[', ':::you', 'tube[', ':', '{', '}', ']{', 'x', ' ', '\n',
+               '\n\n', 'word word']
+
+
+def fuzz_mismatches(samples: int, seed: int = 0) -> int:
+    """Random markup soups where text_cleaning's output differs from the legacy cleaner's"""
+    rng = random.Random(seed)
+    mismatches = 0
+    for _ in range(samples):
+        text = ''.join(rng.choice(FUZZ_TOKENS) for _ in range(rng.randint(1, 30)))
+        mismatches += legacy_clean_description(text) != clean_description(text)
+    return mismatches
+
+
+def per_document_us(clean, descriptions, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for description in descriptions:
+            clean(description)
+    return (time.perf_counter() - start) * 1e6 / (repeat * len(descriptions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--fuzz', type=int, default=20000, help='random markup samples checked for parity')
+    parser.add_argument('--batch-copies', type=int, default=200,
+                        help='copies of the corpus in the process-pool batch')
+    args = parser.parse_args()
+
+    with open(PUBLICATIONS_JSON, 'r', encoding='utf-8') as file:
+        descriptions = [pub.get('publication_description', '') for pub in json.load(file)]
+
+    mismatches = sum(1 for d in descriptions if legacy_clean_description(d) != clean_description(d))
+    legacy_us = per_document_us(legacy_clean_description, descriptions, args.repeat)
+    new_us = per_document_us(clean_description, descriptions, args.repeat)
+    print(json.dumps({
+        'documents': len(descriptions),
+        'mean_chars': round(sum(len(d) for d in descriptions) / len(descriptions)),
+        'legacy_us_per_doc': round(legacy_us, 1),
+        'precompiled_us_per_doc': round(new_us, 1),
+        'speedup': round(legacy_us / new_us, 2),
+        'output_mismatches': mismatches,
+        'fuzz_mismatches': fuzz_mismatches(args.fuzz)
+    }))
+
+    batch = descriptions * args.batch_copies
+    for workers in args.workers:
+        start = time.perf_counter()
+        clean_descriptions(batch, workers=workers)
+        seconds = time.perf_counter() - start
+        print(json.dumps({
+            'workers': workers,
+            'documents': len(batch),
+            'docs_per_second': round(len(batch) / seconds, 1)
+        }))
+
+
+if __name__ == '__main__':
+    main()
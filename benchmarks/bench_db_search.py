@@ -0,0 +1,107 @@
+"""In-process BM25 index vs. database full-text search: setup time, per-process memory, latency, agreement
+
+Publications are ingested through ``store_publications_in_db``, so the
+full-text index is filled by the same path production writes take. Runs on a
+throwaway SQLite file by default; pass --database-url to use a scratch
+PostgreSQL database instead (it must have no publications yet, and the
+synthetic ones are deleted afterwards).
+
+Usage: python -m benchmarks.bench_db_search --documents 20000
+       python -m benchmarks.bench_db_search --database-url postgresql://localhost/rag_bench
+"""
+import argparse
+import gc
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+
+def retained_mb(build: Callable[[], Any]) -> float:
+    """Python heap kept alive by build"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        build()
+        gc.collect()
+        return round(tracemalloc.get_traced_memory()[0] / 2 ** 20, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def latency(search: Callable[[str], Any], queries: List[str]) -> Dict[str, float]:
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {'p50_ms': round(samples[len(samples) // 2], 3), 'p95_ms': round(samples[int(len(samples) * 0.95)], 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=200, help='queries per workload')
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--database-url', help='scratch database (default: a temporary SQLite file)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_db_search_')
+    # The app reads its configuration at import time
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['SEARCH_BACKEND'] = 'database'
+    os.environ['INDEX_SNAPSHOT_DIR'] = ''
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from app import app, db
+    from benchmarks.corpus import SyntheticCorpus
+    from data_processor import PublicationProcessor
+    from db_search import DatabaseTextSearch
+    from models import Publication
+    from simple_search import SimpleTextSearch
+
+    corpus = SyntheticCorpus(seed=args.seed)
+    workloads = {kind: corpus.workload(kind, args.queries) for kind in ('head', 'tail')}
+    with app.app_context():
+        if db.session.query(Publication.id).first() is not None:
+            raise SystemExit("The benchmark database already has publications; point --database-url at a scratch one")
+    try:
+        with app.app_context():
+            records = ({'id': pub.id, 'username': pub.username, 'license': pub.license, 'title': pub.title,
+                        'publication_description': pub.description} for pub in corpus.publications(args.documents))
+            ingest = PublicationProcessor().ingest_records(records, batch_size=2000)
+
+            memory, database = SimpleTextSearch(), DatabaseTextSearch()
+            report: Dict[str, Any] = {'documents': args.documents, 'dialect': db.engine.dialect.name,
+                                      'ingest_records_per_second': ingest['records_per_second']}
+            for name, engine in (('memory', memory), ('database', database)):
+                start = time.perf_counter()
+                engine.initialize()
+                report[f'{name}_initialize_s'] = round(time.perf_counter() - start, 3)
+            # Measured on fresh instances: what each worker process holds for keyword search
+            report['memory_retained_mb'] = retained_mb(SimpleTextSearch().initialize)
+            report['database_retained_mb'] = retained_mb(DatabaseTextSearch().initialize)
+
+            for kind, queries in workloads.items():
+                report[f'{kind}_memory'] = latency(lambda q: memory.search(q, args.top_k), queries)
+                report[f'{kind}_database'] = latency(lambda q: database.search(q, args.top_k), queries)
+                overlap = [len({r['id'] for r in memory.search(q, args.top_k)} &
+                               {r['id'] for r in database.search(q, args.top_k)}) / args.top_k for q in queries]
+                # Rankings differ by design (stemming, the database's own BM25/ts_rank), so this is informational
+                report[f'{kind}_overlap_at_k'] = round(sum(overlap) / len(overlap), 3)
+            print(json.dumps(report, indent=2))
+    finally:
+        if args.database_url:
+            with app.app_context():
+                db.session.query(Publication).filter(Publication.id.like('syn%')).delete(synchronize_session=False)
+                db.session.commit()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""LLM answer generation against a local fake chat completions server
+
+Each question is asked by several concurrent clients at once, the way a
+popular question arrives. "per_request_client" builds a new OpenAI client for
+every call and sends every retrieved document whole; "pooled" reuses the
+process-wide client and packs the documents into LLM_CONTEXT_TOKENS;
+"coalesced" also lets identical in-flight prompts share one call. A last run
+with a server slower than the timeout shows the fallback to the template answer.
+
+Usage: python -m benchmarks.bench_generation --questions 20 --clients 8 --chat-latency 0.2
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from benchmarks.corpus import SyntheticCorpus
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+def make_retrievals(questions: int, top_k: int, seed: int) -> List[List[Dict[str, Any]]]:
+    corpus = SyntheticCorpus(seed=seed)
+    publications = list(corpus.publications(questions * top_k, description_words=400))
+    return [[{'id': pub.id,
+              'text': f"Title: {pub.title}\n\nAuthor: {pub.username}\n\nDescription: {pub.description}",
+              'metadata': {'title': pub.title, 'username': pub.username}}
+             for pub in publications[i * top_k:(i + 1) * top_k]]
+            for i in range(questions)]
+
+
+def run(generator, retrievals: List[List[Dict[str, Any]]], clients: int) -> Dict[str, Any]:
+    """Ask every question from ``clients`` threads at once and time each answer"""
+    def ask(i: int):
+        start = time.perf_counter()
+        answer = generator.answer(f"question {i}", retrievals[i])
+        return (time.perf_counter() - start) * 1000, answer is None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(retrievals) * clients) as pool:
+        results = list(pool.map(ask, [i for i in range(len(retrievals)) for _ in range(clients)]))
+    latencies = sorted(ms for ms, _ in results)
+    return {
+        'seconds': round(time.perf_counter() - start, 3),
+        'p50_ms': round(statistics.median(latencies), 1),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1], 1),
+        'fallbacks': sum(1 for _, fallback in results if fallback)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('--clients', type=int, default=8, help='concurrent askers per question')
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--chat-latency', type=float, default=0.2, help='fake server latency per completion (s)')
+    parser.add_argument('--context-tokens', type=int, default=1500)
+    parser.add_argument('--timeout', type=float, default=5.0)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    retrievals = make_retrievals(args.questions, args.top_k, args.seed)
+    with FakeOpenAIServer(chat_latency=args.chat_latency) as server:
+        os.environ['OPENAI_BASE_URL'] = server.base_url
+        os.environ.setdefault('OPENAI_API_KEY', 'fake-key')
+        from openai import OpenAI
+        from llm_generation import LLMGenerator, OpenAIChat
+
+        def per_request_client(messages, max_tokens):
+            with OpenAI() as client:
+                response = client.chat.completions.create(model='fake', messages=messages, max_tokens=max_tokens)
+            return response.choices[0].message.content
+
+        concurrency = args.questions * args.clients
+        configurations = {
+            'per_request_client': LLMGenerator(per_request_client, context_tokens=10 ** 9, timeout=args.timeout,
+                                               concurrency=concurrency, coalesce=False),
+            'pooled': LLMGenerator(OpenAIChat(), context_tokens=args.context_tokens, timeout=args.timeout,
+                                   concurrency=concurrency, coalesce=False),
+            'coalesced': LLMGenerator(OpenAIChat(), context_tokens=args.context_tokens, timeout=args.timeout,
+                                      concurrency=concurrency),
+        }
+        print(json.dumps({'questions': args.questions, 'clients': args.clients,
+                          'chat_latency_ms': args.chat_latency * 1000}))
+        for name, generator in configurations.items():
+            server.chat_requests = server.prompt_chars = 0
+            row = {'mode': name, **run(generator, retrievals, args.clients)}
+            stats = generator.get_stats()
+            row.update(completions=server.chat_requests, coalesced=stats['coalesced'],
+                       prompt_tokens_per_answer=round(stats['prompt_tokens'] / stats['requests']),
+                       prompt_chars_sent=server.prompt_chars)
+            print(json.dumps(row))
+
+        server.chat_latency = args.chat_latency * 5
+        logging.getLogger('llm_generation').setLevel(logging.ERROR)
+        generator = LLMGenerator(OpenAIChat(), context_tokens=args.context_tokens, timeout=args.chat_latency,
+                                 concurrency=concurrency)
+        print(json.dumps({'mode': 'timeout_fallback', 'timeout_ms': args.chat_latency * 1000,
+                          **run(generator, retrievals[:2], args.clients)}))
+
+
+if __name__ == '__main__':
+    main()
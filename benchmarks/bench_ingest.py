@@ -0,0 +1,110 @@
+"""Measure embedding ingestion throughput against a local fake embeddings server
+
+Usage: python -m benchmarks.bench_ingest --documents 2000 --latency 0.05
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.corpus import SyntheticCorpus
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+def make_documents(n: int, seed: int):
+    corpus = SyntheticCorpus(seed=seed)
+    return [
+        {'id': pub.id, 'text': f"Title: {pub.title}\n\nDescription: {pub.description}", 'metadata': {'pub_id': pub.id}}
+        for pub in corpus.publications(n, description_words=150)
+    ]
+
+
+def run_legacy(store, documents) -> float:
+    """One request per document with the original one-second pause every five documents"""
+    start = time.perf_counter()
+    for i, doc in enumerate(documents):
+        if i % 5 == 0 and i > 0:
+            time.sleep(1)
+        store.get_embedding(doc['text'])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=2000)
+    parser.add_argument('--legacy-documents', type=int, default=25,
+                        help='sample size for the sequential baseline (it is very slow)')
+    parser.add_argument('--latency', type=float, default=0.05, help='fake server latency per request (s)')
+    parser.add_argument('--error-rate', type=float, default=0.02, help='fraction of requests answered with 429')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[16, 100])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    documents = make_documents(args.documents, args.seed)
+    with FakeOpenAIServer(latency=args.latency, error_rate=args.error_rate) as server, \
+            tempfile.TemporaryDirectory() as workdir:
+        os.environ['OPENAI_BASE_URL'] = server.base_url
+        os.environ.setdefault('OPENAI_API_KEY', 'fake-key')
+        from embedding_cache import EmbeddingCache
+        from vector_store import VectorStore
+
+        def new_store(**ingestor_settings):
+            # A fresh cache per run so every configuration pays for its embeddings
+            cache = EmbeddingCache(tempfile.mktemp(suffix='.db', dir=workdir))
+            store = VectorStore(cache=cache)
+            store.index_file = os.path.join(workdir, 'bench.faiss')
+            store.docs_file = os.path.join(workdir, 'bench.pkl')
+            for key, value in ingestor_settings.items():
+                setattr(store.ingestor, key, value)
+            store.ingestor.backoff_base = 0.05
+            return store
+
+        legacy_docs = documents[:args.legacy_documents]
+        legacy_seconds = run_legacy(new_store(), legacy_docs)
+        print(json.dumps({
+            'mode': 'legacy_sequential',
+            'documents': len(legacy_docs),
+            'docs_per_second': round(len(legacy_docs) / legacy_seconds, 1)
+        }))
+
+        for batch_size in args.batch_sizes:
+            for concurrency in args.concurrency:
+                store = new_store(batch_size=batch_size, max_concurrency=concurrency)
+                start = time.perf_counter()
+                store.create_index(documents)
+                seconds = time.perf_counter() - start
+                stats = store.ingestor.get_stats()
+                print(json.dumps({
+                    'mode': 'batched',
+                    'batch_size': batch_size,
+                    'concurrency': concurrency,
+                    'documents': store.index.ntotal,
+                    'seconds': round(seconds, 2),
+                    'docs_per_second': round(store.index.ntotal / seconds, 1),
+                    'requests': stats['requests'],
+                    'retries': stats['retries'],
+                    'failed_batches': stats['failed_batches']
+                }))
+
+        # Rebuild after editing a few documents: only the changed chunks are re-embedded
+        edited = [dict(doc) for doc in documents]
+        for doc in edited[::20]:
+            doc['text'] += ' (revised)'
+        store.ingestor.reset_stats()
+        start = time.perf_counter()
+        store.create_index(edited)
+        seconds = time.perf_counter() - start
+        print(json.dumps({
+            'mode': 'cached_rebuild',
+            'documents': store.index.ntotal,
+            'changed_documents': len(edited[::20]),
+            'seconds': round(seconds, 2),
+            'requests': store.ingestor.get_stats()['requests'],
+            'embedding_cache': store.embedding_cache.get_stats()
+        }))
+
+
+if __name__ == '__main__':
+    main()
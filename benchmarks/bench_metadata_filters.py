@@ -0,0 +1,103 @@
+"""Metadata-filtered keyword search: candidates restricted before scoring vs. ranking everything and filtering after
+
+Filters range from one author to half the corpus. "prefilter" is
+``search_many(..., search_filter=...)``; "postfilter" ranks every matching
+document and keeps the first top_k the filter allows, which is what filtering
+cost before. Both scoring paths are timed (the NumPy matrix and the posting
+walk), and the run fails if any filtered ranking differs from the post-filtered one.
+
+Usage: python -m benchmarks.bench_metadata_filters --documents 100000
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import timedelta
+from typing import Any, Callable, Dict, List
+
+_WORKDIR = tempfile.mkdtemp(prefix='bench_filters_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_WORKDIR, 'bench.db')}"
+os.environ.setdefault('INDEX_SNAPSHOT_DIR', '')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+# Imported for its side effects: the app sets up logging and the database, and the search
+# modules import from it, so it has to be loaded before them
+import app  # noqa: E402,F401
+from benchmarks.corpus import CORPUS_START, SyntheticCorpus  # noqa: E402
+from metadata_filter import SearchFilter  # noqa: E402
+from simple_search import SimpleTextSearch  # noqa: E402
+
+
+def mean_ms(run: Callable[[], Any], queries: int) -> float:
+    start = time.perf_counter()
+    run()
+    return round((time.perf_counter() - start) * 1000 / queries, 3)
+
+
+def post_filtered(search: SimpleTextSearch, queries: List[str], top_k: int,
+                  allowed: set) -> List[List[Dict[str, Any]]]:
+    ranked = search.search_many(queries, top_k=len(search.positions))
+    return [[result for result in results if result['id'] in allowed][:top_k] for results in ranked]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    corpus = SyntheticCorpus(seed=args.seed)
+    publications = list(corpus.publications(args.documents))
+    queries = corpus.workload('head', args.queries // 2) + corpus.workload('tail', args.queries - args.queries // 2)
+    top_author, _ = Counter(pub.username for pub in publications).most_common(1)[0]
+
+    def created_range(share: float) -> SearchFilter:
+        return SearchFilter(created_after=CORPUS_START,
+                            created_before=CORPUS_START + timedelta(hours=int(args.documents * share)))
+
+    filters = {
+        'one_author': SearchFilter(usernames=frozenset([top_author])),
+        'created_1pct': created_range(0.01),
+        'created_10pct': created_range(0.1),
+        'license': SearchFilter(licenses=frozenset([publications[0].license])),
+        'created_50pct': created_range(0.5),
+    }
+    try:
+        search = SimpleTextSearch()
+        search.build_index(publications)
+        search.is_initialized = True
+        matrix = search.index._matrix
+        print(json.dumps({'documents': args.documents, 'queries': len(queries)}))
+        for name, search_filter in filters.items():
+            allowed = search.matching_ids(search_filter)
+            row: Dict[str, Any] = {'filter': name, 'selected': len(allowed)}
+            for scoring, compiled in (('matrix', matrix), ('postings', None)):
+                search.index._matrix = compiled
+                filtered = search.search_many(queries, args.top_k, search_filter)
+                expected = post_filtered(search, queries, args.top_k, allowed)
+                mismatches = sum(1 for got, want in zip(filtered, expected)
+                                 if [(r['id'], round(r['score'], 9)) for r in got] !=
+                                 [(r['id'], round(r['score'], 9)) for r in want])
+                row[f'{scoring}_unfiltered_ms'] = mean_ms(lambda: search.search_many(queries, args.top_k),
+                                                          len(queries))
+                row[f'{scoring}_prefilter_ms'] = mean_ms(
+                    lambda: search.search_many(queries, args.top_k, search_filter), len(queries))
+                row[f'{scoring}_postfilter_ms'] = mean_ms(
+                    lambda: post_filtered(search, queries, args.top_k, allowed), len(queries))
+                if mismatches:
+                    print(f"{name}: {mismatches} {scoring} rankings differ from post-filtering", file=sys.stderr)
+                    sys.exit(1)
+            search.index._matrix = matrix
+            print(json.dumps(row))
+    finally:
+        shutil.rmtree(_WORKDIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Detached ORM instances vs. compact publication records: load time, retained memory and search latency
+
+Synthetic publications are bulk-inserted into a throwaway SQLite database. The
+"orm" numbers reproduce the old SimpleTextSearch, which kept every expunged
+Publication from ``query(Publication).all()`` and formatted results from it;
+"records" is the current column-projected load into PublicationRecord.
+
+Usage: python -m benchmarks.bench_publication_records --documents 100000
+"""
+import argparse
+import gc
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+_WORKDIR = tempfile.mkdtemp(prefix='bench_records_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_WORKDIR, 'bench.db')}"
+os.environ.setdefault('INDEX_SNAPSHOT_DIR', '')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from app import app, db  # noqa: E402
+from benchmarks.corpus import SyntheticCorpus  # noqa: E402
+from models import Publication  # noqa: E402
+from simple_search import RECORD_COLUMNS, PublicationRecord, simple_search  # noqa: E402
+
+
+def retained(load: Callable[[], Any]) -> Tuple[Any, float, float]:
+    """Result of load, its wall time (untraced run) and the heap it keeps alive in MB (traced run)"""
+    start = time.perf_counter()
+    load()
+    seconds = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = load()
+        gc.collect()
+        return result, seconds, tracemalloc.get_traced_memory()[0] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def load_orm() -> List[Publication]:
+    publications = db.session.query(Publication).all()
+    for pub in publications:
+        db.session.expunge(pub)
+    return publications
+
+
+def load_records() -> List[PublicationRecord]:
+    return [PublicationRecord.of(row) for row in db.session.query(*RECORD_COLUMNS).yield_per(2000)]
+
+
+def orm_results(publications: List[Publication], ranked: List[Tuple[int, float]]) -> List[Dict[str, Any]]:
+    """The result formatting SimpleTextSearch used to run on ORM instances"""
+    results = []
+    for rank, (doc_idx, score) in enumerate(ranked, start=1):
+        pub = publications[doc_idx]
+        results.append({
+            'id': pub.id,
+            'text': f"Title: {pub.title}\n\nAuthor: {pub.username}\n\nDescription: {pub.description[:1000]}...",
+            'score': score,
+            'rank': rank,
+            'metadata': {'title': pub.title, 'username': pub.username, 'license': pub.license or '',
+                         'pub_id': pub.id}
+        })
+    return results
+
+
+def mean_ms(search: Callable[[str], Any], queries: List[str]) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        search(query)
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    corpus = SyntheticCorpus(seed=args.seed)
+    queries = corpus.workload('head', args.queries // 2) + corpus.workload('tail', args.queries - args.queries // 2)
+    try:
+        with app.app_context():
+            batch = []
+            for pub in corpus.publications(args.documents):
+                batch.append({'id': pub.id, 'username': pub.username, 'license': pub.license or None,
+                              'title': pub.title, 'description': pub.description, 'processed': True})
+                if len(batch) == 5000:
+                    db.session.execute(db.insert(Publication), batch)
+                    batch = []
+            if batch:
+                db.session.execute(db.insert(Publication), batch)
+            db.session.commit()
+
+            publications, orm_s, orm_mb = retained(load_orm)
+            records, records_s, records_mb = retained(load_records)
+            del records
+            simple_search.initialize()
+            index = simple_search.index
+
+            scale = 100000 / args.documents
+            report = {
+                'documents': args.documents,
+                'orm_load_s': round(orm_s, 3),
+                'records_load_s': round(records_s, 3),
+                'orm_mb_per_100k': round(orm_mb * scale, 1),
+                'records_mb_per_100k': round(records_mb * scale, 1),
+                'orm_search_ms': round(mean_ms(lambda q: orm_results(publications, index.search(q, args.top_k)),
+                                               queries), 3),
+                'records_search_ms': round(mean_ms(lambda q: simple_search.search(q, args.top_k), queries), 3),
+            }
+            report['memory_reduction'] = round(report['orm_mb_per_100k'] / max(report['records_mb_per_100k'], 1e-9), 1)
+            print(json.dumps(report, indent=2))
+    finally:
+        shutil.rmtree(_WORKDIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
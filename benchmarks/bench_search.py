@@ -0,0 +1,76 @@
+"""Compare the legacy linear keyword scan with the BM25 inverted index
+
+Usage: python -m benchmarks.bench_search --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import time
+from typing import List
+
+from benchmarks.corpus import SyntheticCorpus
+from inverted_index import InvertedIndex
+
+
+def legacy_scan(publications: List, query: str, top_k: int = 5) -> List:
+    """The original SimpleTextSearch.search scoring loop"""
+    query_words = query.lower().split()
+    scored_docs = []
+    for pub in publications:
+        searchable_text = f"{pub.title} {pub.description}".lower()
+        score = 0
+        for word in query_words:
+            if len(word) > 2:
+                score += searchable_text.count(word)
+        if score > 0:
+            scored_docs.append((pub.id, score))
+    scored_docs.sort(key=lambda x: x[1], reverse=True)
+    return scored_docs[:top_k]
+
+
+def time_queries(search, queries: List[str]) -> float:
+    """Return mean milliseconds per query"""
+    start = time.perf_counter()
+    for query in queries:
+        search(query)
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def run(sizes: List[int], num_queries: int, seed: int) -> List[dict]:
+    corpus = SyntheticCorpus(seed=seed)
+    queries = corpus.queries(num_queries)
+    results = []
+    for size in sizes:
+        publications = list(corpus.publications(size))
+
+        start = time.perf_counter()
+        index = InvertedIndex()
+        for pub in publications:
+            index.add_document(f"{pub.title} {pub.description}")
+        build_seconds = time.perf_counter() - start
+
+        # The legacy scan is slow at scale, so it gets a smaller query sample
+        scan_queries = queries[:max(1, num_queries // 10)] if size >= 100000 else queries
+        row = {
+            'documents': size,
+            'index_build_s': round(build_seconds, 3),
+            'index_terms': len(index.postings),
+            'legacy_scan_ms': round(time_queries(lambda q: legacy_scan(publications, q), scan_queries), 3),
+            'bm25_index_ms': round(time_queries(lambda q: index.search(q, top_k=5), queries), 3),
+        }
+        row['speedup'] = round(row['legacy_scan_ms'] / max(row['bm25_index_ms'], 1e-9), 1)
+        results.append(row)
+        print(json.dumps(row))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    run(args.sizes, args.queries, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Sharded scatter-gather keyword search vs. the single in-process index: latency and QPS by shard count
+
+Each row is one shard count (0 = the unsharded SimpleTextSearch). Rankings of
+every sharded run are checked against the unsharded index; scaling needs as
+many free cores as shards.
+
+Usage: python -m benchmarks.bench_sharded_search --documents 100000 --shards 1 2 4 8 --clients 1 4 16
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+# The app reads its configuration at import time; keep everything out of the working tree
+_WORKDIR = tempfile.mkdtemp(prefix='bench_shards_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_WORKDIR, 'bench.db')}"
+os.environ.setdefault('INDEX_SNAPSHOT_DIR', '')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+# Imported for its side effects: the app sets up logging and the database, and the search
+# modules import from it, so it has to be loaded before them
+import app  # noqa: E402,F401
+from benchmarks.corpus import SyntheticCorpus  # noqa: E402
+from sharded_search import ShardedSearch  # noqa: E402
+from simple_search import SimpleTextSearch  # noqa: E402
+
+
+def latency(search, queries: List[str], top_k: int) -> Dict[str, float]:
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        search.search(query, top_k)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {'p50_ms': round(samples[len(samples) // 2], 3), 'p95_ms': round(samples[int(len(samples) * 0.95)], 3)}
+
+
+def qps(search, queries: List[str], top_k: int, clients: int) -> float:
+    """Queries per second with ``clients`` threads each running its share of the queries"""
+    def client(own: List[str]):
+        for query in own:
+            search.search(query, top_k)
+
+    threads = [threading.Thread(target=client, args=(queries[i::clients],)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return round(len(queries) / (time.perf_counter() - start), 1)
+
+
+def mismatches(expected: List[List[Dict[str, Any]]], actual: List[List[Dict[str, Any]]]) -> int:
+    """Queries whose sharded scores differ from the unsharded ones (IDs may only differ within ties)"""
+    count = 0
+    for want, got in zip(expected, actual):
+        if len(want) != len(got) or not all(math.isclose(a['score'], b['score'], rel_tol=1e-9)
+                                            for a, b in zip(want, got)):
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=100000)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--queries', type=int, default=400)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    corpus = SyntheticCorpus(seed=args.seed)
+    publications = list(corpus.publications(args.documents))
+    queries = corpus.workload('head', args.queries)
+    print(json.dumps({'documents': args.documents, 'cpus': os.cpu_count(), 'queries': len(queries)}))
+    # Every shard process is forked up front, before the benchmark starts any thread
+    engines = {shards: ShardedSearch(shards) for shards in args.shards}
+    for engine in engines.values():
+        engine.start()
+    try:
+        baseline = SimpleTextSearch()
+        for shards in [0] + args.shards:
+            engine = engines[shards] if shards else baseline
+            start = time.perf_counter()
+            engine.build_index(publications)
+            engine.is_initialized = True
+            row: Dict[str, Any] = {'shards': shards, 'build_s': round(time.perf_counter() - start, 3)}
+            if shards:
+                row['mismatches'] = mismatches(baseline.search_many(queries, args.top_k),
+                                               engine.search_many(queries, args.top_k))
+            row['latency'] = latency(engine, queries, args.top_k)
+            row['qps'] = {clients: qps(engine, queries, args.top_k, clients) for clients in args.clients}
+            print(json.dumps(row))
+            if shards:
+                engine.close()
+                if row['mismatches']:
+                    print(f"{row['mismatches']} rankings differ from the unsharded index", file=sys.stderr)
+                    sys.exit(1)
+    finally:
+        shutil.rmtree(_WORKDIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
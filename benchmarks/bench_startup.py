@@ -0,0 +1,123 @@
+"""Cold-start cost: import time of the app and time until the first answered request
+
+Every measurement runs in a fresh interpreter against a throwaway database and
+snapshot directory, so nothing is shared with the working tree.
+
+Usage: python -m benchmarks.bench_startup --repeat 3
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+FIRST_REQUEST = """
+import time
+start = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+client = app.test_client()
+client.get('/')
+client.post('/api/ask', json={'query': 'How do you add memory to RAG applications?'})
+done = time.perf_counter()
+print(round((imported - start) * 1000, 1), round((done - start) * 1000, 1))
+"""
+
+WARMUP = """
+import time
+start = time.perf_counter()
+from app import app
+client = app.test_client()
+first = client.get('/ready')
+answered = time.perf_counter()
+while client.get('/ready').status_code != 200:
+    time.sleep(0.005)
+ready = time.perf_counter()
+print(first.status_code, round((answered - start) * 1000, 1), round((ready - start) * 1000, 1))
+"""
+
+
+def run_python(args: List[str], env: Dict[str, str]) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable] + args, env=env, capture_output=True, text=True, check=True)
+
+
+def import_profile(env: Dict[str, str], top: int) -> Dict:
+    """Parse ``python -X importtime -c 'import app'``"""
+    result = run_python(['-X', 'importtime', '-c', 'import app'], env)
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            modules.append((match.group(4), int(match.group(2)), len(match.group(3))))
+    # Children are listed before their parent; app's direct imports sit one level below it
+    app_at = next(i for i, (name, _, _) in enumerate(modules) if name == 'app')
+    app_indent = modules[app_at][2]
+    first_child = max((i + 1 for i, (_, _, indent) in enumerate(modules[:app_at]) if indent <= app_indent),
+                      default=0)
+    children = sorted(((name, us) for name, us, indent in modules[first_child:app_at] if indent == app_indent + 2),
+                      key=lambda module: -module[1])
+    loaded = {name for name, _, _ in modules}
+    return {
+        'import_app_ms': round(modules[app_at][1] / 1000, 1),
+        'slowest_app_imports_ms': {name: round(us / 1000, 1) for name, us in children[:top]},
+        'heavy_modules_loaded': sorted(loaded & {'openai', 'numpy', 'faiss', 'tiktoken'})
+    }
+
+
+def deferred_import_ms(env: Dict[str, str]) -> float:
+    """What importing the SDKs that are now loaded on first use would add"""
+    result = run_python(['-c', 'import time; s = time.perf_counter(); import openai, numpy\n'
+                               'try:\n    import faiss\nexcept ImportError:\n    pass\n'
+                               'print(round((time.perf_counter() - s) * 1000, 1))'], env)
+    return float(result.stdout.split()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--top', type=int, default=8, help='slowest direct imports of app to list')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_startup_')
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+               INDEX_SNAPSHOT_DIR=os.path.join(workdir, 'snapshots'),
+               INDEX_SNAPSHOT_POLL_INTERVAL='0',
+               HYBRID_SEARCH='off',
+               RESULT_CACHE_TTL='0',
+               LOG_LEVEL='WARNING',
+               PYTHONPATH=os.getcwd())
+
+    report = import_profile(env, args.top)
+    report['deferred_sdk_import_ms'] = deferred_import_ms(env)
+
+    # The first run loads the JSON dump into the database and builds and publishes the index
+    _, build_ms = map(float, run_python(['-c', FIRST_REQUEST], env).stdout.split())
+    report['first_request_building_index_ms'] = build_ms
+
+    snapshot_runs = [list(map(float, run_python(['-c', FIRST_REQUEST], env).stdout.split()))
+                     for _ in range(args.repeat)]
+    report['import_ms'] = round(statistics.median(run[0] for run in snapshot_runs), 1)
+    report['first_request_from_snapshot_ms'] = round(statistics.median(run[1] for run in snapshot_runs), 1)
+
+    warm_env = dict(env, INDEX_WARMUP='1')
+    warm_runs = [run_python(['-c', WARMUP], warm_env).stdout.split() for _ in range(args.repeat)]
+    report['warmup_first_response_status'] = int(warm_runs[0][0])
+    report['warmup_first_response_ms'] = round(statistics.median(float(run[1]) for run in warm_runs), 1)
+    report['warmup_ready_ms'] = round(statistics.median(float(run[2]) for run in warm_runs), 1)
+    shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    main()
+    print(f"benchmark took {time.perf_counter() - start:.1f}s", file=sys.stderr)
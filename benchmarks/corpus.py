@@ -0,0 +1,85 @@
+import json
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional
+
+from inverted_index import tokenize
+
+PUBLICATIONS_JSON = 'attached_assets/project_1_publications_1749806909080.json'
+# Synthetic publications are created an hour apart from here on
+CORPUS_START = datetime(2023, 1, 1)
+
+
+@dataclass
+class SyntheticPublication:
+    """Stand-in for the Publication model with the attributes the search layer reads"""
+    id: str
+    username: str
+    license: str
+    title: str
+    description: str
+    created_at: Optional[datetime] = None
+
+
+class SyntheticCorpus:
+    """Generates publications whose vocabulary and term frequencies follow the attached JSON"""
+
+    def __init__(self, seed: int = 42, json_path: str = PUBLICATIONS_JSON):
+        with open(json_path, 'r', encoding='utf-8') as file:
+            publications = json.load(file)
+
+        counts = {}
+        for pub in publications:
+            for token in tokenize(f"{pub.get('title', '')} {pub.get('publication_description', '')}"):
+                counts[token] = counts.get(token, 0) + 1
+
+        self.seed = seed
+        self.vocabulary = sorted(counts, key=lambda term: (-counts[term], term))
+        self.cum_weights = []
+        running = 0
+        for term in self.vocabulary:
+            running += counts[term]
+            self.cum_weights.append(running)
+        self.usernames = sorted({pub.get('username', '') for pub in publications})
+        self.licenses = sorted({pub.get('license') or '' for pub in publications})
+
+    def words(self, rng: random.Random, n: int) -> List[str]:
+        """Sample n words following the source term distribution"""
+        return rng.choices(self.vocabulary, cum_weights=self.cum_weights, k=n)
+
+    def publications(self, n: int, description_words: int = 200) -> Iterator[SyntheticPublication]:
+        """Yield n deterministic synthetic publications"""
+        rng = random.Random(self.seed)
+        for i in range(n):
+            yield SyntheticPublication(
+                id=f"syn{i:08d}",
+                username=rng.choice(self.usernames),
+                license=rng.choice(self.licenses),
+                title=' '.join(self.words(rng, rng.randint(5, 10))).title(),
+                description=' '.join(self.words(rng, rng.randint(description_words // 2, description_words * 3 // 2))),
+                created_at=CORPUS_START + timedelta(hours=i)
+            )
+
+    def queries(self, n: int, words_per_query: int = 4) -> List[str]:
+        """Sample n queries from the same distribution as the documents"""
+        rng = random.Random(self.seed + 1)
+        return [' '.join(self.words(rng, words_per_query)) for _ in range(n)]
+
+    def workload(self, kind: str, n: int, words_per_query: int = 3) -> List[str]:
+        """Deterministic queries of one kind
+
+        'head' draws from the most frequent tenth of the vocabulary (long
+        posting lists), 'tail' from the rarest half (short ones), and 'nohit'
+        uses made-up words that match nothing.
+        """
+        rng = random.Random(f"{self.seed}-{kind}")
+        if kind == 'head':
+            terms = self.vocabulary[:max(1, len(self.vocabulary) // 10)]
+        elif kind == 'tail':
+            terms = self.vocabulary[len(self.vocabulary) // 2:]
+        elif kind == 'nohit':
+            return [' '.join(f"zq{rng.getrandbits(40):010x}" for _ in range(words_per_query)) for _ in range(n)]
+        else:
+            raise ValueError(f"Unknown workload '{kind}', expected head, tail or nohit")
+        return [' '.join(rng.sample(terms, min(words_per_query, len(terms)))) for _ in range(n)]
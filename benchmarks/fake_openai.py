@@ -0,0 +1,153 @@
+"""Local stand-in for the OpenAI HTTP API used by benchmarks
+
+Serves ``POST /v1/embeddings`` with deterministic vectors derived from each
+input's hash, after a configurable latency and with an optional rate of 429
+responses so retry paths get exercised. ``POST /v1/chat/completions``
+answers after ``chat_latency`` with a deterministic reply naming the sources
+cited in the prompt, and counts the calls and prompt sizes it received.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+import numpy as np
+
+
+def fake_embedding(text: str, dimension: int) -> List[float]:
+    """Deterministic unit vector for a text"""
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    vector /= np.linalg.norm(vector)
+    return vector.tolist()
+
+
+class FakeOpenAIServer:
+    """Threaded HTTP server that runs in the background for the duration of a benchmark"""
+
+    def __init__(self, latency: float = 0.05, per_item_latency: float = 0.0005,
+                 error_rate: float = 0.0, dimension: int = 1536, chat_latency: float = 0.5,
+                 host: str = '127.0.0.1', port: int = 0):
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.error_rate = error_rate
+        self.dimension = dimension
+        self.chat_latency = chat_latency
+        self.requests = 0
+        self.chat_requests = 0
+        self.prompt_chars = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: dict):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                with server._lock:
+                    server.requests += 1
+
+                if self.path.rstrip('/') == '/v1/chat/completions':
+                    self._chat(payload)
+                    return
+                if self.path.rstrip('/') != '/v1/embeddings':
+                    self._send_json(404, {'error': {'message': f'Unknown path {self.path}'}})
+                    return
+
+                inputs = payload.get('input', [])
+                if isinstance(inputs, str):
+                    inputs = [inputs]
+                time.sleep(server.latency + server.per_item_latency * len(inputs))
+                if server.error_rate and random.random() < server.error_rate:
+                    self._send_json(429, {'error': {'message': 'Rate limit reached', 'type': 'rate_limit'}})
+                    return
+
+                self._send_json(200, {
+                    'object': 'list',
+                    'model': payload.get('model', 'fake'),
+                    'data': [
+                        {'object': 'embedding', 'index': i, 'embedding': fake_embedding(text, server.dimension)}
+                        for i, text in enumerate(inputs)
+                    ],
+                    'usage': {'prompt_tokens': 0, 'total_tokens': 0}
+                })
+
+            def _chat(self, payload: dict):
+                prompt = "\n".join(message.get('content', '') for message in payload.get('messages', []))
+                with server._lock:
+                    server.chat_requests += 1
+                    server.prompt_chars += len(prompt)
+                time.sleep(server.chat_latency)
+                if server.error_rate and random.random() < server.error_rate:
+                    self._send_json(429, {'error': {'message': 'Rate limit reached', 'type': 'rate_limit'}})
+                    return
+
+                sources = sorted(set(re.findall(r'^\[(\d+)\]', prompt, re.MULTILINE)), key=int)
+                answer = f"Answer drawn from {len(sources)} sources " + "".join(f"[{n}]" for n in sources)
+                self._send_json(200, {
+                    'id': 'chatcmpl-fake',
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': payload.get('model', 'fake'),
+                    'choices': [{'index': 0, 'finish_reason': 'stop',
+                                 'message': {'role': 'assistant', 'content': answer}}],
+                    'usage': {'prompt_tokens': len(prompt.split()), 'completion_tokens': len(answer.split()),
+                              'total_tokens': len(prompt.split()) + len(answer.split())}
+                })
+
+        return Handler
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the fake OpenAI server in the foreground')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--chat-latency', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(latency=args.latency, error_rate=args.error_rate, chat_latency=args.chat_latency,
+                          port=args.port) as server:
+        print(f"Fake OpenAI API listening on {server.base_url} (set OPENAI_BASE_URL to use it)")
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,325 @@
+"""Reproducible retrieval benchmark: build time, latency percentiles, QPS, memory and recall
+
+Runs against a seeded synthetic corpus and a throwaway database, and prints
+one JSON report (also written to --output). Pass --compare with an earlier
+report to print the relative change of every shared number.
+
+Usage: python -m benchmarks.suite --documents 5000 --queries 200 --concurrency 1 4 8 --output run.json
+       python -m benchmarks.suite --vector --compare baseline.json
+"""
+import argparse
+import http.client
+import json
+import logging
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+# The app reads its configuration at import time; keep everything out of the working tree
+_WORKDIR = tempfile.mkdtemp(prefix='bench_suite_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_WORKDIR, 'bench.db')}"
+os.environ.setdefault('INDEX_SNAPSHOT_DIR', '')
+os.environ.setdefault('RESULT_CACHE_TTL', '0')
+os.environ.setdefault('HYBRID_SEARCH', 'off')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from app import app  # noqa: E402
+from benchmarks.corpus import SyntheticCorpus  # noqa: E402
+from data_processor import PublicationProcessor  # noqa: E402
+from history_writer import history_writer  # noqa: E402
+from ingest import peak_rss_mb  # noqa: E402
+from inverted_index import tokenize  # noqa: E402
+from rag_pipeline import rag_pipeline  # noqa: E402
+from simple_search import simple_search  # noqa: E402
+
+WORKLOADS = ('head', 'tail', 'nohit')
+
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples_ms)
+
+    def at(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))], 3)
+
+    return {'p50_ms': at(0.5), 'p95_ms': at(0.95), 'p99_ms': at(0.99), 'max_ms': round(ordered[-1], 3),
+            'mean_ms': round(sum(ordered) / len(ordered), 3)}
+
+
+def heap_peak_mb(build: Callable[[], Any]) -> float:
+    """Python heap high-water mark while running build (tracemalloc slows it down, so it is timed separately)"""
+    tracemalloc.start()
+    try:
+        build()
+        return round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def measure_build(publications: List) -> Dict[str, Any]:
+    """Keyword index and chunking build time, with the Python heap peak of each"""
+    processor = PublicationProcessor()
+    keyword_peak = heap_peak_mb(lambda: simple_search.build_index(publications))
+    chunk_peak = heap_peak_mb(lambda: processor.create_document_chunks(publications))
+
+    start = time.perf_counter()
+    simple_search.build_index(publications)
+    simple_search.is_initialized = True
+    keyword_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chunks = processor.create_document_chunks(publications)
+    chunk_s = time.perf_counter() - start
+    return {
+        'keyword_index_s': round(keyword_s, 3),
+        'keyword_index_peak_mb': keyword_peak,
+        'index_terms': len(simple_search.index.postings),
+        'chunking_s': round(chunk_s, 3),
+        'chunking_peak_mb': chunk_peak,
+        'chunks': len(chunks)
+    }, chunks
+
+
+def measure_latency(workloads: Dict[str, List[str]], top_k: int) -> Dict[str, Any]:
+    """Per-query keyword search latency for each workload, plus one batched pass over all of them"""
+    report = {}
+    for kind, queries in workloads.items():
+        samples = []
+        for query in queries:
+            start = time.perf_counter()
+            simple_search.search(query, top_k)
+            samples.append((time.perf_counter() - start) * 1000)
+        report[kind] = percentiles(samples)
+    every_query = [query for queries in workloads.values() for query in queries]
+    start = time.perf_counter()
+    simple_search.search_many(every_query, top_k)
+    report['search_many_ms_per_query'] = round((time.perf_counter() - start) * 1000 / len(every_query), 4)
+    return report
+
+
+class BruteForceBM25:
+    """Reference ranking: BM25 scored document by document, sharing no code with the inverted index"""
+
+    def __init__(self, publications: List, k1: float, b: float):
+        self.ids = [pub.id for pub in publications]
+        self.documents = [Counter(tokenize(f"{pub.title} {pub.description}")) for pub in publications]
+        self.lengths = [sum(counts.values()) for counts in self.documents]
+        self.average = sum(self.lengths) / len(self.lengths)
+        self.k1 = k1
+        self.b = b
+
+    def top_k(self, query: str, k: int) -> List[str]:
+        terms = Counter(tokenize(query))
+        n = len(self.documents)
+        idf = {}
+        for term in terms:
+            df = sum(1 for counts in self.documents if term in counts)
+            idf[term] = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+        scored = []
+        for position, counts in enumerate(self.documents):
+            score = 0.0
+            for term, query_tf in terms.items():
+                tf = counts.get(term)
+                if tf:
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[position] / self.average)
+                    score += idf[term] * query_tf * tf * (self.k1 + 1) / (tf + norm)
+            if score > 0:
+                scored.append((score, -position))
+        scored.sort(reverse=True)
+        return [self.ids[-position] for _, position in scored[:k]]
+
+
+def measure_keyword_recall(publications: List, workloads: Dict[str, List[str]], top_k: int,
+                           sample: int) -> Dict[str, Any]:
+    """Recall@k of the inverted index against the brute-force reference (no-hit queries must return nothing)"""
+    reference = BruteForceBM25(publications, simple_search.index.k1, simple_search.index.b)
+    report = {}
+    for kind, queries in workloads.items():
+        hits = expected = false_hits = 0
+        for query in queries[:sample]:
+            found = [doc['id'] for doc in simple_search.search(query, top_k)]
+            exact = reference.top_k(query, top_k)
+            expected += len(exact)
+            hits += len(set(found) & set(exact))
+            false_hits += len(found) if not exact else 0
+        report[kind] = {'recall_at_k': round(hits / expected, 4) if expected else None,
+                        'results_without_reference': false_hits, 'queries': min(sample, len(queries))}
+    return report
+
+
+def measure_vector(chunks: List, queries: List[str], top_k: int, index_type: str, dim: int) -> Dict[str, Any]:
+    """Vector store build time, query latency and recall@k against exact search, with deterministic fake embeddings"""
+    import numpy as np
+    from benchmarks.fake_openai import fake_embedding
+    from embedding_cache import EmbeddingCache
+    from vector_store import VectorStore
+
+    store = VectorStore(embedder=lambda texts: [fake_embedding(text, dim) for text in texts],
+                        cache=EmbeddingCache(':memory:'), index_type=index_type)
+    store.embeddings_dim = dim
+    store.index_file = os.path.join(_WORKDIR, 'vector.faiss')
+    store.docs_file = os.path.join(_WORKDIR, 'documents.chunks')
+    start = time.perf_counter()
+    store.create_index(chunks)
+    build_s = time.perf_counter() - start
+
+    vectors = np.array([fake_embedding(chunk['text'], dim) for chunk in chunks], dtype=np.float32)
+    samples, hits = [], 0
+    for query in queries:
+        started = time.perf_counter()
+        found = {doc['id'] for doc in store.search(query, top_k)}
+        samples.append((time.perf_counter() - started) * 1000)
+        distances = ((vectors - np.array(fake_embedding(query, dim), dtype=np.float32)) ** 2).sum(axis=1)
+        exact = {chunks[i]['id'] for i in np.argsort(distances, kind='stable')[:top_k]}
+        hits += len(found & exact)
+    return dict({'index_type': index_type, 'vectors': len(chunks), 'build_s': round(build_s, 3),
+                 'recall_at_k': round(hits / (top_k * len(queries)), 4)}, **percentiles(samples))
+
+
+def run_concurrently(send: Callable[[str], int], queries: List[str], threads: int) -> Dict[str, Any]:
+    """Send every query once, spread over ``threads`` client threads"""
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def client(own: List[str]):
+        local, failed = [], 0
+        for query in own:
+            start = time.perf_counter()
+            if send(query) != 200:
+                failed += 1
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    workers = [threading.Thread(target=client, args=(queries[i::threads],)) for i in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    return dict({'threads': threads, 'requests': len(queries), 'errors': errors[0],
+                 'qps': round(len(queries) / elapsed, 1)}, **percentiles(latencies))
+
+
+def measure_qps(queries: List[str], concurrency: List[int]) -> Dict[str, Any]:
+    """Throughput of POST /api/ask through the Flask test client and a local threaded WSGI server"""
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    rag_pipeline.is_initialized = True
+    client = app.test_client()
+
+    def via_test_client(query: str) -> int:
+        return client.post('/api/ask', json={'query': query}).status_code
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    connections = threading.local()
+
+    def via_http(query: str) -> int:
+        if not hasattr(connections, 'conn'):
+            connections.conn = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=30)
+        connections.conn.request('POST', '/api/ask', body=json.dumps({'query': query}),
+                                 headers={'Content-Type': 'application/json'})
+        response = connections.conn.getresponse()
+        response.read()
+        return response.status
+
+    try:
+        return {
+            'test_client': [run_concurrently(via_test_client, queries, threads) for threads in concurrency],
+            'wsgi_server': [run_concurrently(via_http, queries, threads) for threads in concurrency]
+        }
+    finally:
+        server.shutdown()
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], path: str = '') -> List[str]:
+    """'name: old -> new (+x%)' for every number present in both reports"""
+    lines = []
+    if isinstance(report, dict) and isinstance(baseline, dict):
+        for key in report:
+            if key in baseline and key not in ('config', 'environment'):
+                lines += compare(report[key], baseline[key], f"{path}.{key}" if path else key)
+    elif isinstance(report, list) and isinstance(baseline, list):
+        for i, (new, old) in enumerate(zip(report, baseline)):
+            lines += compare(new, old, f"{path}[{i}]")
+    elif isinstance(report, (int, float)) and isinstance(baseline, (int, float)) and not isinstance(report, bool):
+        change = f" ({(report - baseline) / baseline:+.1%})" if baseline else ''
+        lines.append(f"{path}: {baseline} -> {report}{change}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=200, help='queries per workload')
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--recall-sample', type=int, default=50, help='queries per workload checked by brute force')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--qps-requests', type=int, default=400, help='requests per concurrency level')
+    parser.add_argument('--vector', action='store_true', help='also benchmark the vector store (needs faiss)')
+    parser.add_argument('--vector-index', default='flat', help='flat | ivf_flat | ivf_pq | hnsw')
+    parser.add_argument('--vector-dim', type=int, default=64)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='also write the report to this file')
+    parser.add_argument('--compare', help='earlier report to compare against')
+    args = parser.parse_args()
+
+    corpus = SyntheticCorpus(seed=args.seed)
+    publications = list(corpus.publications(args.documents))
+    workloads = {kind: corpus.workload(kind, args.queries) for kind in WORKLOADS}
+    mixed = [query for group in zip(*workloads.values()) for query in group]
+
+    report: Dict[str, Any] = {
+        'config': vars(args),
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count(), 'git': git_revision()}
+    }
+    try:
+        with app.app_context():
+            report['build'], chunks = measure_build(publications)
+            report['latency'] = measure_latency(workloads, args.top_k)
+            report['keyword_recall'] = measure_keyword_recall(publications, workloads, args.top_k,
+                                                              args.recall_sample)
+            if args.vector:
+                report['vector'] = measure_vector(chunks, mixed[:args.recall_sample], args.top_k,
+                                                  args.vector_index, args.vector_dim)
+        report['qps'] = measure_qps((mixed * math.ceil(args.qps_requests / len(mixed)))[:args.qps_requests],
+                                    args.concurrency)
+        report['peak_rss_mb'] = peak_rss_mb()
+    finally:
+        history_writer.flush()
+        shutil.rmtree(_WORKDIR, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    if args.compare:
+        with open(args.compare) as f:
+            print('\n'.join(compare(report, json.load(f))), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+from itertools import chain
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+# Cap on query rows x documents scored in one dense accumulator (32 MB of float64)
+MAX_BATCH_CELLS = 1 << 22
+# Below one touched posting per this many cells, scores are reduced sparsely rather than into a dense array
+SPARSE_RATIO = 8
+
+
+class BM25Matrix:
+    """Read-only term-document matrix of BM25 contributions in CSR form
+
+    Row ``term_rows[term]`` holds, for every document containing the term,
+    ``tf * (k1 + 1) / (tf + norm)``; multiplying by the term's IDF and the
+    query term frequency and summing over the query's terms gives the same
+    score as ``InvertedIndex``'s posting-list walk. Scoring a batch of
+    queries is one sparse mat-vec (``np.bincount`` over the gathered rows)
+    and ``np.partition`` picks each query's top_k. Candidate positions from a
+    metadata filter are looked up in each row with ``np.searchsorted`` (rows
+    are sorted by document) when they are fewer than the row's entries, and
+    masked out of it otherwise. Tombstoned documents
+    have zero contributions, but they still count towards IDF and the
+    average length, as in the postings.
+    """
+
+    def __init__(self, term_rows: Dict[str, int], indptr: np.ndarray, doc_ids: np.ndarray,
+                 contributions: np.ndarray, idf: np.ndarray, num_docs: int):
+        self.term_rows = term_rows
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.contributions = contributions
+        self.idf = idf
+        self.num_docs = num_docs
+
+    @classmethod
+    def from_postings(cls, postings: Dict[str, List[Tuple[int, int]]], doc_norms: List[float], k1: float,
+                      deleted: Set[int], idf: List[float]) -> "BM25Matrix":
+        """Pack postings, given each document's length norm and each term's IDF (in postings order)"""
+        num_docs = len(doc_norms)
+        term_rows = {term: row for row, term in enumerate(postings)}
+        lengths = np.fromiter((len(term_postings) for term_postings in postings.values()), dtype=np.int64,
+                              count=len(postings))
+        indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        total = int(indptr[-1])
+
+        flat = np.fromiter(chain.from_iterable(chain.from_iterable(postings.values())), dtype=np.int64,
+                           count=2 * total)
+        doc_ids = flat[0::2].astype(np.int32 if num_docs < 2 ** 31 else np.int64)
+        tf = flat[1::2].astype(np.float64)
+        contributions = tf * (k1 + 1) / (tf + np.asarray(doc_norms, dtype=np.float64)[doc_ids])
+        if deleted:
+            contributions[np.isin(doc_ids, np.fromiter(deleted, dtype=np.int64, count=len(deleted)))] = 0.0
+        return cls(term_rows, indptr, doc_ids, contributions, np.asarray(idf, dtype=np.float64), num_docs)
+
+    def nbytes(self) -> int:
+        return self.indptr.nbytes + self.doc_ids.nbytes + self.contributions.nbytes + self.idf.nbytes
+
+    def search_many(self, query_terms: List[Dict[str, int]], top_k: int,
+                    candidates: Optional[np.ndarray] = None) -> List[List[Tuple[int, float]]]:
+        """Top_k (doc_idx, score) pairs per query, given each query's term frequencies
+
+        ``candidates`` optionally restricts scoring to these sorted document positions.
+        """
+        if candidates is not None:
+            candidates = np.asarray(candidates, dtype=np.int64)
+        results: List[List[Tuple[int, float]]] = []
+        batch = max(1, MAX_BATCH_CELLS // max(self.num_docs, 1))
+        for start in range(0, len(query_terms), batch):
+            results.extend(self._top_k(doc_ids, scores, top_k)
+                           for doc_ids, scores in self._score(query_terms[start:start + batch], candidates))
+        return results
+
+    def _score(self, query_terms: List[Dict[str, int]],
+               candidates: Optional[np.ndarray] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """(doc_ids, scores) of the documents each query matches, from the rows of its terms"""
+        indptr, num_docs = self.indptr, self.num_docs
+        allowed = None  # Candidate mask over all documents, built once a row is longer than the candidates
+        keys, weights = [], []
+        for query_no, terms in enumerate(query_terms):
+            offset = query_no * num_docs
+            for term, query_tf in terms.items():
+                row = self.term_rows.get(term)
+                if row is None:
+                    continue
+                start, end = indptr[row], indptr[row + 1]
+                row_docs = self.doc_ids[start:end]
+                if candidates is None:
+                    docs, contributions = row_docs.astype(np.int64), self.contributions[start:end]
+                elif len(candidates) < end - start:
+                    found = np.minimum(np.searchsorted(row_docs, candidates), end - start - 1)
+                    hit = row_docs[found] == candidates
+                    docs, contributions = candidates[hit], self.contributions[start + found[hit]]
+                else:
+                    if allowed is None:
+                        allowed = np.zeros(num_docs, dtype=bool)
+                        allowed[candidates] = True
+                    hit = allowed[row_docs]
+                    docs, contributions = row_docs[hit].astype(np.int64), self.contributions[start:end][hit]
+                keys.append(docs + offset)
+                weights.append(contributions * (self.idf[row] * query_tf))
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64))
+        if not keys:
+            return [empty] * len(query_terms)
+        keys, weights = np.concatenate(keys), np.concatenate(weights)
+        cells = len(query_terms) * num_docs
+
+        if len(keys) * SPARSE_RATIO < cells:
+            # Few postings touched (rare terms): reduce over the distinct keys instead of every document
+            cells_hit, slots = np.unique(keys, return_inverse=True)
+            sums = np.bincount(slots, weights=weights)
+            bounds = np.searchsorted(cells_hit, np.arange(len(query_terms) + 1) * num_docs)
+            return [(cells_hit[lo:hi] - query_no * num_docs, sums[lo:hi])
+                    for query_no, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:]))]
+
+        dense = np.bincount(keys, weights=weights, minlength=cells).reshape(len(query_terms), num_docs)
+        matched = []
+        for scores in dense:
+            doc_ids = np.flatnonzero(scores)
+            matched.append((doc_ids, scores[doc_ids]))
+        return matched
+
+    @staticmethod
+    def _top_k(doc_ids: np.ndarray, scores: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+        # Tombstoned documents score exactly zero
+        live = scores > 0
+        doc_ids, scores = doc_ids[live], scores[live]
+        if len(scores) > top_k:
+            threshold = np.partition(scores, -top_k)[-top_k]
+            # Keep every document tied with the k-th score so ties resolve by position below
+            keep = scores >= threshold
+            doc_ids, scores = doc_ids[keep], scores[keep]
+        order = np.lexsort((doc_ids, -scores))[:top_k]
+        return list(zip(doc_ids[order].tolist(), scores[order].tolist()))
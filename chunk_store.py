@@ -0,0 +1,189 @@
+import mmap
+import os
+import struct
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional, Set
+
+import numpy as np
+
+MAGIC = b'RAGCHK01'
+HEADER = struct.Struct('<8sQQQQ')  # magic, rows, strings, tombstones, next_id
+METADATA_COLUMNS = ('title', 'username', 'license', 'pub_id')
+NULL_STRING = -1
+
+
+def _aligned(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+class ChunkStore(MutableMapping):
+    """Chunk texts and metadata keyed by FAISS id, backed by a memory-mapped file
+
+    The file holds fixed-width columns (sorted ids, text offsets, and one
+    interned-string column per metadata field) followed by a string table and
+    a UTF-8 text blob. Opening it only maps the file, so startup does no
+    deserialization, worker processes share the page cache, and a chunk's text
+    is decoded only when that chunk is looked up. Additions and deletions made
+    after opening are kept in an in-memory overlay until the next ``write``.
+    Chunks are stored as ``{'id', 'text', 'metadata'}`` with the metadata keys
+    in METADATA_COLUMNS.
+    """
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self.tombstones: Set[int] = set()
+        self.next_id = 0
+        self._mmap = None
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._added: Dict[int, Dict[str, Any]] = {}
+        self._removed: Set[int] = set()
+
+    @classmethod
+    def open(cls, path: str) -> "ChunkStore":
+        """Map a chunk store file written by ``write``"""
+        store = cls()
+        store.path = path
+        with open(path, 'rb') as f:
+            store._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        buffer = store._mmap
+        magic, rows, strings, tombstones, next_id = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a chunk store file")
+        store.next_id = next_id
+
+        offset = HEADER.size
+
+        def column(dtype, count):
+            nonlocal offset
+            array = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+            offset = _aligned(offset + array.nbytes)
+            return array
+
+        store._ids = column(np.int64, rows)
+        store._text_offsets = column(np.uint64, rows + 1)
+        store._chunk_ids = column(np.int32, rows)
+        store._columns = [column(np.int32, rows) for _ in METADATA_COLUMNS]
+        store.tombstones = set(column(np.int64, tombstones).tolist())
+        store._string_offsets = column(np.uint64, strings + 1)
+        store._string_base = offset
+        store._text_base = _aligned(offset + int(store._string_offsets[-1]))
+        return store
+
+    @staticmethod
+    def write(path: str, documents: Mapping[int, Dict[str, Any]], tombstones: Iterable[int] = (),
+              next_id: int = 0):
+        """Write chunks to ``path`` atomically (via a temporary file and rename)"""
+        ids = np.array(sorted(documents), dtype=np.int64)
+        strings: Dict[str, int] = {}
+
+        def intern(value: Optional[str]) -> int:
+            if value is None:
+                return NULL_STRING
+            return strings.setdefault(value, len(strings))
+
+        text_offsets = np.zeros(len(ids) + 1, dtype=np.uint64)
+        chunk_ids = np.zeros(len(ids), dtype=np.int32)
+        columns = [np.zeros(len(ids), dtype=np.int32) for _ in METADATA_COLUMNS]
+        texts = []
+        position = 0
+        for row, doc_id in enumerate(ids.tolist()):
+            doc = documents[doc_id]
+            encoded = doc['text'].encode('utf-8')
+            texts.append(encoded)
+            position += len(encoded)
+            text_offsets[row + 1] = position
+            chunk_ids[row] = intern(str(doc['id']))
+            metadata = doc.get('metadata', {})
+            for values, name in zip(columns, METADATA_COLUMNS):
+                values[row] = intern(metadata.get(name))
+
+        encoded_strings = [value.encode('utf-8') for value in strings]
+        string_offsets = np.zeros(len(encoded_strings) + 1, dtype=np.uint64)
+        string_offsets[1:] = np.cumsum([len(value) for value in encoded_strings], dtype=np.uint64)
+        tombstone_array = np.array(sorted(tombstones), dtype=np.int64)
+
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(ids), len(encoded_strings), len(tombstone_array), next_id))
+
+            def write_aligned(data: bytes):
+                f.write(data)
+                f.write(b'\0' * (_aligned(f.tell()) - f.tell()))
+
+            for array in [ids, text_offsets, chunk_ids, *columns, tombstone_array, string_offsets]:
+                write_aligned(array.tobytes())
+            write_aligned(b''.join(encoded_strings))
+            f.write(b''.join(texts))
+        os.replace(temp_path, path)
+
+    def _string(self, index: int) -> Optional[str]:
+        if index == NULL_STRING:
+            return None
+        start = self._string_base + int(self._string_offsets[index])
+        end = self._string_base + int(self._string_offsets[index + 1])
+        return self._mmap[start:end].decode('utf-8')
+
+    def _row(self, doc_id: int) -> int:
+        """Row of a FAISS id in the mapped file, or -1"""
+        row = int(np.searchsorted(self._ids, doc_id))
+        if row < len(self._ids) and self._ids[row] == doc_id:
+            return row
+        return -1
+
+    def _materialize(self, row: int) -> Dict[str, Any]:
+        start = self._text_base + int(self._text_offsets[row])
+        end = self._text_base + int(self._text_offsets[row + 1])
+        return {
+            'id': self._string(self._chunk_ids[row]),
+            'text': self._mmap[start:end].decode('utf-8'),
+            'metadata': {name: self._string(values[row]) for name, values in zip(METADATA_COLUMNS, self._columns)}
+        }
+
+    def __getitem__(self, doc_id: int) -> Dict[str, Any]:
+        if doc_id in self._added:
+            return self._added[doc_id]
+        if doc_id not in self._removed:
+            row = self._row(doc_id)
+            if row >= 0:
+                return self._materialize(row)
+        raise KeyError(doc_id)
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self._added or (doc_id not in self._removed and self._row(doc_id) >= 0)
+
+    def __setitem__(self, doc_id: int, doc: Dict[str, Any]):
+        if self._row(doc_id) >= 0:
+            self._removed.add(doc_id)
+        self._added[doc_id] = doc
+
+    def __delitem__(self, doc_id: int):
+        if doc_id in self._added:
+            del self._added[doc_id]
+        elif doc_id not in self._removed and self._row(doc_id) >= 0:
+            self._removed.add(doc_id)
+        else:
+            raise KeyError(doc_id)
+
+    def __iter__(self) -> Iterator[int]:
+        for doc_id in self._ids.tolist():
+            if doc_id not in self._removed:
+                yield doc_id
+        yield from self._added
+
+    def __len__(self) -> int:
+        return len(self._ids) - len(self._removed) + len(self._added)
+
+    def pub_chunks(self) -> Dict[str, list]:
+        """Group FAISS ids by publication without materializing any chunk"""
+        groups: Dict[str, list] = {}
+        if len(self._ids):
+            pub_column = self._columns[METADATA_COLUMNS.index('pub_id')]
+            names = {index: self._string(index) for index in np.unique(pub_column).tolist()}
+            for doc_id, index in zip(self._ids.tolist(), pub_column.tolist()):
+                if doc_id not in self._removed:
+                    groups.setdefault(names[index], []).append(doc_id)
+        for doc_id, doc in self._added.items():
+            pub_id = doc.get('metadata', {}).get('pub_id') or doc['id']
+            groups.setdefault(pub_id, []).append(doc_id)
+        return groups
@@ -0,0 +1,159 @@
+import logging
+import os
+import re
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Span = Tuple[int, int]
+TokenizeFn = Callable[[str], List[Span]]
+
+# Words, numbers and individual punctuation marks; close to how BPE encoders
+# split prose, without needing an encoder download
+LOCAL_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+SENTENCE_END = ".!?"
+
+
+def local_token_spans(text: str) -> List[Span]:
+    """Character spans of the tokens in text, using the local regex tokenizer"""
+    return [match.span() for match in LOCAL_TOKEN_PATTERN.finditer(text)]
+
+
+def tiktoken_spans(encoding_name: str) -> TokenizeFn:
+    """Tokenizer backed by a tiktoken encoding (raises if tiktoken is unavailable)"""
+    import tiktoken
+    encoding = tiktoken.get_encoding(encoding_name)
+
+    def spans(text: str) -> List[Span]:
+        tokens = encoding.encode(text, disallowed_special=())
+        _, offsets = encoding.decode_with_offsets(tokens)
+        ends = offsets[1:] + [len(text)]
+        return [(start, max(start, end)) for start, end in zip(offsets, ends)]
+
+    return spans
+
+
+def get_tokenizer(name: Optional[str] = None) -> TokenizeFn:
+    """Resolve CHUNK_TOKENIZER ('local' or a tiktoken encoding name), falling back to the local tokenizer"""
+    name = name or os.environ.get("CHUNK_TOKENIZER", "local")
+    if name == "local":
+        return local_token_spans
+    try:
+        return tiktoken_spans(name)
+    except Exception as e:
+        logger.warning(f"Tokenizer '{name}' unavailable ({e}), using the local tokenizer")
+        return local_token_spans
+
+
+class DocumentChunk(Mapping):
+    """A chunk stored as a span of its publication's text
+
+    Chunks of one publication share the source string and the metadata dict,
+    so nothing is copied until ``text`` is read. It behaves like the
+    ``{'id', 'text', 'metadata'}`` dicts the vector store and chunk store use.
+    """
+
+    __slots__ = ('pub_id', 'start', 'end', 'id', 'source', 'metadata')
+    _KEYS = ('id', 'text', 'metadata')
+
+    def __init__(self, pub_id: str, start: int, end: int, chunk_id: str, source: str, metadata: Dict[str, Any]):
+        self.pub_id = pub_id
+        self.start = start
+        self.end = end
+        self.id = chunk_id
+        self.source = source
+        self.metadata = metadata
+
+    @property
+    def text(self) -> str:
+        return self.source[self.start:self.end]
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._KEYS)
+
+    def __len__(self) -> int:
+        return len(self._KEYS)
+
+    def copy(self) -> Dict[str, Any]:
+        return dict(self)
+
+    def __repr__(self) -> str:
+        return f"DocumentChunk({self.id!r}, {self.start}:{self.end})"
+
+
+class Chunker:
+    """Split publication texts into overlapping chunks measured in tokens
+
+    A chunk holds at most ``max_tokens`` tokens and repeats the last
+    ``overlap`` tokens of the chunk before it. When a publication is too long
+    for one chunk, each cut is moved back to the nearest paragraph/heading
+    break, or failing that a sentence end, as long as the chunk keeps at least
+    ``min_tokens`` tokens.
+    """
+
+    def __init__(self, max_tokens: int = None, overlap: int = None, min_tokens: int = None,
+                 tokenizer: Optional[TokenizeFn] = None):
+        self.max_tokens = max_tokens or int(os.environ.get("CHUNK_MAX_TOKENS", 350))
+        overlap = overlap if overlap is not None else int(os.environ.get("CHUNK_OVERLAP_TOKENS", 40))
+        self.overlap = max(0, min(overlap, self.max_tokens // 2))
+        self.min_tokens = min_tokens or max(1, self.max_tokens // 2)
+        self.tokenize = tokenizer or get_tokenizer()
+
+    @staticmethod
+    def publication_text(pub) -> str:
+        """Text representation of a publication that chunks are cut from"""
+        text = f"Title: {pub.title}\n\nAuthor: {pub.username}\n\n"
+        if pub.license:
+            text += f"License: {pub.license}\n\n"
+        return text + f"Description: {pub.description}"
+
+    def spans(self, text: str) -> List[Span]:
+        """Character (start, end) spans of the chunks of text"""
+        tokens = self.tokenize(text)
+        if len(tokens) <= self.max_tokens:
+            return [(0, len(text))] if text.strip() else []
+
+        spans = []
+        first = end = 0
+        while end < len(tokens):
+            # Every chunk must reach past the previous one, whatever the overlap
+            lowest = max(first + self.min_tokens, end + 1)
+            end = min(first + self.max_tokens, len(tokens))
+            if end < len(tokens):
+                end = self._boundary(text, tokens, lowest, end)
+            spans.append((tokens[first][0], tokens[end - 1][1]))
+            first = max(end - self.overlap, first + 1)
+        return spans
+
+    @staticmethod
+    def _boundary(text: str, tokens: List[Span], lowest: int, end: int) -> int:
+        """Best token index <= end to cut before: a paragraph break, else a sentence end, else end"""
+        sentence = None
+        for cut in range(end, lowest - 1, -1):
+            gap = text[tokens[cut - 1][1]:tokens[cut][0]]
+            if '\n\n' in gap:
+                return cut
+            if sentence is None and ('\n' in gap or text[tokens[cut - 1][1] - 1] in SENTENCE_END):
+                sentence = cut
+        return sentence or end
+
+    def chunk_publication(self, pub) -> List[DocumentChunk]:
+        """Chunks of one publication; a publication that fits in one chunk keeps its ID"""
+        text = self.publication_text(pub)
+        metadata = {'title': pub.title, 'username': pub.username, 'license': pub.license, 'pub_id': pub.id}
+        spans = self.spans(text)
+        if len(spans) == 1:
+            return [DocumentChunk(pub.id, spans[0][0], spans[0][1], pub.id, text, metadata)]
+        return [DocumentChunk(pub.id, start, end, f"{pub.id}_{number}", text, metadata)
+                for number, (start, end) in enumerate(spans)]
+
+    def iter_chunks(self, publications: Iterable[Any]) -> Iterator[DocumentChunk]:
+        """Lazily chunk publications, one publication at a time"""
+        for pub in publications:
+            yield from self.chunk_publication(pub)
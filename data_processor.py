@@ -1,17 +1,74 @@
 import json
 import logging
-import re
-from typing import List, Dict, Any
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator
+from sqlalchemy import insert
 from app import app, db
+from chunker import Chunker, DocumentChunk
+from db_search import database_search, SEARCH_BACKEND
 from models import Publication
+from text_cleaning import clean_description, clean_descriptions
 
 logger = logging.getLogger(__name__)
 
+PUBLICATIONS_JSON = 'attached_assets/project_1_publications_1749806909080.json'
+PUBLICATION_FIELDS = ('username', 'license', 'title', 'description')
+
+def iter_json_records(json_file_path: str, chunk_size: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """Incrementally parse a JSON array or JSON Lines file, yielding one record at a time"""
+    decoder = json.JSONDecoder()
+    with open(json_file_path, 'r', encoding='utf-8') as file:
+        buffer = file.read(chunk_size)
+        pos = len(buffer) - len(buffer.lstrip())
+        if buffer[pos:pos + 1] != '[':
+            # JSON Lines: one record per line
+            file.seek(0)
+            for line_number, line in enumerate(file, start=1):
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as e:
+                        logger.error(f"Skipping malformed record on line {line_number}: {e}")
+            return
+        
+        pos += 1
+        while True:
+            # Skip whitespace and separators, reading more input as needed
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer):
+                more = file.read(chunk_size)
+                if not more:
+                    raise ValueError(f"Unexpected end of JSON array in {json_file_path}")
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            if buffer[pos] == ']':
+                return
+            
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # The record is cut off at the end of the buffer
+                more = file.read(chunk_size)
+                if not more:
+                    raise
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            yield record
+            pos = end
+            if pos > chunk_size:
+                buffer, pos = buffer[pos:], 0
+
 class PublicationProcessor:
     """Processes publication data for RAG system"""
     
-    def __init__(self):
+    def __init__(self, chunker: Chunker = None):
         self.publications = []
+        self.chunker = chunker or Chunker()
     
     def load_publications_from_json(self, json_file_path: str) -> List[Dict[str, Any]]:
         """Load publications from the provided JSON file"""
@@ -27,66 +84,142 @@ class PublicationProcessor:
     
     def clean_description(self, description: str) -> str:
         """Clean and format publication description"""
-        if not description:
-            return ""
-        
-        # Remove image references and dividers
-        cleaned = re.sub(r'!\[.*?\]\(.*?\)', '', description)
-        cleaned = re.sub(r'--DIVIDER--', '\n\n', cleaned)
-        
-        # Remove markdown formatting
-        cleaned = re.sub(r'\*\*(.*?)\*\*', r'\1', cleaned)  # Bold
-        cleaned = re.sub(r'\*(.*?)\*', r'\1', cleaned)      # Italic
-        cleaned = re.sub(r'`(.*?)`', r'\1', cleaned)        # Code
-        cleaned = re.sub(r'#+ ', '', cleaned)               # Headers
-        
-        # Remove YouTube embeds
-        cleaned = re.sub(r':::youtube\[.*?\]\{.*?\}', '', cleaned)
-        
-        # Clean up whitespace
-        cleaned = re.sub(r'\n\s*\n', '\n\n', cleaned)
-        cleaned = cleaned.strip()
+        return clean_description(description)
+    
+    def store_publications_in_db(self, publications: Iterable[Dict[str, Any]]):
+        """Store publications in database
+
+        New and changed publications are left with ``processed=False`` so the
+        search indexes pick them up on their next incremental sync. With
+        SEARCH_BACKEND=database the full-text index is created first and then
+        updated in the same transactions as the rows.
+        """
+        return self.ingest_records(publications)
+    
+    def ingest_file(self, json_file_path: str, batch_size: int = None, workers: int = None) -> Dict[str, Any]:
+        """Stream a JSON array or JSON Lines dump into the database"""
+        try:
+            return self.ingest_records(iter_json_records(json_file_path), batch_size=batch_size, workers=workers)
+        except Exception as e:
+            logger.error(f"Error ingesting publications from {json_file_path}: {e}")
+            return {}
+    
+    def ingest_records(self, records: Iterable[Dict[str, Any]], batch_size: int = None,
+                       update_existing: bool = True, workers: int = None) -> Dict[str, Any]:
+        """Clean, dedup and bulk-insert publication records in batches
+
+        Records are deduplicated against a prefetched set of stored IDs (and
+        against earlier records in the same stream). New records are inserted
+        with one executemany per batch, existing ones are compared in a single
+        query per batch and updated only if changed, and every batch is
+        committed on its own so memory stays flat however large the dump is.
+        With ``workers`` > 1 descriptions are cleaned in a process pool.
+        """
+        batch_size = batch_size or int(os.environ.get("INGEST_BATCH_SIZE", 500))
+        workers = workers or int(os.environ.get("INGEST_CLEAN_WORKERS", 1))
+        stats = {'read': 0, 'inserted': 0, 'updated': 0, 'skipped': 0, 'errors': 0}
+        start_time = time.perf_counter()
         
-        # Truncate if too long (keep first 5000 characters for manageable chunk sizes)
-        if len(cleaned) > 5000:
-            cleaned = cleaned[:5000] + "..."
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            with app.app_context():
+                if SEARCH_BACKEND == 'database':
+                    database_search.ensure_schema()
+                existing_ids = {pub_id for (pub_id,) in db.session.query(Publication.id)}
+                seen = set()
+                for batch in self._clean_batches(records, batch_size, stats, executor):
+                    new_rows, existing_rows = [], []
+                    for row in batch:
+                        if row['id'] in seen:
+                            stats['skipped'] += 1
+                            continue
+                        seen.add(row['id'])
+                        (existing_rows if row['id'] in existing_ids else new_rows).append(row)
+                    
+                    try:
+                        if new_rows:
+                            db.session.execute(insert(Publication), new_rows)
+                        updated = self._update_changed(existing_rows) if update_existing else 0
+                        db.session.commit()
+                        existing_ids.update(row['id'] for row in new_rows)
+                        stats['inserted'] += len(new_rows)
+                        stats['updated'] += updated
+                        stats['skipped'] += len(existing_rows) - updated
+                    except Exception as e:
+                        logger.error(f"Error committing batch of {len(batch)} publications: {e}")
+                        db.session.rollback()
+                        stats['errors'] += len(new_rows) + len(existing_rows)
+                    logger.debug(f"Ingested {stats['read']} publications so far")
+        finally:
+            if executor is not None:
+                executor.shutdown()
         
-        return cleaned
+        stats['seconds'] = round(time.perf_counter() - start_time, 3)
+        stats['records_per_second'] = round(stats['read'] / stats['seconds'], 1) if stats['seconds'] else 0.0
+        logger.info(f"Successfully stored publications in database: {stats}")
+        return stats
     
-    def store_publications_in_db(self, publications: List[Dict[str, Any]]):
-        """Store publications in database"""
-        with app.app_context():
-            for pub_data in publications:
+    def _clean_batches(self, records: Iterable[Dict[str, Any]], batch_size: int, stats: Dict[str, Any],
+                       executor: ProcessPoolExecutor = None) -> Iterator[List[Dict[str, Any]]]:
+        """Turn raw publication records into batches of Publication column mappings"""
+        records = iter(records)
+        while True:
+            raw = list(islice(records, batch_size))
+            if not raw:
+                return
+            stats['read'] += len(raw)
+            rows = []
+            for pub_data in raw:
                 try:
-                    # Check if publication already exists
-                    existing = Publication.query.filter_by(id=pub_data['id']).first()
-                    if existing:
-                        logger.debug(f"Publication {pub_data['id']} already exists")
-                        continue
-                    
-                    # Clean the description
-                    cleaned_description = self.clean_description(pub_data.get('publication_description', ''))
-                    
-                    publication = Publication(
-                        id=pub_data['id'],
-                        username=pub_data.get('username', ''),
-                        license=pub_data.get('license', ''),
-                        title=pub_data.get('title', ''),
-                        description=cleaned_description
-                    )
-                    
-                    db.session.add(publication)
-                    logger.debug(f"Added publication: {publication.title}")
-                    
+                    rows.append({
+                        'id': pub_data['id'],
+                        'username': pub_data.get('username', ''),
+                        'license': pub_data.get('license', ''),
+                        'title': pub_data.get('title', ''),
+                        'description': pub_data.get('publication_description', ''),
+                        'processed': False
+                    })
                 except Exception as e:
-                    logger.error(f"Error processing publication {pub_data.get('id', 'unknown')}: {e}")
-                    continue
-            
+                    logger.error(f"Error processing publication {pub_data.get('id', 'unknown') if isinstance(pub_data, dict) else 'unknown'}: {e}")
+                    stats['errors'] += 1
+            try:
+                descriptions = clean_descriptions([row['description'] for row in rows], executor=executor)
+            except Exception as e:
+                logger.error(f"Error cleaning batch of {len(rows)} publications: {e}")
+                stats['errors'] += len(rows)
+                continue
+            for row, description in zip(rows, descriptions):
+                row['description'] = description
+            yield rows
+    
+    def _update_changed(self, rows: List[Dict[str, Any]]) -> int:
+        """Update stored publications whose content differs, flagging them for reindexing"""
+        if not rows:
+            return 0
+        stored = {pub.id: pub for pub in Publication.query.filter(Publication.id.in_([row['id'] for row in rows]))}
+        updated = 0
+        for row in rows:
+            existing = stored.get(row['id'])
+            if existing is None:
+                continue
+            changed = {key: row[key] for key in PUBLICATION_FIELDS if getattr(existing, key) != row[key]}
+            if changed:
+                for key, value in changed.items():
+                    setattr(existing, key, value)
+                existing.processed = False
+                updated += 1
+                logger.debug(f"Updated publication: {existing.title}")
+        return updated
+    
+    def delete_publications(self, pub_ids: List[str]):
+        """Delete publications; the indexes drop them on their next sync"""
+        with app.app_context():
             try:
+                Publication.query.filter(Publication.id.in_(pub_ids)).delete(synchronize_session=False)
                 db.session.commit()
-                logger.info(f"Successfully stored publications in database")
+                logger.info(f"Deleted {len(pub_ids)} publications")
             except Exception as e:
-                logger.error(f"Error committing publications to database: {e}")
+                logger.error(f"Error deleting publications: {e}")
                 db.session.rollback()
     
     def get_all_publications(self) -> List[Publication]:
@@ -96,81 +229,22 @@ class PublicationProcessor:
     
     def create_document_chunks(self, publications: List[Publication]) -> List[Dict[str, Any]]:
         """Create document chunks for vector store"""
-        chunks = []
-        
-        for pub in publications:
-            # Create a comprehensive text representation
-            full_text = f"Title: {pub.title}\n\n"
-            full_text += f"Author: {pub.username}\n\n"
-            if pub.license:
-                full_text += f"License: {pub.license}\n\n"
-            full_text += f"Description: {pub.description}"
-            
-            # Split into smaller chunks if the text is very long
-            max_chunk_size = 1500
-            if len(full_text) <= max_chunk_size:
-                chunks.append({
-                    'id': pub.id,
-                    'text': full_text,
-                    'metadata': {
-                        'title': pub.title,
-                        'username': pub.username,
-                        'license': pub.license,
-                        'pub_id': pub.id
-                    }
-                })
-            else:
-                # Split into smaller chunks
-                words = full_text.split()
-                current_chunk = []
-                current_length = 0
-                
-                for word in words:
-                    if current_length + len(word) + 1 > max_chunk_size and current_chunk:
-                        chunk_text = ' '.join(current_chunk)
-                        chunks.append({
-                            'id': f"{pub.id}_{len(chunks)}",
-                            'text': chunk_text,
-                            'metadata': {
-                                'title': pub.title,
-                                'username': pub.username,
-                                'license': pub.license,
-                                'pub_id': pub.id
-                            }
-                        })
-                        current_chunk = []
-                        current_length = 0
-                    
-                    current_chunk.append(word)
-                    current_length += len(word) + 1
-                
-                # Add the last chunk
-                if current_chunk:
-                    chunk_text = ' '.join(current_chunk)
-                    chunks.append({
-                        'id': f"{pub.id}_{len(chunks)}",
-                        'text': chunk_text,
-                        'metadata': {
-                            'title': pub.title,
-                            'username': pub.username,
-                            'license': pub.license,
-                            'pub_id': pub.id
-                        }
-                    })
-        
+        chunks = list(self.iter_document_chunks(publications))
         logger.info(f"Created {len(chunks)} document chunks")
         return chunks
+    
+    def iter_document_chunks(self, publications: Iterable[Publication]) -> Iterator[DocumentChunk]:
+        """Lazily chunk publications so the indexer can consume them as a stream"""
+        return self.chunker.iter_chunks(publications)
 
 def initialize_data():
     """Initialize data processing - load and store publications"""
     processor = PublicationProcessor()
     
-    # Load publications from the attached JSON file
-    publications = processor.load_publications_from_json('attached_assets/project_1_publications_1749806909080.json')
+    # Stream publications from the attached JSON file into the database
+    stats = processor.ingest_file(PUBLICATIONS_JSON)
     
-    if publications:
-        # Store in database
-        processor.store_publications_in_db(publications)
+    if stats.get('read'):
         logger.info("Data initialization completed")
     else:
         logger.error("No publications loaded - data initialization failed")
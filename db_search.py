@@ -0,0 +1,273 @@
+import logging
+import os
+import pickle
+import threading
+from typing import List, Dict, Any, Iterable, Optional, Set, Tuple
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import DatabaseError
+from inverted_index import tokenize
+from metadata_filter import SearchFilter
+from models import Publication
+from simple_search import PublicationRecord, SNAPSHOT_FORMAT, EXCERPT_CHARS, search_results
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# 'memory' keeps a BM25 index in every process, 'sharded' splits it across SEARCH_SHARDS processes,
+# 'database' ranks with SQLite FTS5 or PostgreSQL full-text search
+SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "memory").lower()
+# Text search configuration of the PostgreSQL tsvector column (stemming and stop words)
+POSTGRES_TEXT_CONFIG = os.environ.get("SEARCH_TEXT_CONFIG", "english")
+
+# External-content FTS5 table over the publication table's rowids, kept current by triggers.
+# publication has a string primary key, so these are implicit rowids that VACUUM may renumber;
+# initialize() checks the index against the table and rebuilds it when they no longer match
+SQLITE_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS publication_fts USING fts5("
+    "title, description, content='publication', content_rowid='rowid', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS publication_fts_insert AFTER INSERT ON publication BEGIN "
+    "INSERT INTO publication_fts(rowid, title, description) VALUES (new.rowid, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS publication_fts_delete AFTER DELETE ON publication BEGIN "
+    "INSERT INTO publication_fts(publication_fts, rowid, title, description) "
+    "VALUES ('delete', old.rowid, old.title, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS publication_fts_update AFTER UPDATE OF title, description ON publication BEGIN "
+    "INSERT INTO publication_fts(publication_fts, rowid, title, description) "
+    "VALUES ('delete', old.rowid, old.title, old.description); "
+    "INSERT INTO publication_fts(rowid, title, description) VALUES (new.rowid, new.title, new.description); END",
+)
+# bm25() is lower for better matches; ORDER BY rank lets FTS5 use its own bm25 ordering
+SQLITE_QUERY = (
+    f"SELECT p.id, p.title, p.username, p.license, substr(p.description, 1, {EXCERPT_CHARS}) AS description, "
+    "-publication_fts.rank AS score FROM publication_fts JOIN publication p ON p.rowid = publication_fts.rowid "
+    "WHERE publication_fts MATCH :query{filters} ORDER BY publication_fts.rank LIMIT :top_k"
+)
+
+# A generated column is recomputed by PostgreSQL on every insert and update
+POSTGRES_SCHEMA = (
+    "ALTER TABLE publication ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS "
+    f"(to_tsvector('{POSTGRES_TEXT_CONFIG}', coalesce(title, '') || ' ' || coalesce(description, ''))) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_publication_search_vector ON publication USING GIN (search_vector)",
+)
+# Rank normalization 1 divides by 1 + log(document length), like BM25's length norm
+POSTGRES_QUERY = (
+    f"SELECT id, title, username, license, substr(description, 1, {EXCERPT_CHARS}) AS description, "
+    "ts_rank(search_vector, query, 1) AS score "
+    f"FROM publication p, to_tsquery('{POSTGRES_TEXT_CONFIG}', :query) AS query "
+    "WHERE search_vector @@ query{filters} ORDER BY score DESC, id LIMIT :top_k"
+)
+# Metadata filter conditions on the publication table (aliased p); the planner uses the primary key for IDs
+FILTER_CONDITIONS = (
+    ('ids', "p.id IN :ids"),
+    ('usernames', "p.username IN :usernames"),
+    ('licenses', "coalesce(p.license, '') IN :licenses"),
+    ('created_after', "p.created_at >= :created_after"),
+    ('created_before', "p.created_at < :created_before"),
+)
+
+
+def filter_sql(search_filter: Optional[SearchFilter]) -> Tuple[str, Dict[str, Any], List]:
+    """AND-ed conditions (each prefixed with ' AND '), their parameters and bind parameter types"""
+    if search_filter is None:
+        return '', {}, []
+    conditions, params, binds = [], {}, []
+    for field, condition in FILTER_CONDITIONS:
+        value = getattr(search_filter, field)
+        if not value:
+            continue
+        conditions.append(f" AND {condition}")
+        if isinstance(value, frozenset):
+            params[field] = sorted(value)
+            binds.append(bindparam(field, expanding=True))
+        else:
+            params[field] = value
+            # Let the dialect format datetimes the way it stores created_at
+            binds.append(bindparam(field, type_=db.DateTime))
+    return ''.join(conditions), params, binds
+
+
+class DatabaseTextSearch:
+    """Keyword search ranked inside the database, so no process holds a copy of the corpus
+
+    SQLite uses an FTS5 table ranked with bm25(); PostgreSQL a GIN-indexed
+    tsvector column ranked with ts_rank. Both follow the publication table
+    in the same transaction as every insert, update and delete (triggers and a
+    generated column), so ``upsert_publications`` and ``remove_publications``
+    only move the corpus version on. Query terms are OR-ed, like the BM25
+    index. The version is derived from the table (row count and latest
+    ``updated_at``), so every process agrees on it and writes made outside
+    the app change it too.
+    """
+    
+    def __init__(self):
+        self.is_initialized = False
+        self.dialect: Optional[str] = None
+        self._lock = threading.Lock()
+        self._version = '0'
+    
+    def ensure_schema(self) -> bool:
+        """Create the full-text index for the configured database if it is missing; needs an app context"""
+        dialect = db.engine.dialect.name
+        if dialect == 'sqlite':
+            statements = SQLITE_SCHEMA
+        elif dialect == 'postgresql':
+            statements = POSTGRES_SCHEMA
+        else:
+            logger.error(f"Database full-text search is not supported on {dialect}")
+            return False
+        with db.engine.begin() as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+        self.dialect = dialect
+        return True
+    
+    def initialize(self):
+        """Set up the full-text index, filling it from publications stored before it existed"""
+        try:
+            if not self.ensure_schema():
+                self.is_initialized = False
+                return
+            if self.dialect == 'sqlite':
+                with db.engine.begin() as conn:
+                    indexed = conn.execute(text("SELECT count(*) FROM publication_fts_docsize")).scalar()
+                    stored = conn.execute(text("SELECT count(*) FROM publication")).scalar()
+                    if indexed != stored:
+                        logger.info(f"Rebuilding the FTS5 index ({indexed} of {stored} publications indexed)")
+                        conn.execute(text("INSERT INTO publication_fts(publication_fts) VALUES ('rebuild')"))
+                        indexed = stored
+                if indexed == stored and not self._index_intact():
+                    logger.warning("FTS5 index no longer matches the publication table (rowids renumbered?), "
+                                   "rebuilding it")
+                    with db.engine.begin() as conn:
+                        conn.execute(text("INSERT INTO publication_fts(publication_fts) VALUES ('rebuild')"))
+            self._refresh_version()
+            self.is_initialized = True
+            logger.info(f"Initialized {self.get_stats()['search_method']} search")
+        except Exception as e:
+            logger.error(f"Error initializing database search: {e}")
+            self.is_initialized = False
+    
+    @staticmethod
+    def _index_intact() -> bool:
+        """FTS5 integrity check, comparing the index with the rows the publication table holds under each rowid"""
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(text("INSERT INTO publication_fts(publication_fts, rank) VALUES ('integrity-check', 1)"))
+            return True
+        except DatabaseError:
+            return False
+    
+    def _refresh_version(self):
+        """Read the corpus version from the table: row count plus the latest write"""
+        with db.engine.connect() as conn:
+            count, latest = conn.execute(text("SELECT count(*), max(updated_at) FROM publication")).one()
+        with self._lock:
+            self._version = f"{count}-{latest or 0}"
+    
+    def upsert_publications(self, publications: Iterable[Publication]):
+        """The index already holds every stored publication; only the corpus version changes"""
+        if list(publications):
+            self._refresh_version()
+    
+    def remove_publications(self, pub_ids: Iterable[str]):
+        if list(pub_ids):
+            self._refresh_version()
+    
+    def compact(self, max_tombstone_ratio: float = 0.2) -> bool:
+        return False
+    
+    def compile(self):
+        pass
+    
+    def indexed_ids(self) -> Set[str]:
+        """The index mirrors the publication table, so it never holds deleted IDs"""
+        with db.engine.connect() as conn:
+            return {pub_id for (pub_id,) in conn.execute(text("SELECT id FROM publication"))}
+    
+    def save_snapshot(self, path: str):
+        """Record the corpus version; the index itself lives in the database"""
+        temporary = f"{path}.tmp-{os.getpid()}"
+        with open(temporary, 'wb') as f:
+            pickle.dump({'format': SNAPSHOT_FORMAT, 'backend': 'database', 'corpus_version': self.corpus_version}, f)
+        os.replace(temporary, path)
+    
+    def load_snapshot(self, path: str) -> bool:
+        """Adopt the corpus version of a snapshot written by ``save_snapshot``"""
+        try:
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+        except Exception as e:
+            logger.error(f"Error loading keyword index snapshot {path}: {e}")
+            return False
+        if state.get('format') != SNAPSHOT_FORMAT or state.get('backend') != 'database':
+            logger.warning(f"Keyword index snapshot {path} was not written by the database backend, rebuilding instead")
+            return False
+        if self.dialect is None and not self.ensure_schema():
+            return False
+        with self._lock:
+            self._version = state['corpus_version']
+        self.is_initialized = True
+        return True
+    
+    @property
+    def corpus_version(self) -> str:
+        with self._lock:
+            return self._version
+    
+    def match_expression(self, query: str) -> Optional[str]:
+        """OR of the query's terms in the dialect's syntax (terms are word characters only, so nothing to escape)"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return None
+        if self.dialect == 'sqlite':
+            return ' OR '.join(f'"{term}"' for term in terms)
+        return ' | '.join(terms)
+    
+    def matching_ids(self, search_filter: SearchFilter) -> Set[str]:
+        """IDs of the stored publications the filter allows"""
+        conditions, params, binds = filter_sql(search_filter)
+        statement = text(f"SELECT p.id FROM publication p WHERE 1 = 1{conditions}").bindparams(*binds)
+        with db.engine.connect() as conn:
+            return {pub_id for (pub_id,) in conn.execute(statement, params)}
+    
+    def search(self, query: str, top_k: int = 5, search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """Keyword search ranked by the database"""
+        return self.search_many([query], top_k=top_k, search_filter=search_filter)[0]
+    
+    def search_many(self, queries: List[str], top_k: int = 5,
+                    search_filter: Optional[SearchFilter] = None) -> List[List[Dict[str, Any]]]:
+        """One ranked query per question over a single connection, with any filter as extra conditions"""
+        if not self.is_initialized or top_k <= 0:
+            return [[] for _ in queries]
+        conditions, params, binds = filter_sql(search_filter)
+        statement = text((SQLITE_QUERY if self.dialect == 'sqlite' else POSTGRES_QUERY).format(filters=conditions))
+        statement = statement.bindparams(*binds)
+        all_results = []
+        try:
+            with db.engine.connect() as conn:
+                for query in queries:
+                    expression = self.match_expression(query)
+                    rows = conn.execute(statement, dict(params, query=expression, top_k=top_k)) if expression else []
+                    all_results.append(search_results([(PublicationRecord.of(row), float(row.score)) for row in rows]))
+        except Exception as e:
+            logger.error(f"Error searching the database full-text index: {e}")
+            return [[] for _ in queries]
+        logger.debug(f"Found {sum(len(results) for results in all_results)} relevant documents "
+                     f"for {len(queries)} queries")
+        return all_results
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get search statistics"""
+        total = 0
+        if self.is_initialized:
+            with db.engine.connect() as conn:
+                total = conn.execute(text("SELECT count(*) FROM publication")).scalar()
+        return {
+            'total_documents': total,
+            'search_method': 'SQLite FTS5' if self.dialect == 'sqlite' else 'PostgreSQL full-text search',
+            'tombstones': 0,
+            'scoring': 'database',
+            'initialized': self.is_initialized
+        }
+
+# Global database search instance
+database_search = DatabaseTextSearch()
@@ -0,0 +1,176 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from text_cleaning import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Query cache hits only note their recency; the notes are written in one batch
+# once this many have piled up or this many seconds have passed (or with the next insert)
+TOUCH_BATCH = 256
+TOUCH_INTERVAL = 30.0
+
+
+class EmbeddingCache:
+    """Persistent, content-addressed embedding cache backed by SQLite
+
+    Entries are keyed by a hash of the embedding model plus the normalized
+    text, so unchanged chunks are reused across index rebuilds. Query
+    embeddings live in a separate table capped at ``query_capacity`` rows with
+    least-recently-used eviction, fronted by an in-memory LRU of the same size.
+    Hits don't write: their recency is buffered and flushed in batches. Entry
+    counts are read once when the cache is opened and then kept up to date
+    with this process's own writes.
+    """
+
+    def __init__(self, path: str = "embedding_cache.db", model: str = "text-embedding-3-small",
+                 query_capacity: int = 1024):
+        self.path = path
+        self.model = model
+        self.query_capacity = query_capacity
+        self._lock = threading.Lock()
+        self._recent_queries: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self.stats = {'chunk_hits': 0, 'chunk_misses': 0, 'query_hits': 0, 'query_misses': 0}
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings "
+            "(key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_query_last_used ON query_embeddings (last_used)")
+        self.conn.commit()
+        self._touched: Dict[bytes, float] = {}  # Query key -> last use not yet written
+        self._touched_at = time.monotonic()
+        self.entries = {
+            'chunk_entries': self.conn.execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()[0],
+            'query_entries': self.conn.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+        }
+
+    def reopen(self):
+        """Open a fresh connection, e.g. in a forked worker process (SQLite connections must not cross a fork)"""
+        with self._lock:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+
+    def key(self, text: str) -> bytes:
+        """Content address for a text under the configured model"""
+        return hashlib.sha256(f"{self.model}\x00{normalize_text(text)}".encode('utf-8')).digest()
+
+    @staticmethod
+    def _decode(blob: bytes) -> np.ndarray:
+        return np.frombuffer(blob, dtype=np.float32)
+
+    @staticmethod
+    def _encode(vector: Sequence[float]) -> bytes:
+        return np.asarray(vector, dtype=np.float32).tobytes()
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up chunk embeddings; missing entries are returned as None"""
+        keys = [self.key(text) for text in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM chunk_embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update((key, self._decode(vector)) for key, vector in rows)
+            hits = sum(1 for key in keys if key in found)
+            self.stats['chunk_hits'] += hits
+            self.stats['chunk_misses'] += len(keys) - hits
+        return [found.get(key) for key in keys]
+
+    def put_many(self, texts: List[str], vectors: Sequence[Sequence[float]]):
+        """Store chunk embeddings (a key already stored holds the same text's embedding and is kept)"""
+        rows = [(self.key(text), self._encode(vector)) for text, vector in zip(texts, vectors)]
+        with self._lock:
+            inserted = self.conn.executemany(
+                "INSERT OR IGNORE INTO chunk_embeddings (key, vector) VALUES (?, ?)", rows
+            ).rowcount
+            self.conn.commit()
+            self.entries['chunk_entries'] += max(inserted, 0)
+
+    def get_query(self, text: str) -> Optional[np.ndarray]:
+        """Look up a query embedding, refreshing its recency"""
+        key = self.key(text)
+        with self._lock:
+            vector = self._recent_queries.get(key)
+            if vector is None:
+                row = self.conn.execute("SELECT vector FROM query_embeddings WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    self.stats['query_misses'] += 1
+                    return None
+                vector = self._decode(row[0])
+                self._remember_query(key, vector)
+            else:
+                self._recent_queries.move_to_end(key)
+            self._touched[key] = time.time()
+            if len(self._touched) >= TOUCH_BATCH or time.monotonic() - self._touched_at >= TOUCH_INTERVAL:
+                self._write_touches()
+                self.conn.commit()
+            self.stats['query_hits'] += 1
+            return vector
+
+    def _write_touches(self):
+        """Write the buffered query recencies (the caller commits)"""
+        if self._touched:
+            self.conn.executemany("UPDATE query_embeddings SET last_used = ? WHERE key = ?",
+                                  [(last_used, key) for key, last_used in self._touched.items()])
+            self._touched.clear()
+        self._touched_at = time.monotonic()
+
+    def flush(self):
+        """Write buffered query recencies now"""
+        with self._lock:
+            self._write_touches()
+            self.conn.commit()
+
+    def put_query(self, text: str, vector: Sequence[float]):
+        """Store a query embedding, evicting the least recently used beyond capacity"""
+        key = self.key(text)
+        array = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._remember_query(key, array)
+            self._touched.pop(key, None)
+            # Eviction below goes by last use, so write the buffered recencies first
+            self._write_touches()
+            inserted = self.conn.execute(
+                "INSERT OR IGNORE INTO query_embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                (key, array.tobytes(), time.time())
+            ).rowcount
+            if not inserted:
+                self.conn.execute("UPDATE query_embeddings SET vector = ?, last_used = ? WHERE key = ?",
+                                  (array.tobytes(), time.time(), key))
+            evicted = self.conn.execute(
+                "DELETE FROM query_embeddings WHERE key IN "
+                "(SELECT key FROM query_embeddings ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.query_capacity,)
+            ).rowcount
+            self.conn.commit()
+            self.entries['query_entries'] += inserted - evicted
+
+    def _remember_query(self, key: bytes, vector: np.ndarray):
+        self._recent_queries[key] = vector
+        self._recent_queries.move_to_end(key)
+        while len(self._recent_queries) > self.query_capacity:
+            self._recent_queries.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, float]:
+        """Hit/miss counters and entry counts (as of opening, plus this process's writes)"""
+        with self._lock:
+            stats = dict(self.stats, **self.entries)
+        lookups = stats['chunk_hits'] + stats['chunk_misses'] + stats['query_hits'] + stats['query_misses']
+        stats['hit_rate'] = round((stats['chunk_hits'] + stats['query_hits']) / lookups, 3) if lookups else 0.0
+        return stats
@@ -0,0 +1,159 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+EmbedBatchFn = Callable[[List[str]], List[List[float]]]
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until enough tokens are available"""
+
+    def __init__(self, rate_per_second: float, capacity: Optional[float] = None):
+        self.rate = rate_per_second
+        self.capacity = capacity if capacity is not None else max(rate_per_second, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        """Take tokens from the bucket, sleeping until they have been refilled"""
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class EmbeddingIngestor:
+    """Embeds texts in batches with bounded concurrency, rate limiting and retries
+
+    Results are yielded per batch in input order as soon as the head batch is
+    done, so callers can stream vectors into an index while later batches are
+    still in flight. With an EmbeddingCache attached, only cache misses are
+    sent to the embedder and fully cached batches never leave the process.
+    """
+
+    def __init__(self, embed_batch: EmbedBatchFn, batch_size: int = 100, max_concurrency: int = 4,
+                 requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 max_retries: int = 5, backoff_base: float = 0.5, backoff_max: float = 20.0,
+                 dimension: int = 1536, cache=None):
+        self.embed_batch = embed_batch
+        self.cache = cache
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.request_bucket = TokenBucket(requests_per_minute / 60.0) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.dimension = dimension
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats: Dict[str, float] = {
+            'texts': 0,
+            'requests': 0,
+            'retries': 0,
+            'failed_batches': 0,
+            'seconds': 0.0
+        }
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.stats[key] += amount
+
+    @staticmethod
+    def estimate_tokens(texts: List[str]) -> int:
+        """Rough token estimate (about four characters per token) for rate limiting"""
+        return sum(len(text) // 4 + 1 for text in texts)
+
+    def _embed_with_retry(self, batch: List[str]) -> Optional[List[List[float]]]:
+        """Embed one batch, backing off exponentially (with jitter) on failure"""
+        for attempt in range(self.max_retries + 1):
+            if self.request_bucket:
+                self.request_bucket.acquire()
+            if self.token_bucket:
+                self.token_bucket.acquire(self.estimate_tokens(batch))
+            try:
+                self._count('requests')
+                vectors = self.embed_batch(batch)
+                if len(vectors) != len(batch):
+                    raise ValueError(f"Expected {len(batch)} embeddings, got {len(vectors)}")
+                return vectors
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Giving up on batch of {len(batch)} texts after {attempt + 1} attempts: {e}")
+                    break
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                logger.warning(f"Embedding request failed ({e}), retrying in {delay:.2f}s")
+                self._count('retries')
+                time.sleep(delay)
+        return None
+
+    def _embed_missing(self, batch: List[str], cached: List) -> List[List[float]]:
+        """Fill the cache misses of a batch from the embedder"""
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        vectors = self._embed_with_retry([batch[i] for i in missing])
+        if vectors is None:
+            # Fall back to zero vectors, matching get_embedding's behaviour on error
+            self._count('failed_batches')
+            vectors = [[0.0] * self.dimension for _ in missing]
+        elif self.cache is not None:
+            self.cache.put_many([batch[i] for i in missing], vectors)
+
+        result = list(cached)
+        for i, vector in zip(missing, vectors):
+            result[i] = vector
+        self._count('texts', len(batch))
+        return result
+
+    def _batches(self, texts: Iterable[str]) -> Iterator[List[str]]:
+        iterator = iter(texts)
+        while True:
+            batch = list(islice(iterator, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def iter_embeddings(self, texts: Iterable[str]) -> Iterator[List[List[float]]]:
+        """Yield embedding batches in input order while keeping requests in flight"""
+        start = time.perf_counter()
+        max_pending = self.max_concurrency * 2
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='embed') as pool:
+            pending = deque()
+            for batch in self._batches(texts):
+                cached = self.cache.get_many(batch) if self.cache is not None else [None] * len(batch)
+                if all(vector is not None for vector in cached):
+                    self._count('texts', len(batch))
+                    done = Future()
+                    done.set_result(cached)
+                    pending.append(done)
+                else:
+                    pending.append(pool.submit(self._embed_missing, batch, cached))
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        with self._lock:
+            self.stats['seconds'] += time.perf_counter() - start
+
+    def get_stats(self) -> Dict[str, float]:
+        """Ingestion counters plus throughput"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats['texts_per_second'] = round(stats['texts'] / stats['seconds'], 1) if stats['seconds'] else 0.0
+        return stats
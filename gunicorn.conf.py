@@ -0,0 +1,38 @@
+"""Gunicorn settings: build or load the index once in the master, then fork workers that start from it
+
+Usage: gunicorn main:app  (picked up automatically from the working directory)
+"""
+import gc
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+# Import the app (and load the index) before forking so workers start ready
+preload_app = True
+# The master loads the index itself in when_ready; a warm-up thread must not be running across fork
+os.environ["INDEX_WARMUP"] = "0"
+
+
+def when_ready(server):
+    """Runs in the master once the app is imported: load the current index snapshot, or build and publish one"""
+    from app import app, db
+    from rag_pipeline import rag_pipeline
+    with app.app_context():
+        try:
+            rag_pipeline.initialize(watch=False)
+        except Exception as e:
+            server.log.error(f"Index preload failed, workers will initialize lazily: {e}")
+        # Workers open their own database connections
+        db.engine.dispose()
+    # Search shards (SEARCH_BACKEND=sharded) keep running for the workers, which connect to them themselves
+    from sharded_search import sharded_search
+    sharded_search.disconnect()
+    # Keep the loaded index out of the collector so pages stay shared with the workers
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Per-worker setup: fresh SQLite handles and the thread that follows newer snapshots"""
+    from rag_pipeline import rag_pipeline
+    rag_pipeline.after_fork()
@@ -0,0 +1,193 @@
+import json
+import logging
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, or_, update
+from app import db
+from models import HistoryRollup, QueryHistory, RollupState
+
+logger = logging.getLogger(__name__)
+
+# Response times are histogrammed in log-spaced bins, 8 per doubling (about 9% wide),
+# starting at 0.1 ms; percentiles are read back to within one bin
+HISTOGRAM_BASE = 0.0001
+BINS_PER_DOUBLING = 8
+# (timestamp, id) of the last row aggregated
+WATERMARK = 'query_history_rolled'
+BUCKETS = {'hour': 3600, 'day': 86400}
+
+
+def latency_bin(seconds: float) -> int:
+    """Histogram bin of a response time"""
+    if seconds <= HISTOGRAM_BASE:
+        return 0
+    return int(math.log2(seconds / HISTOGRAM_BASE) * BINS_PER_DOUBLING) + 1
+
+
+def bin_value(bin_index: int) -> float:
+    """Representative (geometric middle) response time of a bin"""
+    if bin_index == 0:
+        return HISTOGRAM_BASE
+    return HISTOGRAM_BASE * 2 ** ((bin_index - 0.5) / BINS_PER_DOUBLING)
+
+
+def percentiles(histogram: Dict[int, int], quantiles: Iterable[float]) -> List[Optional[float]]:
+    """Estimate quantiles of the values counted in a histogram"""
+    total = sum(histogram.values())
+    if not total:
+        return [None for _ in quantiles]
+    ordered = sorted(histogram.items())
+    results = []
+    for q in quantiles:
+        rank = max(1, math.ceil(q * total))
+        seen = 0
+        for bin_index, count in ordered:
+            seen += count
+            if seen >= rank:
+                results.append(round(bin_value(bin_index), 4))
+                break
+    return results
+
+
+class HistoryRollups:
+    """Hourly rollups of QueryHistory kept up to date incrementally
+
+    ``catch_up`` aggregates rows in (timestamp, id) order past a stored
+    watermark and advances the watermark in the same transaction, so stats
+    requests read a few rollup rows instead of scanning the history table.
+    Only rows older than ``lag`` seconds are aggregated: ids are not handed
+    out in commit order (PostgreSQL sequences, concurrent writers), but a row
+    committed within ``lag`` of its timestamp is always behind the watermark
+    when it becomes visible, so each such row is counted exactly once. The
+    rollups therefore trail the history by up to ``lag``. A competing
+    process that advanced the watermark first makes the update a no-op.
+    """
+
+    def __init__(self, batch_size: int = None, lag: float = None):
+        self.bucket_seconds = BUCKETS['hour']
+        self.batch_size = batch_size or int(os.environ.get("HISTORY_ROLLUP_BATCH", 5000))
+        self.lag = lag if lag is not None else float(os.environ.get("HISTORY_ROLLUP_LAG", 60))
+
+    def bucket_start(self, timestamp: datetime) -> datetime:
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+
+    def catch_up(self) -> int:
+        """Fold history rows older than the lag and not yet counted into the rollups; returns rows aggregated"""
+        aggregated = 0
+        try:
+            while True:
+                state = db.session.get(RollupState, WATERMARK)
+                cutoff = datetime.utcnow() - timedelta(seconds=self.lag)
+                query = db.session.query(QueryHistory.id, QueryHistory.timestamp, QueryHistory.response_time) \
+                    .filter(QueryHistory.timestamp < cutoff)
+                if state is not None:
+                    query = query.filter(or_(QueryHistory.timestamp > state.timestamp,
+                                             and_(QueryHistory.timestamp == state.timestamp,
+                                                  QueryHistory.id > state.value)))
+                rows = query.order_by(QueryHistory.timestamp, QueryHistory.id).limit(self.batch_size).all()
+                if not rows:
+                    return aggregated
+                if not self._apply(rows, state, (rows[-1][1], rows[-1][0])):
+                    return aggregated
+                aggregated += len(rows)
+        except Exception as e:
+            logger.error(f"Error updating history rollups: {e}")
+            db.session.rollback()
+            return aggregated
+
+    def _apply(self, rows: List[Tuple[int, datetime, Optional[float]]], state: Optional[RollupState],
+               position: Tuple[datetime, int]) -> bool:
+        """Merge one batch into the rollups and advance the watermark to ``position`` atomically"""
+        buckets: Dict[datetime, Dict[str, Any]] = {}
+        for _, timestamp, response_time in rows:
+            if timestamp is None:
+                continue
+            bucket = buckets.setdefault(self.bucket_start(timestamp),
+                                        {'count': 0, 'timed': 0, 'total': 0.0, 'max': 0.0, 'histogram': {}})
+            bucket['count'] += 1
+            if response_time is not None:
+                bucket['timed'] += 1
+                bucket['total'] += response_time
+                bucket['max'] = max(bucket['max'], response_time)
+                bin_index = latency_bin(response_time)
+                bucket['histogram'][bin_index] = bucket['histogram'].get(bin_index, 0) + 1
+
+        timestamp, last_id = position
+        if state is None:
+            db.session.add(RollupState(name=WATERMARK, value=last_id, timestamp=timestamp))
+        else:
+            advanced = db.session.execute(
+                update(RollupState).where(RollupState.name == WATERMARK, RollupState.value == state.value,
+                                          RollupState.timestamp == state.timestamp)
+                .values(value=last_id, timestamp=timestamp)
+            ).rowcount
+            if not advanced:
+                db.session.rollback()
+                return False
+
+        existing = {rollup.bucket_start: rollup for rollup in
+                    db.session.query(HistoryRollup).filter(HistoryRollup.bucket_start.in_(list(buckets)))}
+        for start, bucket in buckets.items():
+            rollup = existing.get(start)
+            if rollup is None:
+                rollup = HistoryRollup(bucket_start=start, count=0, timed_count=0, total_time=0.0,
+                                       max_time=0.0, histogram='{}')
+                db.session.add(rollup)
+            histogram = {int(k): v for k, v in json.loads(rollup.histogram).items()}
+            for bin_index, count in bucket['histogram'].items():
+                histogram[bin_index] = histogram.get(bin_index, 0) + count
+            rollup.count += bucket['count']
+            rollup.timed_count += bucket['timed']
+            rollup.total_time += bucket['total']
+            rollup.max_time = max(rollup.max_time, bucket['max'])
+            rollup.histogram = json.dumps(histogram)
+        db.session.commit()
+        return True
+
+    def stats(self, since: datetime, until: datetime, bucket: str = 'hour') -> Dict[str, Any]:
+        """Volume and p50/p95/p99 response time per bucket, plus totals, for [since, until)"""
+        self.catch_up()
+        bucket_seconds = BUCKETS[bucket]
+        rollups = db.session.query(HistoryRollup) \
+            .filter(HistoryRollup.bucket_start >= self.bucket_start(since), HistoryRollup.bucket_start < until) \
+            .order_by(HistoryRollup.bucket_start).all()
+
+        grouped: Dict[datetime, List[HistoryRollup]] = {}
+        for rollup in rollups:
+            start = rollup.bucket_start
+            if bucket_seconds > self.bucket_seconds:
+                start = datetime.min + timedelta(
+                    seconds=(start - datetime.min).total_seconds() // bucket_seconds * bucket_seconds)
+            grouped.setdefault(start, []).append(rollup)
+
+        buckets = [dict(start=start.isoformat(), **self._summarize(group)) for start, group in grouped.items()]
+        return {
+            'since': since.isoformat(),
+            'until': until.isoformat(),
+            'bucket': bucket,
+            'overall': self._summarize(rollups),
+            'buckets': buckets
+        }
+
+    @staticmethod
+    def _summarize(rollups: List[HistoryRollup]) -> Dict[str, Any]:
+        histogram: Dict[int, int] = {}
+        for rollup in rollups:
+            for bin_index, count in json.loads(rollup.histogram).items():
+                histogram[int(bin_index)] = histogram.get(int(bin_index), 0) + count
+        timed = sum(rollup.timed_count for rollup in rollups)
+        p50, p95, p99 = percentiles(histogram, (0.5, 0.95, 0.99))
+        return {
+            'count': sum(rollup.count for rollup in rollups),
+            'mean': round(sum(rollup.total_time for rollup in rollups) / timed, 4) if timed else None,
+            'p50': p50,
+            'p95': p95,
+            'p99': p99,
+            'max': round(max((rollup.max_time for rollup in rollups), default=0.0), 4) if timed else None
+        }
+
+
+# Global rollup maintainer
+history_rollups = HistoryRollups()
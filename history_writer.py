@@ -0,0 +1,182 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import insert
+from app import app, db
+from models import QueryHistory
+from history_stats import history_rollups
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryWriter:
+    """Write QueryHistory rows from a background thread in bulk inserts
+
+    ``record`` only queues the row, so requests never wait on the database
+    write lock. The writer thread inserts everything queued with one
+    executemany once ``flush_size`` rows are waiting or ``flush_interval``
+    seconds have passed, and anything still queued is flushed at interpreter
+    exit. ``flush`` waits at most ``flush_timeout`` seconds for a batch the
+    thread is still writing, so a stuck database can't hang a request or
+    shutdown. The most recent queries are also kept in a ring buffer so pages can
+    show them without querying the table.
+    """
+
+    def __init__(self, flask_app=None, flush_size: int = None, flush_interval: float = None,
+                 recent_size: int = None, background: bool = None, flush_timeout: float = None):
+        self.app = flask_app or app
+        self.flush_size = flush_size or int(os.environ.get("HISTORY_FLUSH_SIZE", 50))
+        self.flush_interval = flush_interval or float(os.environ.get("HISTORY_FLUSH_INTERVAL", 1.0))
+        self.flush_timeout = flush_timeout if flush_timeout is not None \
+            else float(os.environ.get("HISTORY_FLUSH_TIMEOUT", 10.0))
+        self.background = background if background is not None \
+            else os.environ.get("HISTORY_ASYNC", "1").lower() not in ('0', 'false', 'off')
+        self.recent_queries = deque(maxlen=recent_size or int(os.environ.get("HISTORY_RECENT_SIZE", 20)))
+        self.stats = {'queued': 0, 'written': 0, 'batches': 0, 'errors': 0}
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # Serializes inserts from the thread and explicit flushes
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._seeded = False
+        atexit.register(self.close)
+
+    def record(self, query: str, response: str, retrieved_docs: str, response_time: float,
+               ttfb: Optional[float] = None):
+        """Queue a history row (retrieved_docs is the JSON string stored in the table)"""
+        row = {
+            'query': query,
+            'response': response,
+            'retrieved_docs': retrieved_docs,
+            'response_time': response_time,
+            'ttfb': ttfb,
+            'timestamp': datetime.utcnow()
+        }
+        with self._lock:
+            self._ensure_seeded()
+            self.recent_queries.appendleft(row)
+            self.stats['queued'] += 1
+        if not self.background:
+            self._write([row])
+            return
+        self._queue.put(row)
+        self._ensure_thread()
+
+    def recent(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """Most recent queries, newest first (loaded from the table once after startup)"""
+        with self._lock:
+            self._ensure_seeded()
+            return list(self.recent_queries)[:limit]
+
+    def _ensure_seeded(self):
+        """Fill the ring buffer from the table the first time it is used"""
+        if self._seeded:
+            return
+        self._seeded = True
+        try:
+            with self.app.app_context():
+                rows = db.session.query(QueryHistory.query, QueryHistory.timestamp) \
+                    .order_by(QueryHistory.timestamp.desc()).limit(self.recent_queries.maxlen).all()
+        except Exception as e:
+            logger.error(f"Error loading recent queries: {e}")
+            return
+        self.recent_queries.extend({'query': query, 'timestamp': timestamp} for query, timestamp in rows)
+
+    def flush(self) -> bool:
+        """Write everything queued so far before returning; False if the writer thread's batch is still pending"""
+        rows = self._drain()
+        if rows:
+            self._write(rows)
+        # Wait for a batch the writer thread has already taken off the queue, up to flush_timeout
+        deadline = time.monotonic() + self.flush_timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning(f"Gave up waiting for {self._queue.unfinished_tasks} query history rows "
+                                   f"after {self.flush_timeout}s")
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self):
+        """Stop the writer thread and flush whatever is still queued"""
+        self._stopping.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=max(5.0, self.flush_interval * 2))
+        self.flush()
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            rows = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(rows) < self.flush_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(rows)
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        rows = []
+        while True:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                return rows
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        """Insert rows with a single executemany, commit, then fold them into the rollups"""
+        with self._flush_lock, self.app.app_context():
+            try:
+                with span('history_write'):
+                    db.session.execute(insert(QueryHistory), rows)
+                    db.session.commit()
+                with self._lock:
+                    self.stats['written'] += len(rows)
+                    self.stats['batches'] += 1
+                history_rollups.catch_up()
+            except Exception as e:
+                logger.error(f"Error writing {len(rows)} query history rows: {e}")
+                db.session.rollback()
+                with self._lock:
+                    self.stats['errors'] += len(rows)
+            finally:
+                if self.background:
+                    for _ in rows:
+                        self._queue.task_done()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth and write counters"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats['pending'] = self._queue.qsize()
+        stats['background'] = self.background
+        return stats
+
+
+# Global history writer instance
+history_writer = HistoryWriter()
@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+KEYWORD_FILE = "keyword.pkl"
+VECTOR_FILE = "vector.faiss"
+CHUNKS_FILE = "documents.chunks"
+MANIFEST_FILE = "manifest.json"
+POINTER_FILE = "CURRENT"
+
+
+class IndexSnapshots:
+    """Immutable, versioned index snapshots on disk behind an atomically replaced pointer
+
+    Each version is its own directory holding the pickled keyword index and,
+    with hybrid retrieval, the FAISS index and the memory-mapped chunk store.
+    A version is staged, written completely (manifest last) and only then
+    published by replacing the ``CURRENT`` file with ``os.replace``, so readers
+    never see a half-written index and files are never rewritten once
+    published. Worker processes poll ``current()`` and load a new version next
+    to the one they are serving, swapping once it is ready.
+    """
+
+    def __init__(self, root: str, keep: int = 3):
+        self.root = root
+        self.keep = max(1, keep)
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, version: str, name: str = '') -> str:
+        return os.path.join(self.root, version, name)
+
+    def current(self) -> Optional[str]:
+        """Published version the pointer names, or None if nothing has been published"""
+        try:
+            with open(os.path.join(self.root, POINTER_FILE)) as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return version if version and os.path.exists(self.path(version, MANIFEST_FILE)) else None
+
+    def manifest(self, version: str) -> Dict[str, Any]:
+        with open(self.path(version, MANIFEST_FILE)) as f:
+            return json.load(f)
+
+    def stage(self) -> str:
+        """Create an empty directory for a new version and return the version name"""
+        version = f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}-{os.getpid()}-{time.monotonic_ns() % 10**6:06d}"
+        os.makedirs(self.path(version))
+        return version
+
+    def publish(self, version: str, search_engine, vector_store=None) -> Dict[str, Any]:
+        """Write the keyword index and manifest for a staged version and point CURRENT at it
+
+        The vector store is expected to have been pointed at the staged
+        directory already (see ``vector_paths``); it is saved here if its files
+        are missing.
+        """
+        search_engine.save_snapshot(self.path(version, KEYWORD_FILE))
+        has_vectors = vector_store is not None and vector_store.index is not None
+        if has_vectors and not os.path.exists(self.path(version, VECTOR_FILE)):
+            vector_store.save_index()
+        manifest = {
+            'version': version,
+            'created': time.time(),
+            'corpus_version': search_engine.corpus_version,
+            'documents': search_engine.get_stats()['total_documents'],
+            'vectors': has_vectors and os.path.exists(self.path(version, VECTOR_FILE))
+        }
+        self._write_atomic(self.path(version, MANIFEST_FILE), json.dumps(manifest))
+        self._write_atomic(os.path.join(self.root, POINTER_FILE), version)
+        logger.info(f"Published index snapshot {version} ({manifest['documents']} publications)")
+        self.prune()
+        return manifest
+
+    def vector_paths(self, version: str) -> Dict[str, str]:
+        return {'index_file': self.path(version, VECTOR_FILE), 'docs_file': self.path(version, CHUNKS_FILE)}
+
+    def versions(self) -> List[str]:
+        """Published versions, oldest first"""
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.exists(self.path(name, MANIFEST_FILE)))
+
+    def prune(self, stale_after: float = 3600.0):
+        """Remove all but the newest ``keep`` versions, and staged directories abandoned for an hour
+
+        Workers still serving a removed version keep their open file handles
+        and mappings; the data is freed once they swap.
+        """
+        current = self.current()
+        published = self.versions()
+        for version in published[:-self.keep]:
+            if version != current:
+                shutil.rmtree(self.path(version), ignore_errors=True)
+        for name in os.listdir(self.root):
+            path = self.path(name)
+            if name in published or not os.path.isdir(path):
+                continue
+            if time.time() - os.path.getmtime(path) > stale_after:
+                shutil.rmtree(path, ignore_errors=True)
+
+    @staticmethod
+    def _write_atomic(path: str, content: str):
+        temporary = f"{path}.tmp-{os.getpid()}"
+        with open(temporary, 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
@@ -0,0 +1,57 @@
+"""Stream a publications dump (JSON array or JSON Lines) into the database
+
+Usage: python ingest.py path/to/publications.json [--batch-size 1000] [--workers 4] [--no-update] [--build-index]
+"""
+import argparse
+import json
+import logging
+import sys
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from app import app  # Sets up the database before the processor imports it
+from data_processor import PublicationProcessor, iter_json_records
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in megabytes, or None where it can't be read"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help='JSON array or JSON Lines file of publications')
+    parser.add_argument('--batch-size', type=int, default=None, help='records per insert/commit (INGEST_BATCH_SIZE)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes used to clean descriptions (INGEST_CLEAN_WORKERS)')
+    parser.add_argument('--no-update', action='store_true', help='skip existing publications instead of updating them')
+    parser.add_argument('--build-index', action='store_true',
+                        help='index the ingested publications and publish a snapshot for running workers')
+    parser.add_argument('--quiet', action='store_true', help='only print the summary')
+    args = parser.parse_args()
+
+    if args.quiet:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    stats = PublicationProcessor().ingest_records(iter_json_records(args.path), batch_size=args.batch_size,
+                                                  update_existing=not args.no_update, workers=args.workers)
+    if args.build_index:
+        from rag_pipeline import rag_pipeline
+        with app.app_context():
+            rag_pipeline.refresh()
+        stats['index_snapshot'] = rag_pipeline.snapshot_version
+    stats['peak_rss_mb'] = peak_rss_mb()
+    print(json.dumps(stats))
+    return 0 if stats.get('read') else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,259 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers sub-millisecond index lookups up to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, Dict[str, str], float]  # (metric name, labels, value)
+
+_trace: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar('trace', default=None)
+
+
+def _label_text(labels: Iterable[Tuple[str, str]]) -> str:
+    pairs = ','.join(f'{key}="{_escape(value)}"' for key, value in labels)
+    return f'{{{pairs}}}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metrics:
+    """Counters and histograms kept in process memory, rendered in the Prometheus text format
+
+    Metrics are created on first use; ``describe`` attaches help text.
+    Callables registered with ``register_collector`` are asked for gauge
+    samples at render time, so components expose their own counters without
+    updating the registry on the hot path. Under gunicorn every worker keeps
+    its own registry.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}  # name -> (type, help)
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, List[float]]] = {}  # bucket counts, then sum and count
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def describe(self, name: str, metric_type: str, help_text: str):
+        self._help[name] = (metric_type, help_text)
+
+    def inc(self, name: str, value: float = 1.0, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            counts = series.get(key)
+            if counts is None:
+                counts = series[key] = [0.0] * (len(self.buckets) + 3)
+            counts[slot] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: {key: list(counts) for key, counts in series.items()}
+                          for name, series in self._histograms.items()}
+
+        lines = []
+        for name, series in sorted(counters.items()):
+            self._header(lines, name, 'counter')
+            for key, value in series.items():
+                lines.append(f"{name}{_label_text(key)} {_number(value)}")
+        for name, series in sorted(histograms.items()):
+            self._header(lines, name, 'histogram')
+            for key, counts in series.items():
+                cumulative = 0.0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_label_text(key + (('le', _number(bound)),))} {_number(cumulative)}")
+                lines.append(f"{name}_sum{_label_text(key)} {_number(counts[-2])}")
+                lines.append(f"{name}_count{_label_text(key)} {_number(counts[-1])}")
+
+        gauges: Dict[str, List[Tuple[Dict[str, str], float]]] = {}
+        for collector in self._collectors:
+            try:
+                for name, labels, value in collector():
+                    gauges.setdefault(name, []).append((labels, value))
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {e}")
+        for name, samples in sorted(gauges.items()):
+            self._header(lines, name, 'gauge')
+            for labels, value in samples:
+                lines.append(f"{name}{_label_text(sorted(labels.items()))} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def _header(self, lines: List[str], name: str, default_type: str):
+        metric_type, help_text = self._help.get(name, (default_type, ''))
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        metrics.observe('rag_stage_seconds', elapsed, stage=self.name)
+        spans = _trace.get()
+        if spans is not None:
+            spans.append((self.name, elapsed))
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+enabled = os.environ.get("METRICS_ENABLED", "1").lower() not in ('0', 'false', 'off')
+metrics = Metrics()
+metrics.describe('rag_stage_seconds', 'histogram', 'Time spent in each pipeline stage')
+metrics.describe('rag_http_request_seconds', 'histogram', 'Request latency by endpoint')
+metrics.describe('rag_http_requests_total', 'counter', 'Requests by endpoint and status code')
+metrics.describe('rag_profiles_written_total', 'counter', 'Slow-request profiles written to PROFILE_DIR')
+
+
+def span(name: str):
+    """Time a pipeline stage with the monotonic clock (a shared no-op when METRICS_ENABLED=0)"""
+    return _Span(name) if enabled else _NOOP_SPAN
+
+
+class SlowRequestProfiler:
+    """Profile a sample of requests with cProfile and keep the ones slower than a threshold
+
+    Each kept profile is written to ``directory`` as a ``.prof`` file (for
+    snakeviz or ``python -m pstats``) plus a ``.txt`` summary of the top
+    functions by cumulative time. cProfile only sees the request's own thread.
+    """
+
+    def __init__(self, threshold_ms: float, sample_rate: float = 1.0, directory: str = "profiles",
+                 top: int = 40):
+        self.threshold = threshold_ms / 1000
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.top = top
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self) -> Optional[cProfile.Profile]:
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # Another profiler is already active on this thread
+            return None
+        return profile
+
+    def finish(self, profile: cProfile.Profile, elapsed: float, label: str):
+        profile.disable()
+        if elapsed < self.threshold:
+            return
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{elapsed * 1000:.0f}ms-{re.sub(r'[^A-Za-z0-9_.-]+', '_', label)}"
+        path = os.path.join(self.directory, name)
+        try:
+            profile.dump_stats(f"{path}.prof")
+            summary = io.StringIO()
+            pstats.Stats(profile, stream=summary).sort_stats('cumulative').print_stats(self.top)
+            with open(f"{path}.txt", 'w') as f:
+                f.write(f"{label} took {elapsed * 1000:.1f}ms\n\n{summary.getvalue()}")
+            metrics.inc('rag_profiles_written_total')
+            logger.warning(f"Slow request {label} ({elapsed * 1000:.0f}ms), profile written to {path}.prof")
+        except Exception as e:
+            logger.error(f"Error writing profile for {label}: {e}")
+
+
+def instrument_app(flask_app):
+    """Record per-endpoint latency and status counts, a Server-Timing header of the request's spans,
+    and, with PROFILE_SLOW_REQUESTS_MS set, profiles of slow requests"""
+    threshold = float(os.environ.get("PROFILE_SLOW_REQUESTS_MS", 0))
+    profiler = SlowRequestProfiler(threshold, float(os.environ.get("PROFILE_SAMPLE_RATE", 1.0)),
+                                   os.environ.get("PROFILE_DIR", "profiles")) if threshold > 0 else None
+    if not enabled and profiler is None:
+        return
+
+    from flask import g, request
+
+    @flask_app.before_request
+    def _start_request():
+        g.instrumentation_start = time.perf_counter()
+        g.instrumentation_trace = _trace.set([]) if enabled else None
+        g.instrumentation_profile = profiler.start() if profiler is not None else None
+
+    @flask_app.after_request
+    def _finish_request(response):
+        start = g.pop('instrumentation_start', None)
+        if start is None:
+            return response
+        finish = (start, request.endpoint or 'unknown', f"{request.method} {request.path}",
+                  str(response.status_code), g.pop('instrumentation_profile', None),
+                  g.pop('instrumentation_trace', None))
+        if response.is_streamed:
+            # A streamed body (Server-Sent Events) is generated after this hook returns, so the request
+            # is timed, and its spans collected, once the server has sent all of it and closes the response
+            response.call_on_close(lambda: _record(*finish))
+            return response
+        spans = _record(*finish)
+        if spans:
+            response.headers['Server-Timing'] = ', '.join(
+                f"{name};dur={seconds * 1000:.2f}" for name, seconds in spans)
+        return response
+
+    def _record(start: float, endpoint: str, label: str, status: str, profile: Optional[cProfile.Profile],
+                token) -> List[Tuple[str, float]]:
+        """Record a finished request's latency, status and profile; returns its spans"""
+        elapsed = time.perf_counter() - start
+        if profile is not None:
+            profiler.finish(profile, elapsed, label)
+        if token is None:
+            return []
+        spans = _trace.get() or []
+        _trace.reset(token)
+        metrics.observe('rag_http_request_seconds', elapsed, endpoint=endpoint)
+        metrics.inc('rag_http_requests_total', endpoint=endpoint, status=status)
+        return spans
@@ -0,0 +1,240 @@
+import heapq
+import math
+from bisect import bisect_left
+import re
+from collections import Counter
+from typing import TYPE_CHECKING, List, Dict, NamedTuple, Optional, Sequence, Set, Tuple
+from instrumentation import span
+
+if TYPE_CHECKING:
+    # NumPy is only imported when the index is compiled
+    from bm25_matrix import BM25Matrix
+
+TOKEN_PATTERN = re.compile(r"\w+")
+MIN_TOKEN_LENGTH = 3  # Very short words carry little signal (matches the old keyword scorer)
+# Below this many postings per batch, walking them in Python beats NumPy's per-call overhead
+MATRIX_MIN_POSTINGS = 2048
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase text and split it into index terms"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) >= MIN_TOKEN_LENGTH]
+
+
+class CorpusStats(NamedTuple):
+    """BM25 corpus statistics; shards of one corpus share the sums of their local ones"""
+    num_docs: int
+    total_length: int
+    doc_freqs: Dict[str, int]
+
+
+class InvertedIndex:
+    """In-memory inverted index with BM25 ranking
+
+    Postings map each term to a list of (doc_idx, term_frequency) pairs in
+    insertion order. Document length norms are cached and only recomputed
+    when documents are added. Removed documents are tombstoned and keep
+    contributing to corpus statistics until the index is compacted.
+    
+    An index holding one shard of a corpus takes the whole corpus's
+    statistics through ``set_corpus_stats`` so its scores are comparable with
+    the other shards' (and equal to an unsharded index's).
+    
+    ``compile`` additionally packs the postings into a NumPy ``BM25Matrix``
+    that scores queries touching many postings vectorized; any later change
+    drops it and searches walk the postings until the index is compiled
+    again.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_lengths: List[int] = []
+        self.total_length = 0
+        self._doc_norms: List[float] = []
+        self._norms_dirty = False
+        self.deleted: Set[int] = set()
+        self._matrix: Optional["BM25Matrix"] = None
+        self.corpus_stats: Optional[CorpusStats] = None
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths) - len(self.deleted)
+
+    def add_document(self, text: str) -> int:
+        """Index a document and return its position in the index"""
+        doc_idx = len(self.doc_lengths)
+        terms = tokenize(text)
+        for term, tf in Counter(terms).items():
+            self.postings.setdefault(term, []).append((doc_idx, tf))
+        self.doc_lengths.append(len(terms))
+        self.total_length += len(terms)
+        self._norms_dirty = True
+        self._matrix = None
+        return doc_idx
+
+    def remove_document(self, doc_idx: int):
+        """Tombstone a document so it no longer appears in results"""
+        if 0 <= doc_idx < len(self.doc_lengths):
+            self.deleted.add(doc_idx)
+            self._matrix = None
+
+    def compacted(self) -> Tuple["InvertedIndex", List[int]]:
+        """Return a copy without tombstoned documents and the old position of each kept document"""
+        keep = [doc_idx for doc_idx in range(len(self.doc_lengths)) if doc_idx not in self.deleted]
+        new_positions = {old: new for new, old in enumerate(keep)}
+
+        index = InvertedIndex(k1=self.k1, b=self.b)
+        for term, postings in self.postings.items():
+            kept = [(new_positions[doc_idx], tf) for doc_idx, tf in postings if doc_idx in new_positions]
+            if kept:
+                index.postings[term] = kept
+        index.doc_lengths = [self.doc_lengths[doc_idx] for doc_idx in keep]
+        index.total_length = sum(index.doc_lengths)
+        # A shard keeps scoring with the corpus-wide statistics until they are shared again
+        index.corpus_stats = self.corpus_stats
+        index._norms_dirty = True
+        return index, keep
+
+    def local_stats(self) -> CorpusStats:
+        """Statistics of the documents in this index, tombstones included"""
+        return CorpusStats(len(self.doc_lengths), self.total_length,
+                           {term: len(postings) for term, postings in self.postings.items()})
+
+    def set_corpus_stats(self, stats: Optional[CorpusStats]):
+        """Score with statistics of a larger corpus this index is a shard of (None reverts to local ones)"""
+        self.corpus_stats = stats
+        self._norms_dirty = True
+        self._matrix = None
+
+    def idf(self, term: str) -> float:
+        """BM25 inverse document frequency (non-negative variant)"""
+        if self.corpus_stats is not None:
+            df = self.corpus_stats.doc_freqs.get(term, 0)
+            n = self.corpus_stats.num_docs
+        else:
+            df = len(self.postings.get(term, ()))
+            n = len(self.doc_lengths)
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def _refresh_norms(self):
+        """Recompute the per-document length normalisation terms"""
+        num_docs, total_length = (self.corpus_stats[:2] if self.corpus_stats is not None
+                                  else (len(self.doc_lengths), self.total_length))
+        avg_length = total_length / num_docs if num_docs else 0.0
+        if avg_length == 0:
+            self._doc_norms = [self.k1] * len(self.doc_lengths)
+        else:
+            k1, b = self.k1, self.b
+            self._doc_norms = [k1 * (1 - b + b * length / avg_length) for length in self.doc_lengths]
+        self._norms_dirty = False
+
+    def compile(self):
+        """Build the vectorized scoring matrix from the current postings (imports NumPy)"""
+        from bm25_matrix import BM25Matrix
+        if self._norms_dirty:
+            self._refresh_norms()
+        self._matrix = BM25Matrix.from_postings(self.postings, self._doc_norms, self.k1, self.deleted,
+                                                [self.idf(term) for term in self.postings])
+    
+    @property
+    def compiled(self) -> bool:
+        return self._matrix is not None
+    
+    def search(self, query: str, top_k: int = 5, candidates: Optional[Sequence[int]] = None) -> List[Tuple[int, float]]:
+        """Return up to top_k (doc_idx, score) pairs ranked by BM25"""
+        return self.search_many([query], top_k, candidates)[0]
+    
+    def search_many(self, queries: List[str], top_k: int = 5,
+                    candidates: Optional[Sequence[int]] = None) -> List[List[Tuple[int, float]]]:
+        """Rank documents for several queries, walking each posting list once for all of them
+
+        ``candidates`` (sorted positions, e.g. from a metadata filter) restricts
+        scoring to those documents. When there are fewer candidates than
+        postings, each candidate is looked up in the sorted posting list
+        instead of walking it, so selective filters make queries cheaper.
+        """
+        if top_k <= 0 or not self.doc_lengths or (candidates is not None and not len(candidates)):
+            return [[] for _ in queries]
+        if self._norms_dirty:
+            self._refresh_norms()
+        
+        query_terms: Dict[str, List[Tuple[int, int]]] = {}  # term -> [(query number, query tf)]
+        with span('tokenize'):
+            for query_no, query in enumerate(queries):
+                for term, query_tf in Counter(tokenize(query)).items():
+                    query_terms.setdefault(term, []).append((query_no, query_tf))
+        
+        limit = len(candidates) if candidates is not None else len(self.doc_lengths)
+        matrix = self._matrix
+        if matrix is not None and sum(min(len(self.postings.get(term, ())), limit) * len(askers)
+                                      for term, askers in query_terms.items()) >= MATRIX_MIN_POSTINGS:
+            query_counts: List[Dict[str, int]] = [{} for _ in queries]
+            for term, askers in query_terms.items():
+                for query_no, query_tf in askers:
+                    query_counts[query_no][term] = query_tf
+            return matrix.search_many(query_counts, top_k, candidates)
+        
+        if candidates is not None:
+            candidates = candidates.tolist() if hasattr(candidates, 'tolist') else list(candidates)
+            allowed = set(candidates)
+        doc_norms = self._doc_norms
+        k1_plus_one = self.k1 + 1
+        scores: List[Dict[int, float]] = [{} for _ in queries]
+        for term, askers in query_terms.items():
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            if candidates is not None:
+                postings = self._restricted(postings, candidates, allowed)
+            idf = self.idf(term)
+            if len(askers) == 1:
+                query_no, query_tf = askers[0]
+                weight = idf * query_tf
+                query_scores = scores[query_no]
+                for doc_idx, tf in postings:
+                    query_scores[doc_idx] = query_scores.get(doc_idx, 0.0) + \
+                        weight * tf * k1_plus_one / (tf + doc_norms[doc_idx])
+                continue
+            # Terms shared by several queries are scored once and reused
+            contributions = [(doc_idx, tf * k1_plus_one / (tf + doc_norms[doc_idx])) for doc_idx, tf in postings]
+            for query_no, query_tf in askers:
+                weight = idf * query_tf
+                query_scores = scores[query_no]
+                for doc_idx, contribution in contributions:
+                    query_scores[doc_idx] = query_scores.get(doc_idx, 0.0) + weight * contribution
+        
+        results = []
+        for query_scores in scores:
+            for doc_idx in self.deleted:
+                query_scores.pop(doc_idx, None)
+            # Ties are broken by index position so rankings are deterministic
+            results.append(heapq.nlargest(top_k, query_scores.items(), key=lambda item: (item[1], -item[0])))
+        return results
+    
+    @staticmethod
+    def _restricted(postings: List[Tuple[int, int]], candidates: List[int],
+                    allowed: Set[int]) -> List[Tuple[int, int]]:
+        """The postings of candidate documents, by bisection when candidates are the fewer"""
+        if len(candidates) >= len(postings):
+            return [posting for posting in postings if posting[0] in allowed]
+        restricted = []
+        i = 0
+        for doc_idx in candidates:
+            # (doc_idx,) sorts just before (doc_idx, tf); both lists are sorted, so search on from the last hit
+            i = bisect_left(postings, (doc_idx,), i)
+            if i == len(postings):
+                break
+            if postings[i][0] == doc_idx:
+                restricted.append(postings[i])
+        return restricted
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get index statistics"""
+        return {
+            'documents': len(self),
+            'tombstones': len(self.deleted),
+            'terms': len(self.postings),
+            'postings': sum(len(p) for p in self.postings.values()),
+            'matrix_bytes': self._matrix.nbytes() if self._matrix is not None else 0
+        }
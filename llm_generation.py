@@ -0,0 +1,183 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from chunker import TokenizeFn, get_tokenizer
+
+logger = logging.getLogger(__name__)
+
+Message = Dict[str, str]
+# (messages, max_tokens) -> answer text
+CompleteFn = Callable[[List[Message], int], str]
+
+SYSTEM_PROMPT = ("You answer questions about AI/ML publications using only the numbered sources given. "
+                 "Cite sources as [n]. If they don't answer the question, say so.")
+# A source cut to fewer tokens than this is left out instead
+MIN_SOURCE_TOKENS = 32
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def openai_client():
+    """The process-wide OpenAI client; embeddings and chat completions share its pooled HTTP connections"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY", "your-api-key-here"))
+    return _client
+
+
+def reset_openai_client():
+    """Forget the client in a forked worker; the pooled sockets belong to the parent process"""
+    global _client
+    _client = None
+
+
+class OpenAIChat:
+    """CompleteFn backed by the chat completions API on the shared client"""
+
+    def __init__(self, model: Optional[str] = None, temperature: float = 0.0, timeout: Optional[float] = None):
+        self.model = model or os.environ.get("LLM_MODEL", "gpt-4o-mini")
+        self.temperature = temperature
+        self.timeout = timeout if timeout is not None else float(os.environ.get("LLM_TIMEOUT", 20))
+
+    def __call__(self, messages: List[Message], max_tokens: int) -> str:
+        response = openai_client().chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=self.temperature,
+            timeout=self.timeout
+        )
+        return response.choices[0].message.content or ""
+
+
+def _source_text(doc: Dict[str, Any]) -> str:
+    """Document text without the title/author lines the source header already carries, whitespace collapsed"""
+    text = doc['text']
+    if 'Description:' in text:
+        text = text.split('Description:', 1)[1]
+    return " ".join(text.split())
+
+
+class LLMGenerator:
+    """Answer questions with an LLM from retrieved documents packed into a token budget
+
+    Sources are added in rank order until ``context_tokens`` is spent; the
+    one that crosses the budget is cut at a token boundary. Concurrent
+    requests for the same prompt share one in-flight completion
+    (single-flight), and completions run on a pool of ``concurrency``
+    threads, which also bounds the connections taken from the HTTP pool.
+    ``answer`` waits at most ``timeout`` seconds and returns None on timeout
+    or error so the caller can fall back to the template answer; an
+    abandoned call still finishes for whoever else is waiting on it.
+    """
+
+    def __init__(self, complete: Optional[CompleteFn] = None, context_tokens: Optional[int] = None,
+                 max_tokens: Optional[int] = None, timeout: Optional[float] = None,
+                 concurrency: Optional[int] = None, tokenizer: Optional[TokenizeFn] = None,
+                 coalesce: bool = True):
+        self.complete = complete or OpenAIChat()
+        self.context_tokens = context_tokens or int(os.environ.get("LLM_CONTEXT_TOKENS", 1500))
+        self.max_tokens = max_tokens or int(os.environ.get("LLM_MAX_TOKENS", 512))
+        self.timeout = timeout if timeout is not None else float(os.environ.get("LLM_TIMEOUT", 20))
+        self.concurrency = concurrency or int(os.environ.get("LLM_CONCURRENCY", 8))
+        self.tokenize = tokenizer or get_tokenizer(os.environ.get("LLM_TOKENIZER") or None)
+        self.coalesce = coalesce
+        self._lock = threading.Lock()
+        self.reopen()
+        self.reset_stats()
+
+    def reopen(self):
+        """Start a fresh completion pool, e.g. in a forked worker whose inherited threads are gone"""
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='llm')
+        self._in_flight: Dict[str, Future] = {}
+
+    def reset_stats(self):
+        self.stats: Dict[str, int] = {
+            'requests': 0,
+            'completions': 0,
+            'coalesced': 0,
+            'timeouts': 0,
+            'errors': 0,
+            'source_tokens': 0,
+            'prompt_tokens': 0
+        }
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def pack(self, query: str, docs: List[Dict[str, Any]]) -> Tuple[List[Message], int]:
+        """Chat messages for a question and its sources, plus the number of source tokens kept"""
+        sources, used, available = [], 0, 0
+        for n, doc in enumerate(docs, 1):
+            text = f"[{n}] {doc['metadata']['title']} ({doc['metadata']['username']}): {_source_text(doc)}"
+            spans = self.tokenize(text)
+            available += len(spans)
+            if used >= self.context_tokens:
+                continue
+            room = self.context_tokens - used
+            if len(spans) > room:
+                if room < MIN_SOURCE_TOKENS:
+                    used = self.context_tokens
+                    continue
+                text, spans = text[:spans[room - 1][1]], spans[:room]
+            sources.append(text)
+            used += len(spans)
+        self._count('source_tokens', available)
+        self._count('prompt_tokens', used)
+        return [
+            {'role': 'system', 'content': SYSTEM_PROMPT},
+            {'role': 'user', 'content': "Sources:\n" + "\n\n".join(sources) + f"\n\nQuestion: {query}"}
+        ], used
+
+    def answer(self, query: str, docs: List[Dict[str, Any]]) -> Optional[str]:
+        """The LLM's answer, or None if it failed or took longer than the timeout"""
+        messages, _ = self.pack(query, docs)
+        try:
+            return self.submit(messages).result(timeout=self.timeout)
+        except FutureTimeout:
+            self._count('timeouts')
+            logger.warning(f"LLM answer took longer than {self.timeout}s, using the template answer")
+        except Exception as e:
+            self._count('errors')
+            logger.error(f"LLM generation failed, using the template answer: {e}")
+        return None
+
+    def submit(self, messages: List[Message]) -> Future:
+        """Future of the completion, joining an identical call already in flight"""
+        key = hashlib.sha256(json.dumps(messages, sort_keys=True).encode('utf-8')).hexdigest()
+        with self._lock:
+            self.stats['requests'] += 1
+            future = self._in_flight.get(key) if self.coalesce else None
+            if future is not None:
+                self.stats['coalesced'] += 1
+                return future
+            self.stats['completions'] += 1
+            future = self._executor.submit(self.complete, messages, self.max_tokens)
+            if self.coalesce:
+                self._in_flight[key] = future
+        if self.coalesce:
+            future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    def _forget(self, key: str, future: Future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Request counters, in-flight completions and the share of source tokens kept in prompts"""
+        with self._lock:
+            stats = dict(self.stats, in_flight=len(self._in_flight))
+        stats['context_kept'] = round(stats['prompt_tokens'] / stats['source_tokens'], 3) \
+            if stats['source_tokens'] else 1.0
+        return stats
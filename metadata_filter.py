@@ -0,0 +1,148 @@
+import json
+import math
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional
+
+EPOCH = datetime(1970, 1, 1)
+# Filter fields accepted from API requests
+FILTER_FIELDS = ('username', 'license', 'ids', 'created_after', 'created_before')
+
+
+def timestamp(value: Optional[datetime]) -> float:
+    """Seconds since the epoch of a naive UTC (or aware) datetime; NaN when unknown"""
+    if value is None:
+        return math.nan
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH).total_seconds()
+
+
+def _strings(data: Dict[str, Any], field: str) -> FrozenSet[str]:
+    value = data.get(field)
+    if value is None:
+        return frozenset()
+    values = [value] if isinstance(value, str) else value
+    if not isinstance(values, list) or not values or not all(isinstance(item, str) for item in values):
+        raise ValueError(f"{field} must be a string or a non-empty list of strings")
+    return frozenset(values)
+
+
+def _datetime(data: Dict[str, Any], field: str) -> Optional[datetime]:
+    value = data.get(field)
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"{field} must be an ISO 8601 date")
+    parsed = datetime.fromisoformat(value)
+    # Publication.created_at is naive UTC
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo is not None else parsed
+
+
+class SearchFilter(NamedTuple):
+    """Metadata restrictions on retrieved publications; empty fields don't restrict
+
+    Values within a field are OR-ed and fields are AND-ed. ``created_after``
+    is inclusive, ``created_before`` exclusive; publications without a
+    creation time never match a date range.
+    """
+    usernames: FrozenSet[str] = frozenset()
+    licenses: FrozenSet[str] = frozenset()
+    ids: FrozenSet[str] = frozenset()
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> Optional["SearchFilter"]:
+        """Filter from an API request's ``filters`` object, or None if it restricts nothing; raises ValueError"""
+        if data is None:
+            return None
+        if not isinstance(data, dict):
+            raise ValueError("filters must be an object")
+        unknown = sorted(set(data) - set(FILTER_FIELDS))
+        if unknown:
+            raise ValueError(f"Unknown filters: {', '.join(unknown)} (expected {', '.join(FILTER_FIELDS)})")
+        search_filter = cls(_strings(data, 'username'), _strings(data, 'license'), _strings(data, 'ids'),
+                            _datetime(data, 'created_after'), _datetime(data, 'created_before'))
+        return search_filter if search_filter.restricts else None
+
+    @property
+    def restricts(self) -> bool:
+        return bool(self.usernames or self.licenses or self.ids) or \
+            self.created_after is not None or self.created_before is not None
+
+    def key(self) -> str:
+        """Canonical text of the filter, e.g. for cache keys"""
+        return json.dumps([sorted(self.usernames), sorted(self.licenses), sorted(self.ids),
+                           self.created_after.isoformat() if self.created_after else None,
+                           self.created_before.isoformat() if self.created_before else None])
+
+
+class FilterIndex:
+    """Index positions per username and license, plus each position's creation time
+
+    Positions are appended in increasing order, so every per-value array is
+    sorted for free. ``select`` turns a SearchFilter into the sorted positions
+    it allows by intersecting those arrays, most selective first, and checks
+    the date range only on what is left. Tombstoned positions stay listed
+    (the scorers skip them) until the owner compacts.
+    """
+
+    def __init__(self):
+        self.usernames: Dict[str, array] = {}
+        self.licenses: Dict[str, array] = {}
+        self.created = array('d')  # Seconds since the epoch per position, NaN if unknown
+
+    def __len__(self) -> int:
+        return len(self.created)
+
+    def add(self, username: str, license: str, created_at: Optional[datetime]):
+        """Record the metadata of the next position"""
+        self._append(username, license, timestamp(created_at))
+
+    def _append(self, username: str, license: str, created: float):
+        position = len(self.created)
+        self.usernames.setdefault(username, array('q')).append(position)
+        self.licenses.setdefault(license, array('q')).append(position)
+        self.created.append(created)
+
+    def compacted(self, keep: List[int], records: List[Any]) -> "FilterIndex":
+        """Copy for a compacted index: ``keep`` are the old positions of its ``records``"""
+        filters = FilterIndex()
+        for old, record in zip(keep, records):
+            filters._append(record.username, record.license, self.created[old])
+        return filters
+
+    def select(self, search_filter: SearchFilter, positions: Dict[str, int]):
+        """Sorted NumPy array of the positions the filter allows; ``positions`` maps publication IDs"""
+        import numpy as np
+        selections = []
+        if search_filter.ids:
+            selections.append(np.array(sorted(positions[pub_id] for pub_id in search_filter.ids
+                                              if pub_id in positions), dtype=np.int64))
+        for values, table in ((search_filter.usernames, self.usernames), (search_filter.licenses, self.licenses)):
+            if not values:
+                continue
+            arrays = [np.array(table[value], dtype=np.int64) for value in values if value in table]
+            if not arrays:
+                return np.zeros(0, dtype=np.int64)
+            selections.append(np.unique(np.concatenate(arrays)) if len(arrays) > 1 else arrays[0])
+
+        selections.sort(key=len)
+        selected = selections[0] if selections else None
+        for other in selections[1:]:
+            # Probe the larger sorted array for each selected position
+            found = np.minimum(np.searchsorted(other, selected), len(other) - 1)
+            selected = selected[other[found] == selected]
+
+        if search_filter.created_after is None and search_filter.created_before is None:
+            return selected if selected is not None else np.arange(len(self.created), dtype=np.int64)
+        created = np.frombuffer(self.created, dtype=np.float64)
+        if selected is not None:
+            created = created[selected]
+        inside = ~np.isnan(created)
+        if search_filter.created_after is not None:
+            inside &= created >= timestamp(search_filter.created_after)
+        if search_filter.created_before is not None:
+            inside &= created < timestamp(search_filter.created_before)
+        return selected[inside] if selected is not None else np.flatnonzero(inside)
@@ -2,12 +2,16 @@ from app import db
 from datetime import datetime
 
 class QueryHistory(db.Model):
+    # Keyset pagination walks (timestamp, id) newest first
+    __table_args__ = (db.Index('ix_query_history_timestamp_id', 'timestamp', 'id'),)
+
     id = db.Column(db.Integer, primary_key=True)
     query = db.Column(db.Text, nullable=False)
     response = db.Column(db.Text, nullable=False)
     retrieved_docs = db.Column(db.Text)  # JSON string of retrieved document IDs
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     response_time = db.Column(db.Float)  # Response time in seconds
+    ttfb = db.Column(db.Float)  # Seconds until the first byte of the answer was sent
 
     def __repr__(self):
         return f'<QueryHistory {self.id}: {self.query[:50]}...>'
@@ -20,6 +24,26 @@ class Publication(db.Model):
     description = db.Column(db.Text, nullable=False)
     processed = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Last write; the database search backend derives its corpus version from it
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
         return f'<Publication {self.id}: {self.title[:50]}...>'
+
+class HistoryRollup(db.Model):
+    """Per-bucket query volume and latency histogram, maintained incrementally from QueryHistory"""
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    timed_count = db.Column(db.Integer, nullable=False, default=0)  # Rows with a response_time
+    total_time = db.Column(db.Float, nullable=False, default=0.0)
+    max_time = db.Column(db.Float, nullable=False, default=0.0)
+    histogram = db.Column(db.Text, nullable=False, default='{}')  # JSON {bin: count} of response times
+
+    def __repr__(self):
+        return f'<HistoryRollup {self.bucket_start}: {self.count}>'
+
+class RollupState(db.Model):
+    """Progress markers for incremental rollups (e.g. the (timestamp, id) of the last QueryHistory row aggregated)"""
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    timestamp = db.Column(db.DateTime)
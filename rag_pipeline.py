@@ -1,29 +1,278 @@
+import contextvars
 import os
 import logging
+import threading
 import time
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from app import db
+from models import Publication
 from simple_search import simple_search
+from db_search import database_search, SEARCH_BACKEND
+from sharded_search import sharded_search
 from data_processor import PublicationProcessor
+from result_cache import ResultCache, normalize_query
+from index_snapshot import IndexSnapshots, KEYWORD_FILE
+from instrumentation import span
+from metadata_filter import SearchFilter
+from llm_generation import LLMGenerator, reset_openai_client
 
 logger = logging.getLogger(__name__)
 
+FUSION_METHODS = ('rrf', 'weighted')
+
+
+class HybridRetriever:
+    """Query the keyword index and the vector store concurrently and fuse their rankings
+
+    Vector hits are chunks, so both result lists are first collapsed to one
+    entry per publication, whose ``id`` is the publication id
+    (``metadata['pub_id']``) and ``chunk_id`` the best chunk's. The lists are
+    then fused with reciprocal-rank fusion, or with a weighted sum of min-max
+    normalized scores. Without a vector store, or when the query cannot be embedded,
+    retrieval falls back to the keyword ranking alone. A metadata filter
+    restricts both searches before they rank anything: the keyword index
+    scores only the publications it allows, and the vector search is limited
+    to their chunks.
+    """
+    
+    def __init__(self, search_engine, vector_store=None, fusion: str = None, rrf_k: int = None,
+                 keyword_weight: float = None, candidates: int = None):
+        self.search_engine = search_engine
+        self.vector_store = vector_store
+        self.fusion = fusion or os.environ.get("HYBRID_FUSION", "rrf")
+        if self.fusion not in FUSION_METHODS:
+            raise ValueError(f"Unknown fusion method '{self.fusion}', expected one of {FUSION_METHODS}")
+        self.rrf_k = rrf_k or int(os.environ.get("HYBRID_RRF_K", 60))
+        self.keyword_weight = keyword_weight if keyword_weight is not None \
+            else float(os.environ.get("HYBRID_KEYWORD_WEIGHT", 0.5))
+        self.candidates = candidates or int(os.environ.get("HYBRID_CANDIDATES", 20))
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='retrieve')
+    
+    def retrieve(self, query: str, top_k: int = 5,
+                 search_filter: Optional[SearchFilter] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Return the fused top_k documents and per-stage timings in milliseconds"""
+        results, timings = self.retrieve_many([query], top_k, search_filter)
+        return results[0], timings
+    
+    def retrieve_many(self, queries: List[str], top_k: int = 5,
+                      search_filter: Optional[SearchFilter] = None) -> Tuple[List[List[Dict[str, Any]]], Dict[str, Any]]:
+        """Retrieve for several queries with one batched keyword pass and one batched vector search"""
+        with span('retrieve'):
+            return self._retrieve_many(queries, top_k, search_filter)
+    
+    def _retrieve_many(self, queries: List[str], top_k: int,
+                       search_filter: Optional[SearchFilter]) -> Tuple[List[List[Dict[str, Any]]], Dict[str, Any]]:
+        fetch = max(top_k, self.candidates)
+        timings: Dict[str, Any] = {'keyword_ms': None, 'vector_ms': None, 'fusion_ms': None}
+        
+        vector_future = None
+        if self.vector_store is not None and self.vector_store.index is not None:
+            pub_ids = None
+            if search_filter is not None:
+                # The vector index is keyed by chunk, so the filter travels as the publications it allows
+                with span('filter'):
+                    pub_ids = self.search_engine.matching_ids(search_filter)
+            # Run in a copy of this context so the vector span lands in the request's trace
+            vector_future = self._executor.submit(contextvars.copy_context().run, self._timed, 'vector',
+                                                  self.vector_store.search_many, queries, fetch, pub_ids=pub_ids)
+        keyword_results, timings['keyword_ms'] = self._timed('keyword', self.search_engine.search_many, queries, fetch,
+                                                             search_filter=search_filter)
+        
+        vector_results = [[] for _ in queries]
+        if vector_future is not None:
+            try:
+                vector_results, timings['vector_ms'] = vector_future.result()
+            except Exception as e:
+                logger.error(f"Vector search failed, using keyword results only: {e}")
+        
+        if not any(vector_results):
+            timings['mode'] = 'keyword'
+            return [self._by_publication(results)[:top_k] for results in keyword_results], timings
+        
+        start = time.perf_counter()
+        with span('fuse'):
+            results = [self._fuse(keyword, vector, top_k) for keyword, vector in zip(keyword_results, vector_results)]
+        timings['fusion_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        timings['mode'] = 'hybrid'
+        return results, timings
+    
+    def _fuse(self, keyword_results: List[Dict[str, Any]], vector_results: List[Dict[str, Any]],
+              top_k: int) -> List[Dict[str, Any]]:
+        """Fused top_k for one query; keyword-only when the query has no vector hits"""
+        if not vector_results:
+            return self._by_publication(keyword_results)[:top_k]
+        if self.fusion == 'rrf':
+            fused = self._reciprocal_rank_fusion(keyword_results, vector_results)
+        else:
+            fused = self._weighted_fusion(keyword_results, vector_results)
+        results = []
+        for rank, (doc, score) in enumerate(fused[:top_k], 1):
+            doc['score'] = score
+            doc['rank'] = rank
+            results.append(doc)
+        return results
+    
+    @staticmethod
+    def _timed(stage: str, search, queries: List[str], k: int, **kwargs) -> Tuple[List[List[Dict[str, Any]]], float]:
+        start = time.perf_counter()
+        with span(stage):
+            results = search(queries, k, **kwargs)
+        return results, round((time.perf_counter() - start) * 1000, 3)
+    
+    @staticmethod
+    def _by_publication(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Keep the best-ranked result of each publication, renumbering ranks
+
+        Every result is keyed by its publication id; a chunk's own id moves to ``chunk_id``.
+        """
+        seen = set()
+        unique = []
+        for doc in results:
+            pub_id = doc.get('metadata', {}).get('pub_id') or doc['id']
+            if pub_id in seen:
+                continue
+            seen.add(pub_id)
+            if doc['id'] != pub_id:
+                doc['chunk_id'] = doc['id']
+                doc['id'] = pub_id
+            doc['rank'] = len(unique) + 1
+            unique.append(doc)
+        return unique
+    
+    def _reciprocal_rank_fusion(self, keyword_results: List[Dict[str, Any]],
+                                vector_results: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], float]]:
+        scores: Dict[str, float] = {}
+        docs: Dict[str, Dict[str, Any]] = {}
+        for results in (self._by_publication(vector_results), self._by_publication(keyword_results)):
+            for rank, doc in enumerate(results, 1):
+                pub_id = doc['id']
+                scores[pub_id] = scores.get(pub_id, 0.0) + 1.0 / (self.rrf_k + rank)
+                docs.setdefault(pub_id, doc)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [(docs[pub_id], score) for pub_id, score in ranked]
+    
+    def _weighted_fusion(self, keyword_results: List[Dict[str, Any]],
+                         vector_results: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], float]]:
+        # L2 distances shrink as matches improve, so flip them before normalizing
+        higher_is_better = getattr(self.vector_store, 'metric', 'l2') == 'ip'
+        scores: Dict[str, float] = {}
+        docs: Dict[str, Dict[str, Any]] = {}
+        for results, weight, flip in ((self._by_publication(vector_results), 1.0 - self.keyword_weight,
+                                       not higher_is_better),
+                                      (self._by_publication(keyword_results), self.keyword_weight, False)):
+            raw = [-doc['score'] if flip else doc['score'] for doc in results]
+            if not raw:
+                continue
+            low, high = min(raw), max(raw)
+            for doc, value in zip(results, raw):
+                normalized = (value - low) / (high - low) if high > low else 1.0
+                pub_id = doc['id']
+                scores[pub_id] = scores.get(pub_id, 0.0) + weight * normalized
+                docs.setdefault(pub_id, doc)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [(docs[pub_id], score) for pub_id, score in ranked]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Retrieval configuration and vector store statistics"""
+        stats = {
+            'mode': 'hybrid' if self.vector_store is not None else 'keyword',
+            'fusion': self.fusion
+        }
+        if self.vector_store is not None:
+            stats['vector_store'] = self.vector_store.get_stats()
+        return stats
+
+
+def _openai_feature_enabled(variable: str) -> bool:
+    """Switches like HYBRID_SEARCH: on/off forces the feature; 'auto' enables it when an OpenAI key is configured"""
+    setting = os.environ.get(variable, "auto").lower()
+    if setting == 'auto':
+        return bool(os.environ.get("OPENAI_API_KEY"))
+    return setting in ('on', 'true', '1')
+
+
 class RAGPipeline:
     """RAG (Retrieval-Augmented Generation) pipeline for question answering"""
     
     def __init__(self):
-        self.openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY", "your-api-key-here"))
-        self.search_engine = simple_search
+        self.search_engine = {'database': database_search,
+                              'sharded': sharded_search}.get(SEARCH_BACKEND, simple_search)
+        if self.search_engine is sharded_search:
+            # Forked now, at import, while no other thread exists (the gunicorn master forks workers later)
+            sharded_search.start()
         self.processor = PublicationProcessor()
+        self.retriever = HybridRetriever(self.search_engine)
+        # The vector store (FAISS, NumPy, the OpenAI SDK) is only set up by initialize()
+        self.hybrid = _openai_feature_enabled("HYBRID_SEARCH")
+        self.compaction_ratio = float(os.environ.get("INDEX_COMPACTION_RATIO", 0.2))
+        self.result_cache = ResultCache(
+            ttl=float(os.environ.get("RESULT_CACHE_TTL", 300)),
+            max_bytes=int(os.environ.get("RESULT_CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+            path=os.environ.get("RESULT_CACHE_PATH") or None
+        )
+        self.generation_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("GENERATION_CONCURRENCY", 4)),
+                                                  thread_name_prefix='generate')
+        # Answers come from the LLM when enabled, with the template answer as the fallback
+        self.generator: Optional[LLMGenerator] = LLMGenerator() if _openai_feature_enabled("LLM_GENERATION") else None
+        # Built indexes are published as immutable snapshots that every worker process loads
+        snapshot_dir = os.environ.get("INDEX_SNAPSHOT_DIR", "index_snapshots")
+        self.snapshots = IndexSnapshots(snapshot_dir, keep=int(os.environ.get("INDEX_SNAPSHOT_KEEP", 3))) \
+            if snapshot_dir else None
+        self.snapshot_version: Optional[str] = None
+        self.snapshot_poll_interval = float(os.environ.get("INDEX_SNAPSHOT_POLL_INTERVAL", 5.0))
+        self._snapshot_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._init_lock = threading.Lock()
+        self._warmup: Optional[threading.Thread] = None
+        self.warmup_error: Optional[str] = None
         self.is_initialized = False
     
-    def initialize(self):
-        """Initialize the RAG pipeline"""
+    @property
+    def vector_store(self):
+        """Optional VectorStore kept in sync alongside the keyword index and used for hybrid retrieval"""
+        return self.retriever.vector_store
+    
+    @vector_store.setter
+    def vector_store(self, value):
+        self.retriever.vector_store = value
+    
+    @staticmethod
+    def _create_vector_store():
+        """Vector store for hybrid retrieval, or None if it cannot be set up"""
+        try:
+            from vector_store import VectorStore
+            return VectorStore()
+        except Exception as e:
+            logger.error(f"Vector store unavailable, using keyword search only: {e}")
+            return None
+    
+    def initialize(self, watch: bool = True):
+        """Load the published index snapshot, or build the indexes from the database and publish them
+
+        ``watch`` starts the thread that follows newer snapshots; pass False
+        in a process that is about to fork (gunicorn ``--preload``) and call
+        ``after_fork`` in each worker instead. Concurrent calls (e.g. a request
+        arriving during warm-up) wait for the first one instead of building twice.
+        """
+        with self._init_lock:
+            if not self.is_initialized:
+                self._initialize(watch)
+    
+    def _initialize(self, watch: bool):
         logger.info("Initializing RAG pipeline...")
+        if self.hybrid and self.vector_store is None:
+            self.vector_store = self._create_vector_store()
+        
+        if self.snapshots is not None and self.load_snapshot():
+            self.is_initialized = True
+            if watch:
+                self.start_snapshot_watcher()
+            logger.info(f"RAG pipeline initialized from index snapshot {self.snapshot_version}")
+            return
         
         # Initialize data first
-        publications = self.processor.get_all_publications()
-        if not publications:
+        if db.session.query(Publication.id).first() is None:
             logger.info("No publications found, loading from JSON...")
             from data_processor import initialize_data
             initialize_data()
@@ -33,29 +282,248 @@ class RAGPipeline:
         self.is_initialized = self.search_engine.is_initialized
         
         if self.is_initialized:
+            # The keyword index was just built from every publication. A vector
+            # index loaded from disk only has to catch up on what changed since
+            vector_loaded = self.vector_store is not None and self.vector_store.load_index()
+            snapshot = self._stage_snapshot()
+            vector_rebuilt = False
+            if self.vector_store is not None and not vector_loaded:
+                self.vector_store.create_index(self.processor.iter_document_chunks(self.processor.get_all_publications()))
+                vector_rebuilt = True
+            self.sync_index(keyword=False, vector=not vector_rebuilt, snapshot=snapshot)
+            if watch:
+                self.start_snapshot_watcher()
             logger.info("RAG pipeline initialized successfully")
         else:
             logger.error("Failed to initialize RAG pipeline")
     
-    def retrieve_documents(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Retrieve relevant documents for a query"""
+    def start_warmup(self, flask_app):
+        """Initialize in a background thread so the server answers (and /ready reports progress) meanwhile"""
+        if self.is_initialized or self.warming_up:
+            return
+        
+        def warm_up():
+            try:
+                with flask_app.app_context():
+                    self.initialize()
+                self.warmup_error = None
+            except Exception as e:
+                logger.error(f"Error warming up RAG pipeline: {e}")
+                self.warmup_error = str(e)
+        
+        self._warmup = threading.Thread(target=warm_up, name='warmup', daemon=True)
+        self._warmup.start()
+    
+    @property
+    def warming_up(self) -> bool:
+        return self._warmup is not None and self._warmup.is_alive()
+    
+    def wait_for_warmup(self, timeout: Optional[float] = None) -> bool:
+        """Block until a running warm-up finishes; returns whether the pipeline is initialized"""
+        if self._warmup is not None:
+            self._warmup.join(timeout)
+        return self.is_initialized
+    
+    def refresh(self):
+        """Apply publication changes incrementally, initializing on first use"""
+        if not self.is_initialized:
+            self.initialize()
+            if not self.is_initialized:
+                return
+        # Also catches up a freshly loaded snapshot with publications added since it was published
+        self.sync_index()
+    
+    def sync_index(self, keyword: bool = True, vector: bool = True, snapshot: Optional[str] = None) -> Dict[str, int]:
+        """Flow added, updated and deleted publications into the indexes
+
+        Publications with ``processed=False`` are (re)indexed by ID, IDs that
+        are indexed but no longer in the database are tombstoned, and both
+        indexes are compacted once tombstones exceed INDEX_COMPACTION_RATIO.
+        Passing ``keyword``/``vector`` as False skips an index that was just
+        rebuilt from scratch. If anything changed, the result is published as
+        a new index snapshot (``snapshot`` is a version the caller already
+        staged).
+        """
+        pending = self._load_detached(Publication.processed.isnot(True))
+        live_ids = {pub_id for (pub_id,) in db.session.query(Publication.id)}
+        removed = self.search_engine.indexed_ids() - live_ids if keyword else set()
+        vector_indexed, vector_missing = set(), set()
+        if vector and self.vector_store is not None:
+            vector_indexed = self.vector_store.indexed_ids()
+            # Also backfill publications a persisted vector index has never seen
+            vector_missing = live_ids - vector_indexed - {pub.id for pub in pending}
+        
+        # Only a changed corpus gets a new snapshot; published ones are never written to
+        if snapshot is None and (pending or removed or vector_missing or vector_indexed - live_ids):
+            snapshot = self._stage_snapshot()
+        
+        if keyword:
+            self.search_engine.upsert_publications(pending)
+            self.search_engine.remove_publications(removed)
+            self.search_engine.compact(self.compaction_ratio)
+            self.search_engine.compile()
+        
+        if vector and self.vector_store is not None:
+            publications = pending + (self._load_detached(Publication.id.in_(vector_missing)) if vector_missing else [])
+            self.vector_store.upsert_documents(self.processor.create_document_chunks(publications))
+            self.vector_store.delete_publications(vector_indexed - live_ids)
+            if not self.vector_store.compact(self.compaction_ratio) and (snapshot or self.snapshots is None):
+                self.vector_store.save_index()
+        
+        self._mark_processed([pub.id for pub in pending])
+        if snapshot is not None:
+            try:
+                self.snapshots.publish(snapshot, self.search_engine, self.vector_store)
+                self.snapshot_version = snapshot
+            except Exception as e:
+                logger.error(f"Error publishing index snapshot {snapshot}: {e}")
+        # Cached answers are keyed by corpus version, so a changed corpus invalidates them
+        self.result_cache.set_version(self.search_engine.corpus_version)
+        logger.info(f"Index sync complete: {len(pending)} publications indexed, {len(removed)} removed")
+        return {'indexed': len(pending), 'removed': len(removed)}
+    
+    def _stage_snapshot(self) -> Optional[str]:
+        """Stage a new snapshot version and point vector store writes into it, so published files stay untouched"""
+        if self.snapshots is None:
+            return None
+        version = self.snapshots.stage()
+        if self.vector_store is not None:
+            for attribute, path in self.snapshots.vector_paths(version).items():
+                setattr(self.vector_store, attribute, path)
+        return version
+    
+    def load_snapshot(self, version: Optional[str] = None) -> bool:
+        """Serve the given (default: current) snapshot version; in-flight searches finish on the old one"""
+        if self.snapshots is None:
+            return False
+        with self._snapshot_lock:
+            version = version or self.snapshots.current()
+            if version is None:
+                return False
+            if version == self.snapshot_version:
+                return True
+            try:
+                manifest = self.snapshots.manifest(version)
+            except Exception as e:
+                logger.error(f"Error reading index snapshot {version}: {e}")
+                return False
+            if self.vector_store is not None and not manifest.get('vectors'):
+                logger.warning(f"Index snapshot {version} has no vector index, rebuilding instead")
+                return False
+            if not self.search_engine.load_snapshot(self.snapshots.path(version, KEYWORD_FILE)):
+                return False
+            if self.vector_store is not None:
+                for attribute, path in self.snapshots.vector_paths(version).items():
+                    setattr(self.vector_store, attribute, path)
+                if not self.vector_store.load_index():
+                    logger.error(f"Error loading the vector index of snapshot {version}")
+            self.snapshot_version = version
+        self.result_cache.set_version(self.search_engine.corpus_version)
+        logger.info(f"Serving index snapshot {version}")
+        return True
+    
+    def start_snapshot_watcher(self):
+        """Start the thread that swaps in newly published snapshots (a no-op if already running)"""
+        if self.snapshots is None or self.snapshot_poll_interval <= 0:
+            return
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._watcher = threading.Thread(target=self._watch_snapshots, name='snapshot-watcher', daemon=True)
+        self._watcher.start()
+    
+    def _watch_snapshots(self):
+        while True:
+            try:
+                version = self.snapshots.current()
+                if version is not None and version != self.snapshot_version and self.load_snapshot(version):
+                    self.is_initialized = True
+            except Exception as e:
+                logger.error(f"Error checking for index snapshots: {e}")
+            time.sleep(self.snapshot_poll_interval)
+    
+    def after_fork(self):
+        """Reopen per-process resources in a forked worker and start following snapshots"""
+        self.result_cache.reopen()
+        reset_openai_client()
+        if self.generator is not None:
+            self.generator.reopen()
+        if self.vector_store is not None:
+            self.vector_store.embedding_cache.reopen()
+        self.start_snapshot_watcher()
+    
+    @staticmethod
+    def _load_detached(condition) -> List[Publication]:
+        """Query publications and detach them so later commits don't expire them"""
+        publications = db.session.query(Publication).filter(condition).all()
+        for pub in publications:
+            db.session.expunge(pub)
+        return publications
+    
+    def _mark_processed(self, pub_ids: List[str]):
+        """Set Publication.processed for indexed publications"""
+        try:
+            for start in range(0, len(pub_ids), 500):
+                batch = pub_ids[start:start + 500]
+                # Marking isn't a content change, so updated_at (a corpus version input) is kept
+                db.session.query(Publication).filter(Publication.id.in_(batch)).update(
+                    {Publication.processed: True, Publication.updated_at: Publication.updated_at},
+                    synchronize_session=False
+                )
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Error marking publications as processed: {e}")
+            db.session.rollback()
+    
+    def retrieve_documents(self, query: str, top_k: int = 5,
+                           search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """Retrieve relevant documents for a query, optionally restricted by a metadata filter"""
+        return self.retrieve_with_timings(query, top_k, search_filter)[0]
+    
+    def retrieve_with_timings(self, query: str, top_k: int = 5,
+                              search_filter: Optional[SearchFilter] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Retrieve relevant documents for a query along with per-stage timings"""
         if not self.is_initialized:
             logger.error("RAG pipeline not initialized")
-            return []
+            return [], {}
         
-        return self.search_engine.search(query, top_k=top_k)
+        return self.retriever.retrieve(query, top_k=top_k, search_filter=search_filter)
     
     def generate_response(self, query: str, retrieved_docs: List[Dict[str, Any]]) -> str:
         """Generate response using retrieved documents"""
+        return self._generate(query, retrieved_docs)[0]
+    
+    def _generate(self, query: str, retrieved_docs: List[Dict[str, Any]]) -> Tuple[str, str]:
+        """The answer and where it came from: 'llm', 'template', or 'fallback' when the LLM failed or timed out"""
+        with span('generate'):
+            sections, source = self._answer_sections(query, retrieved_docs)
+            return "".join(sections), source
+    
+    def _answer_sections(self, query: str, retrieved_docs: List[Dict[str, Any]]) -> Tuple[Iterator[str], str]:
+        """Answer sections and their source; the LLM's answer comes as one section"""
+        if retrieved_docs and self.generator is not None:
+            answer = self.generator.answer(query, retrieved_docs)
+            if answer is not None:
+                return iter([answer]), 'llm'
+            return self._response_sections(query, retrieved_docs), 'fallback'
+        return self._response_sections(query, retrieved_docs), 'template'
+    
+    def _lazy_sections(self, query: str, retrieved_docs: List[Dict[str, Any]],
+                       timings: Dict[str, Any]) -> Iterator[str]:
+        """Answer sections generated only once iterated, so streams send the documents before waiting on the LLM"""
+        sections, timings['answer_source'] = self._answer_sections(query, retrieved_docs)
+        yield from sections
+    
+    def _response_sections(self, query: str, retrieved_docs: List[Dict[str, Any]]) -> Iterator[str]:
+        """Yield the response a section at a time; the sections concatenate to the full answer"""
         if not retrieved_docs:
-            return "I couldn't find any relevant information to answer your question. Please try rephrasing your query or asking about AI/ML publications, research, or related topics."
+            yield "I couldn't find any relevant information to answer your question. Please try rephrasing your query or asking about AI/ML publications, research, or related topics."
+            return
         
         # Since OpenAI API is not available, create a comprehensive response from the retrieved documents
-        response_parts = []
-        response_parts.append(f"Based on the AI/ML publications in our database, here's what I found regarding your question: '{query}'")
-        response_parts.append("")
+        yield f"Based on the AI/ML publications in our database, here's what I found regarding your question: '{query}'\n\n"
         
         for i, doc in enumerate(retrieved_docs[:3]):  # Use top 3 documents
+            response_parts = []
             response_parts.append(f"**Publication {i+1}: {doc['metadata']['title']}**")
             response_parts.append(f"Author: {doc['metadata']['username']}")
             if doc['metadata']['license']:
@@ -69,8 +537,9 @@ class RAGPipeline:
             else:
                 response_parts.append(f"Content: {doc_text[:400]}...")
             
-            response_parts.append("")
+            yield "\n".join(response_parts) + "\n\n"
         
+        response_parts = []
         response_parts.append("---")
         response_parts.append(f"Found {len(retrieved_docs)} relevant publications. The above shows the top {min(3, len(retrieved_docs))} most relevant results.")
         
@@ -80,10 +549,64 @@ class RAGPipeline:
             for doc in retrieved_docs[3:5]:  # Show 2 more titles
                 response_parts.append(f"- {doc['metadata']['title']} by {doc['metadata']['username']}")
         
-        return "\n".join(response_parts)
+        yield "\n".join(response_parts)
+    
+    def generate_response_stream(self, query: str, top_k: int = 5,
+                                 search_filter: Optional[SearchFilter] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Stream an answer as (event, data) pairs
+
+        A 'docs' event with the retrieved documents' metadata comes first,
+        then one 'token' event per answer section (the whole answer when it
+        comes from the LLM), then a 'done' event with
+        the time to that first event ('ttfb') and the total response time.
+        """
+        start_time = time.time()
+        if not self.is_initialized:
+            yield 'error', {'error': 'System not initialized'}
+            return
+        
+        scope = search_filter.key() if search_filter is not None else ''
+        cached = self.result_cache.get(query, top_k, scope)
+        if cached is not None:
+            retrieved_docs, timings = cached['retrieved_docs'], {'mode': 'cache'}
+            sections = iter([cached['answer']])
+        else:
+            retrieved_docs, timings = self.retrieve_with_timings(query, top_k=top_k, search_filter=search_filter)
+            sections = self._lazy_sections(query, retrieved_docs, timings)
+        
+        yield 'docs', {
+            'query': query,
+            'retrieved_docs': [{'id': doc['id'], 'score': doc.get('score'), 'rank': doc.get('rank'),
+                                'metadata': doc['metadata']} for doc in retrieved_docs],
+            'num_retrieved': len(retrieved_docs),
+            'cached': cached is not None
+        }
+        ttfb = time.time() - start_time
+        
+        answer_parts = []
+        for section in sections:
+            answer_parts.append(section)
+            yield 'token', {'text': section}
+        
+        response_time = time.time() - start_time
+        # Fallback answers aren't cached, so the next ask tries the LLM again
+        if cached is None and timings.get('answer_source') != 'fallback':
+            self.result_cache.put(query, top_k, {
+                'query': query,
+                'answer': "".join(answer_parts),
+                'retrieved_docs': retrieved_docs,
+                'response_time': response_time,
+                'num_retrieved': len(retrieved_docs),
+                'timings': timings,
+                'cached': False
+            }, scope)
+        yield 'done', {'ttfb': ttfb, 'response_time': response_time, 'timings': timings}
     
-    def answer_question(self, query: str) -> Dict[str, Any]:
-        """Complete RAG pipeline: retrieve and generate answer"""
+    def answer_question(self, query: str, top_k: int = 5, search_filter: Optional[SearchFilter] = None) -> Dict[str, Any]:
+        """Complete RAG pipeline: retrieve and generate answer, reusing cached answers
+
+        ``search_filter`` limits retrieval to publications matching its metadata.
+        """
         start_time = time.time()
         
         if not self.is_initialized:
@@ -95,21 +618,115 @@ class RAGPipeline:
                 'error': 'System not initialized'
             }
         
+        cache_start = time.perf_counter()
+        scope = search_filter.key() if search_filter is not None else ''
+        cached = self.result_cache.get(query, top_k, scope)
+        if cached is not None:
+            cached.update({
+                'query': query,
+                'response_time': time.time() - start_time,
+                'timings': {'mode': 'cache', 'cache_ms': round((time.perf_counter() - cache_start) * 1000, 3)},
+                'cached': True
+            })
+            return cached
+        
         # Retrieve relevant documents
-        retrieved_docs = self.retrieve_documents(query)
+        retrieval_start = time.perf_counter()
+        retrieved_docs, timings = self.retrieve_with_timings(query, top_k=top_k, search_filter=search_filter)
+        timings['retrieval_ms'] = round((time.perf_counter() - retrieval_start) * 1000, 3)
         
         # Generate response
-        answer = self.generate_response(query, retrieved_docs)
+        generation_start = time.perf_counter()
+        answer, timings['answer_source'] = self._generate(query, retrieved_docs)
+        timings['generation_ms'] = round((time.perf_counter() - generation_start) * 1000, 3)
         
         response_time = time.time() - start_time
         
-        return {
+        result = {
             'query': query,
             'answer': answer,
             'retrieved_docs': retrieved_docs,
             'response_time': response_time,
-            'num_retrieved': len(retrieved_docs)
+            'num_retrieved': len(retrieved_docs),
+            'timings': timings,
+            'cached': False
         }
+        if timings['answer_source'] != 'fallback':
+            self.result_cache.put(query, top_k, result, scope)
+        return result
+    
+    def answer_many(self, queries: List[str], top_k: int = 5,
+                    search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """Answer several questions, returning one result per query in the same order
+
+        Cached answers are reused and repeated questions are answered once.
+        The remaining questions share one batched retrieval (one keyword pass,
+        one embedding request) and their responses are generated concurrently.
+        A query that fails gets ``{'query', 'error'}`` instead of an answer.
+        ``search_filter`` applies to every query.
+        """
+        start_time = time.time()
+        if not self.is_initialized:
+            return [{'query': query, 'error': 'System not initialized'} for query in queries]
+        
+        scope = search_filter.key() if search_filter is not None else ''
+        results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+        pending: Dict[str, List[int]] = {}  # normalized query -> positions asking it
+        for i, query in enumerate(queries):
+            if not isinstance(query, str) or not query.strip():
+                results[i] = {'query': query, 'error': 'Query must be a non-empty string'}
+                continue
+            cached = self.result_cache.get(query, top_k, scope)
+            if cached is not None:
+                cached.update({'query': query, 'response_time': time.time() - start_time,
+                               'timings': {'mode': 'cache'}, 'cached': True})
+                results[i] = cached
+            else:
+                pending.setdefault(normalize_query(query), []).append(i)
+        
+        if pending:
+            unique = [queries[positions[0]] for positions in pending.values()]
+            try:
+                retrieval_start = time.perf_counter()
+                retrieved, timings = self.retriever.retrieve_many(unique, top_k=top_k, search_filter=search_filter)
+                timings['retrieval_ms'] = round((time.perf_counter() - retrieval_start) * 1000, 3)
+                timings['batch_size'] = len(unique)
+            except Exception as e:
+                logger.error(f"Batch retrieval failed: {e}")
+                for positions in pending.values():
+                    for i in positions:
+                        results[i] = {'query': queries[i], 'error': f"Retrieval failed: {e}"}
+                return results
+            
+            generations = [self.generation_pool.submit(self._timed_generation, query, docs)
+                           for query, docs in zip(unique, retrieved)]
+            for query, docs, positions, generation in zip(unique, retrieved, pending.values(), generations):
+                try:
+                    answer, source, generation_ms = generation.result()
+                except Exception as e:
+                    logger.error(f"Error generating answer for '{query}': {e}")
+                    for i in positions:
+                        results[i] = {'query': queries[i], 'error': f"Generation failed: {e}"}
+                    continue
+                result = {
+                    'query': query,
+                    'answer': answer,
+                    'retrieved_docs': docs,
+                    'response_time': time.time() - start_time,
+                    'num_retrieved': len(docs),
+                    'timings': dict(timings, generation_ms=generation_ms, answer_source=source),
+                    'cached': False
+                }
+                if source != 'fallback':
+                    self.result_cache.put(query, top_k, result, scope)
+                for i in positions:
+                    results[i] = dict(result, query=queries[i])
+        return results
+    
+    def _timed_generation(self, query: str, docs: List[Dict[str, Any]]) -> Tuple[str, str, float]:
+        start = time.perf_counter()
+        answer, source = self._generate(query, docs)
+        return answer, source, round((time.perf_counter() - start) * 1000, 3)
     
     def get_system_status(self) -> Dict[str, Any]:
         """Get system status and statistics"""
@@ -118,6 +735,16 @@ class RAGPipeline:
         return {
             'initialized': self.is_initialized,
             'vector_store_stats': search_stats,
+            'retrieval': self.retriever.get_stats(),
+            'result_cache': self.result_cache.get_stats(),
+            'generation': self.generator.get_stats() if self.generator is not None else None,
+            # The in-memory keyword index is unpickled by every process; only the chunk store is mmapped
+            'index_snapshot': {
+                'version': self.snapshot_version,
+                'keyword_index': {'database': 'database', 'sharded': 'shard_processes'}.get(SEARCH_BACKEND,
+                                                                                          'per_process'),
+                'chunk_store': 'memory_mapped' if self.vector_store is not None else None
+            },
             'openai_configured': bool(os.environ.get("OPENAI_API_KEY"))
         }
 
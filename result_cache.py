@@ -0,0 +1,187 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from text_cleaning import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a question: case-folded, whitespace collapsed, trailing punctuation dropped"""
+    return normalize_text(query).casefold().rstrip(' ?!.')
+
+
+class ResultCache:
+    """TTL + LRU cache of answer_question results, bounded by size in bytes
+
+    Keys combine the normalized query, top_k, an optional scope (such as a
+    metadata filter) and the corpus version, so a
+    changed corpus never serves stale answers; ``set_version`` also purges
+    entries of older versions. Values are stored as JSON. With ``path`` set,
+    entries are also written to a SQLite file that other worker processes
+    share, behind the per-process in-memory LRU.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_bytes: int = 32 * 1024 * 1024, path: Optional[str] = None):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.path = path
+        self.version = ''
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[bytes, Tuple[float, bytes]]" = OrderedDict()  # key -> (expires, value)
+        self._bytes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+        self.conn = None
+        if path:
+            self.conn = self._connect()
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS results (key BLOB PRIMARY KEY, version TEXT NOT NULL, "
+                "value BLOB NOT NULL, size INTEGER NOT NULL, expires REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS ix_results_last_used ON results (last_used)")
+            self.conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+    def reopen(self):
+        """Open a fresh connection to the shared file, e.g. in a forked worker process"""
+        if self.conn is not None:
+            with self._lock:
+                self.conn = self._connect()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_bytes > 0
+
+    def key(self, query: str, top_k: int, scope: str = '') -> bytes:
+        """Cache key for a query under the current corpus version"""
+        text = f"{self.version}\x00{top_k}\x00{normalize_query(query)}"
+        if scope:
+            text += f"\x00{scope}"
+        return hashlib.sha256(text.encode('utf-8')).digest()
+
+    def get(self, query: str, top_k: int, scope: str = '') -> Optional[Dict[str, Any]]:
+        """Cached result for the query, or None"""
+        if not self.enabled:
+            return None
+        key = self.key(query, top_k, scope)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                self._drop(key)
+                self.stats['expired'] += 1
+                entry = None
+            if entry is None and self.conn is not None:
+                entry = self._load_shared(key, now)
+                if entry is not None:
+                    self._remember(key, entry)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+        return json.loads(entry[1])
+
+    def put(self, query: str, top_k: int, result: Dict[str, Any], scope: str = ''):
+        """Cache a result; results larger than the whole cache are skipped"""
+        if not self.enabled:
+            return
+        try:
+            value = json.dumps(result).encode('utf-8')
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Result for '{query}' is not cacheable: {e}")
+            return
+        if len(value) > self.max_bytes:
+            return
+        key = self.key(query, top_k, scope)
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, (expires, value))
+            if self.conn is not None:
+                self._store_shared(key, expires, value)
+
+    def set_version(self, version: str):
+        """Switch to a new corpus version, dropping entries cached under any other version"""
+        with self._lock:
+            if version == self.version:
+                return
+            self.version = version
+            self._entries.clear()
+            self._bytes = 0
+            if self.conn is not None:
+                self.conn.execute("DELETE FROM results WHERE version != ?", (version,))
+                self.conn.commit()
+        logger.info(f"Result cache invalidated for corpus version {version}")
+
+    def clear(self):
+        """Drop every cached result"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self.conn is not None:
+                self.conn.execute("DELETE FROM results")
+                self.conn.commit()
+
+    def _remember(self, key: bytes, entry: Tuple[float, bytes]):
+        self._drop(key)
+        self._entries[key] = entry
+        self._bytes += len(entry[1])
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.stats['evictions'] += 1
+
+    def _drop(self, key: bytes):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def _load_shared(self, key: bytes, now: float) -> Optional[Tuple[float, bytes]]:
+        row = self.conn.execute(
+            "SELECT expires, value FROM results WHERE key = ? AND expires > ?", (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        self.conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (now, key))
+        self.conn.commit()
+        return row[0], row[1]
+
+    def _store_shared(self, key: bytes, expires: float, value: bytes):
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO results (key, version, value, size, expires, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, self.version, value, len(value), expires, now)
+        )
+        self.conn.execute("DELETE FROM results WHERE expires <= ?", (now,))
+        # Keep the most recently used rows that fit in the byte budget
+        self.conn.execute(
+            "DELETE FROM results WHERE key IN (SELECT key FROM "
+            "(SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS running FROM results) "
+            "WHERE running > ?)",
+            (self.max_bytes,)
+        )
+        self.conn.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters, size and hit rate"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        stats['max_bytes'] = self.max_bytes
+        stats['ttl'] = self.ttl
+        stats['shared'] = self.path is not None
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        stats['corpus_version'] = self.version
+        return stats
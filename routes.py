@@ -1,18 +1,27 @@
 import logging
 import json
-from flask import render_template, request, jsonify, flash, redirect, url_for
+import os
+from datetime import datetime, timedelta
+from flask import render_template, request, jsonify, flash, redirect, url_for, Response, stream_with_context
 from app import app, db
 from models import QueryHistory
 from rag_pipeline import rag_pipeline
+from history_writer import history_writer
+from history_stats import history_rollups, BUCKETS
 from data_processor import initialize_data
+from instrumentation import metrics
+from metadata_filter import SearchFilter, FILTER_FIELDS
 
 logger = logging.getLogger(__name__)
 
+MAX_BATCH_QUERIES = int(os.environ.get("ASK_BATCH_MAX_QUERIES", 50))
+HISTORY_PAGE_SIZE = 20
+
 @app.route('/')
 def index():
     """Main page with query interface"""
-    # Initialize RAG pipeline if needed
-    if not rag_pipeline.is_initialized:
+    # Initialize RAG pipeline if needed (a running warm-up finishes on its own)
+    if not rag_pipeline.is_initialized and not rag_pipeline.warming_up:
         try:
             rag_pipeline.initialize()
         except Exception as e:
@@ -20,7 +29,7 @@ def index():
             flash('System initialization failed. Please check configuration.', 'error')
     
     # Get recent queries for display
-    recent_queries = db.session.query(QueryHistory).order_by(QueryHistory.timestamp.desc()).limit(5).all()
+    recent_queries = history_writer.recent(5)
     
     # Get system status
     status = rag_pipeline.get_system_status()
@@ -43,21 +52,20 @@ def ask_question():
         result = rag_pipeline.answer_question(query)
         
         # Store query in history
-        query_history = QueryHistory(
+        history_writer.record(
             query=result['query'],
             response=result['answer'],
             retrieved_docs=json.dumps([doc['metadata'] for doc in result['retrieved_docs']]),
-            response_time=result['response_time']
+            response_time=result['response_time'],
+            ttfb=result['response_time']
         )
-        db.session.add(query_history)
-        db.session.commit()
         
         return render_template('index.html',
                              query=result['query'],
                              answer=result['answer'],
                              retrieved_docs=result['retrieved_docs'],
                              response_time=result['response_time'],
-                             recent_queries=db.session.query(QueryHistory).order_by(QueryHistory.timestamp.desc()).limit(5).all(),
+                             recent_queries=history_writer.recent(5),
                              system_status=rag_pipeline.get_system_status())
     
     except Exception as e:
@@ -76,19 +84,22 @@ def api_ask_question():
     query = data['query'].strip()
     if not query:
         return jsonify({'error': 'Query cannot be empty'}), 400
+    try:
+        search_filter = SearchFilter.from_dict(data.get('filters'))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filters: {e}'}), 400
     
     try:
-        result = rag_pipeline.answer_question(query)
+        result = rag_pipeline.answer_question(query, search_filter=search_filter)
         
         # Store in history
-        query_history = QueryHistory(
+        history_writer.record(
             query=result['query'],
             response=result['answer'],
             retrieved_docs=json.dumps([doc['metadata'] for doc in result['retrieved_docs']]),
-            response_time=result['response_time']
+            response_time=result['response_time'],
+            ttfb=result['response_time']
         )
-        db.session.add(query_history)
-        db.session.commit()
         
         return jsonify(result)
     
@@ -96,28 +107,198 @@ def api_ask_question():
         logger.error(f"API error processing query: {e}")
         return jsonify({'error': str(e)}), 500
 
+def _sse(event: str, data) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/ask/stream')
+def api_ask_stream():
+    """Stream an answer as Server-Sent Events: retrieved documents first, then answer sections"""
+    query = request.args.get('query', '').strip()
+    if not query:
+        return jsonify({'error': 'Query cannot be empty'}), 400
+    try:
+        top_k = int(request.args.get('top_k', 5))
+    except ValueError:
+        top_k = None
+    if top_k is None or not 1 <= top_k <= 50:
+        return jsonify({'error': 'top_k must be an integer between 1 and 50'}), 400
+    # Filters come as repeatable query parameters named like the fields of the JSON 'filters' object
+    filters = {field: values if len(values) > 1 else values[0]
+               for field, values in ((field, request.args.getlist(field)) for field in FILTER_FIELDS) if values}
+    try:
+        search_filter = SearchFilter.from_dict(filters)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filters: {e}'}), 400
+    
+    def generate():
+        retrieved, answer_parts = [], []
+        try:
+            for event, data in rag_pipeline.generate_response_stream(query, top_k=top_k, search_filter=search_filter):
+                if event == 'docs':
+                    retrieved = [doc['metadata'] for doc in data['retrieved_docs']]
+                elif event == 'token':
+                    answer_parts.append(data['text'])
+                elif event == 'done':
+                    # Store in history, with time to first byte and total time kept apart
+                    history_writer.record(
+                        query=query,
+                        response="".join(answer_parts),
+                        retrieved_docs=json.dumps(retrieved),
+                        response_time=data['response_time'],
+                        ttfb=data['ttfb']
+                    )
+                yield _sse(event, data)
+        except Exception as e:
+            logger.error(f"Error streaming answer: {e}")
+            yield _sse('error', {'error': str(e)})
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/ask/batch', methods=['POST'])
+def api_ask_batch():
+    """API endpoint for answering many questions in one request"""
+    data = request.get_json(silent=True)
+    
+    if not data or not isinstance(data.get('queries'), list):
+        return jsonify({'error': 'A list of queries is required'}), 400
+    
+    queries = [query.strip() if isinstance(query, str) else query for query in data['queries']]
+    if len(queries) > MAX_BATCH_QUERIES:
+        return jsonify({'error': f'At most {MAX_BATCH_QUERIES} queries per batch'}), 400
+    top_k = data.get('top_k', 5)
+    if not isinstance(top_k, int) or isinstance(top_k, bool) or not 1 <= top_k <= 50:
+        return jsonify({'error': 'top_k must be an integer between 1 and 50'}), 400
+    try:
+        search_filter = SearchFilter.from_dict(data.get('filters'))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filters: {e}'}), 400
+    
+    try:
+        results = rag_pipeline.answer_many(queries, top_k=top_k, search_filter=search_filter)
+        
+        # Store the answered queries in history
+        for result in results:
+            if 'error' not in result:
+                history_writer.record(
+                    query=result['query'],
+                    response=result['answer'],
+                    retrieved_docs=json.dumps([doc['metadata'] for doc in result['retrieved_docs']]),
+                    response_time=result['response_time'],
+                    ttfb=result['response_time']
+                )
+        
+        return jsonify({
+            'results': results,
+            'count': len(results),
+            'errors': sum(1 for result in results if 'error' in result)
+        })
+    
+    except Exception as e:
+        logger.error(f"API error processing query batch: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/status')
 def system_status():
     """System status page"""
     status = rag_pipeline.get_system_status()
     return render_template('status.html', status=status)
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Stage and request latency histograms plus component counters, in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def _component_samples():
+    """Gauges read from the pipeline's own counters when /metrics is scraped"""
+    cache = rag_pipeline.result_cache.get_stats()
+    for key in ('hits', 'misses', 'evictions', 'expired', 'entries', 'bytes'):
+        yield f'rag_result_cache_{key}', {}, cache[key]
+    history = history_writer.get_stats()
+    for key in ('queued', 'written', 'errors', 'pending'):
+        yield f'rag_history_{key}', {}, history[key]
+    search = rag_pipeline.search_engine.get_stats()
+    yield 'rag_index_documents', {'index': 'keyword'}, search['total_documents']
+    yield 'rag_index_tombstones', {'index': 'keyword'}, search['tombstones']
+    yield 'rag_ready', {}, 1 if rag_pipeline.is_initialized else 0
+    if rag_pipeline.generator is not None:
+        generation = rag_pipeline.generator.get_stats()
+        for key in ('requests', 'completions', 'coalesced', 'timeouts', 'errors', 'in_flight'):
+            yield f'rag_llm_{key}', {}, generation[key]
+
+metrics.register_collector(_component_samples)
+
+@app.route('/ready')
+def readiness():
+    """Readiness probe: 200 once the index is loaded, 503 while warming up or uninitialized"""
+    ready = rag_pipeline.is_initialized
+    body = {
+        'ready': ready,
+        'warming_up': rag_pipeline.warming_up,
+        'snapshot': rag_pipeline.snapshot_version
+    }
+    if rag_pipeline.warmup_error:
+        body['error'] = rag_pipeline.warmup_error
+    return jsonify(body), 200 if ready else 503
+
 @app.route('/history')
 def query_history():
     """Query history page"""
-    page = request.args.get('page', 1, type=int)
-    queries = db.session.query(QueryHistory).order_by(QueryHistory.timestamp.desc()).limit(20).offset((page-1)*20).all()
-    return render_template('history.html', queries=queries)
+    # Make queued history rows visible before reading the table
+    history_writer.flush()
+    # Keyset pagination: ?before=<timestamp>_<id> continues after the last row shown,
+    # so deep pages cost the same as the first one
+    query = db.session.query(QueryHistory)
+    cursor = _parse_history_cursor(request.args.get('before'))
+    if cursor:
+        timestamp, query_id = cursor
+        query = query.filter(db.or_(QueryHistory.timestamp < timestamp,
+                                    db.and_(QueryHistory.timestamp == timestamp, QueryHistory.id < query_id)))
+    queries = query.order_by(QueryHistory.timestamp.desc(), QueryHistory.id.desc()).limit(HISTORY_PAGE_SIZE + 1).all()
+    next_cursor = None
+    if len(queries) > HISTORY_PAGE_SIZE:
+        queries = queries[:HISTORY_PAGE_SIZE]
+        next_cursor = f"{queries[-1].timestamp.isoformat()}_{queries[-1].id}"
+    return render_template('history.html', queries=queries, next_cursor=next_cursor, paged=cursor is not None)
+
+def _parse_history_cursor(value):
+    """(timestamp, id) from a history page cursor, or None if missing or malformed"""
+    if not value:
+        return None
+    try:
+        timestamp, query_id = value.rsplit('_', 1)
+        return datetime.fromisoformat(timestamp), int(query_id)
+    except ValueError:
+        return None
+
+@app.route('/api/history/stats')
+def api_history_stats():
+    """Query volume and response time percentiles per hour or day, read from the rollups"""
+    try:
+        bucket = request.args.get('bucket', 'hour')
+        if bucket not in BUCKETS:
+            return jsonify({'error': f"bucket must be one of {', '.join(BUCKETS)}"}), 400
+        until = datetime.fromisoformat(request.args['until']) if request.args.get('until') else datetime.utcnow()
+        since = datetime.fromisoformat(request.args['since']) if request.args.get('since') \
+            else until - timedelta(days=1)
+        history_writer.flush()
+        return jsonify(history_rollups.stats(since, until, bucket))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid date: {e}'}), 400
+    except Exception as e:
+        logger.error(f"Error computing history stats: {e}")
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/initialize', methods=['POST'])
 def initialize_system():
-    """Initialize or reinitialize the system"""
+    """Initialize the system, or incrementally apply publication changes once initialized"""
     try:
-        # Initialize data
+        # Load new and changed publications (flagged processed=False)
         initialize_data()
         
-        # Reinitialize RAG pipeline
-        rag_pipeline.initialize()
+        # Index only what changed instead of rebuilding everything
+        rag_pipeline.refresh()
         
         flash('System initialized successfully!', 'success')
     except Exception as e:
@@ -131,7 +312,7 @@ def initialize_system_startup():
     """Initialize system on startup"""
     try:
         initialize_data()
-        rag_pipeline.initialize()
+        rag_pipeline.refresh()
         logger.info("System initialized successfully on startup")
     except Exception as e:
         logger.error(f"Error during startup initialization: {e}")
@@ -0,0 +1,549 @@
+import atexit
+import hashlib
+import heapq
+import itertools
+import logging
+import os
+import pickle
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from typing import List, Dict, Any, Iterable, NamedTuple, Optional, Set
+from inverted_index import CorpusStats
+from metadata_filter import SearchFilter
+from simple_search import SimpleTextSearch, RECORD_COLUMNS, SNAPSHOT_FORMAT
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Rows sent to a shard per message while building, so no single pickle holds a whole partition
+STAGE_BATCH = 2000
+# Seconds a client keeps retrying while a freshly started shard opens its socket
+CONNECT_TIMEOUT = 30.0
+# Operations that change a shard's index; they run one at a time, searches run alongside them
+WRITE_OPERATIONS = frozenset(['stage', 'build', 'upsert', 'remove', 'compact', 'stats_delta',
+                              'apply_corpus_stats', 'load_snapshot'])
+
+
+class PublicationRow(NamedTuple):
+    """The columns a shard indexes, as sent to it over the pipe"""
+    id: str
+    title: str
+    username: str
+    license: Optional[str]
+    description: str
+    created_at: Optional[datetime]
+
+    @classmethod
+    def of(cls, pub) -> "PublicationRow":
+        return cls(pub.id, pub.title, pub.username, pub.license, pub.description, pub.created_at)
+
+
+def shard_of(pub_id: str, shards: int) -> int:
+    """Stable shard number of a publication (Python's hash() differs between processes)"""
+    return int.from_bytes(hashlib.blake2b(pub_id.encode('utf-8'), digest_size=8).digest(), 'big') % shards
+
+
+def _stats_delta(current: CorpusStats, reported: CorpusStats) -> CorpusStats:
+    """Statistics change from ``reported`` to ``current`` (document frequencies only for terms that changed)"""
+    doc_freqs = {term: df - reported.doc_freqs.get(term, 0) for term, df in current.doc_freqs.items()
+                 if df != reported.doc_freqs.get(term, 0)}
+    doc_freqs.update((term, -df) for term, df in reported.doc_freqs.items() if term not in current.doc_freqs)
+    return CorpusStats(current.num_docs - reported.num_docs, current.total_length - reported.total_length,
+                       doc_freqs)
+
+
+class _ShardWorker:
+    """The operations a shard process serves; each shard is a SimpleTextSearch over its partition
+
+    Corpus-wide statistics are kept in sync incrementally: a shard reports
+    how its local statistics changed since its last report, the coordinator
+    sums the reports of all shards and every shard adds that sum to its copy
+    of the corpus-wide statistics. Only changed terms cross the sockets.
+    """
+
+    def __init__(self):
+        self.search = SimpleTextSearch()
+        self.staged: List[PublicationRow] = []
+        self.reported = CorpusStats(0, 0, {})  # Local statistics as of the last report
+        self.snapshot_path: Optional[str] = None
+
+    def stage(self, rows: List[PublicationRow]):
+        self.staged.extend(rows)
+
+    def build(self):
+        rows, self.staged = self.staged, []
+        # Compiled once the corpus-wide statistics arrive
+        self.search.build_index(rows, compile=False)
+        self.search.is_initialized = True
+
+    def upsert(self, rows: List[PublicationRow]):
+        self.search.upsert_publications(rows)
+
+    def remove(self, pub_ids: List[str]):
+        self.search.remove_publications(pub_ids)
+
+    def compact(self, max_tombstone_ratio: float) -> bool:
+        return self.search.compact(max_tombstone_ratio)
+
+    def stats_delta(self, full: bool) -> CorpusStats:
+        """Change of the local statistics since the last report, or all of them if ``full``"""
+        current = self.search.index.local_stats()
+        delta = current if full else _stats_delta(current, self.reported)
+        self.reported = current
+        return delta
+
+    def apply_corpus_stats(self, delta: CorpusStats, full: bool):
+        """Add a summed change to the corpus-wide statistics (replace them if ``full``) and recompile"""
+        stats = self.search.index.corpus_stats
+        if full or stats is None:
+            stats = delta
+        elif delta.num_docs or delta.total_length or delta.doc_freqs:
+            doc_freqs = dict(stats.doc_freqs)
+            for term, change in delta.doc_freqs.items():
+                df = doc_freqs.get(term, 0) + change
+                if df:
+                    doc_freqs[term] = df
+                else:
+                    doc_freqs.pop(term, None)
+            stats = CorpusStats(stats.num_docs + delta.num_docs, stats.total_length + delta.total_length, doc_freqs)
+        if stats != self.search.index.corpus_stats:
+            self.search.index.set_corpus_stats(stats)
+        self.search.compile()
+
+    def search_many(self, queries: List[str], top_k: int,
+                    search_filter: Optional[SearchFilter]) -> List[List[Dict[str, Any]]]:
+        return self.search.search_many(queries, top_k, search_filter)
+
+    def matching_ids(self, search_filter: SearchFilter) -> Set[str]:
+        return self.search.matching_ids(search_filter)
+
+    def indexed_ids(self) -> Set[str]:
+        return self.search.indexed_ids()
+
+    def corpus_version(self) -> str:
+        return self.search.corpus_version
+
+    def save_snapshot(self, path: str):
+        self.search.save_snapshot(path)
+        self.snapshot_path = path
+
+    def load_snapshot(self, path: str) -> Optional[bool]:
+        """Load a shard file; None if it is the one already served (every worker asks for each new snapshot)"""
+        if path == self.snapshot_path:
+            return None
+        loaded = self.search.load_snapshot(path)
+        if loaded:
+            self.snapshot_path = path
+        return loaded
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self.search.get_stats()
+
+
+def _serve_connection(worker: _ShardWorker, conn, write_lock: threading.Lock):
+    """Answer one client process's (request id, operation, arguments) messages in order until it disconnects"""
+    while True:
+        try:
+            request_id, operation, args = conn.recv()
+        except (EOFError, OSError):
+            conn.close()
+            return
+        try:
+            if operation in WRITE_OPERATIONS:
+                with write_lock:
+                    result = getattr(worker, operation)(*args)
+            else:
+                result = getattr(worker, operation)(*args)
+            conn.send((request_id, True, result))
+        except (EOFError, OSError):
+            conn.close()
+            return
+        except Exception as e:
+            conn.send((request_id, False, f"{type(e).__name__}: {e}"))
+
+
+def _exit_with(parent_pid: int):
+    while os.getppid() == parent_pid:
+        time.sleep(1.0)
+    os._exit(0)
+
+
+def _serve_shard(address: str, authkey: bytes, parent_pid: int):
+    """Shard process main loop: serve every client process on its own connection until the parent goes away"""
+    worker = _ShardWorker()
+    write_lock = threading.Lock()
+    listener = Listener(address, family='AF_UNIX', authkey=authkey)
+    threading.Thread(target=_exit_with, args=(parent_pid,), name='parent-watch', daemon=True).start()
+    while True:
+        try:
+            conn = listener.accept()
+        except AuthenticationError:
+            continue
+        threading.Thread(target=_serve_connection, args=(worker, conn, write_lock), daemon=True).start()
+
+
+def _start_shard(address: str, authkey: bytes) -> int:
+    """Fork a shard process and return its pid
+
+    A plain fork rather than multiprocessing.Process: forked gunicorn workers
+    inherit multiprocessing's child list and would terminate the shards when
+    they exit. The child drops the signal handlers it inherited (gunicorn's
+    arbiter installs some) and never runs the parent's atexit hooks.
+    """
+    parent_pid = os.getpid()
+    pid = os.fork()
+    if pid:
+        return pid
+    try:
+        signal.set_wakeup_fd(-1)
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGQUIT, signal.SIGCHLD,
+                       signal.SIGUSR1, signal.SIGUSR2, signal.SIGTTIN, signal.SIGTTOU, signal.SIGWINCH):
+            signal.signal(signum, signal.SIG_DFL)
+        _serve_shard(address, authkey, parent_pid)
+    except BaseException as e:
+        logger.error(f"Search shard at {address} stopped: {e}")
+    finally:
+        os._exit(0)
+
+
+def _connect(address: str, authkey: bytes):
+    """Connection to a shard's socket, waiting for a shard that is still starting to listen"""
+    deadline = time.monotonic() + CONNECT_TIMEOUT
+    while True:
+        try:
+            return Client(address, family='AF_UNIX', authkey=authkey)
+        except (FileNotFoundError, ConnectionRefusedError):
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+class ShardError(RuntimeError):
+    """An operation failed inside a shard process"""
+
+
+class _ShardClient:
+    """This process's connection to one shard; calls return futures so several threads can wait on the same shard"""
+
+    def __init__(self, shard_no: int, address: str, authkey: bytes):
+        self.shard_no = shard_no
+        self.conn = _connect(address, authkey)
+        self._ids = itertools.count()
+        self._pending: Dict[int, Future] = {}
+        self._send_lock = threading.Lock()
+        self._receiver = threading.Thread(target=self._receive, name=f'search-shard-{shard_no}-receiver',
+                                          daemon=True)
+        self._receiver.start()
+
+    def call(self, operation: str, *args) -> Future:
+        future = Future()
+        with self._send_lock:
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            try:
+                self.conn.send((request_id, operation, args))
+            except Exception as e:
+                self._pending.pop(request_id, None)
+                future.set_exception(ShardError(f"shard {self.shard_no} unreachable: {e}"))
+        return future
+
+    def _receive(self):
+        while True:
+            try:
+                request_id, ok, value = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            future = self._pending.pop(request_id, None)
+            if future is None:
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(ShardError(f"shard {self.shard_no}: {value}"))
+        for future in list(self._pending.values()):
+            future.set_exception(ShardError(f"shard {self.shard_no} exited"))
+        self._pending.clear()
+
+    def close(self):
+        """Disconnect; the shard keeps serving other processes"""
+        try:
+            # Wake the receiver thread, which closing the descriptor alone would leave blocked
+            with socket.socket(fileno=os.dup(self.conn.fileno())) as sock:
+                sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._receiver.join(timeout=5)
+        self.conn.close()
+
+
+class ShardedSearch:
+    """BM25 keyword search partitioned by publication ID hash across shard processes
+
+    Every shard is a process holding a SimpleTextSearch over its partition.
+    Queries are scattered to all shards over pipes, each returns its own top_k
+    and the per-shard lists are merged with a heap. Shards score with the
+    corpus-wide BM25 statistics (kept in sync by ``compile``), so merged
+    scores equal an unsharded index's.
+
+    The shards are forked once, by ``start`` while the app is imported and
+    the process is still single-threaded; under gunicorn that is the master,
+    before it forks the workers. Each shard listens on a Unix socket, and
+    every process, the forked workers included, connects to the same shards.
+    So the corpus is held once however many workers there are, and workers
+    never fork. Writes from any worker are seen by all of them.
+    """
+
+    def __init__(self, shards: int = None):
+        self.num_shards = shards or int(os.environ.get("SEARCH_SHARDS") or 0) or os.cpu_count() or 1
+        self.shards: List[_ShardClient] = []
+        self.is_initialized = False
+        self.addresses: List[str] = []
+        self._authkey = os.urandom(32)
+        self._pids: List[int] = []
+        self._server_pid: Optional[int] = None  # Process that started (and stops) the shards
+        self._socket_dir: Optional[str] = None
+        self._owner_pid: Optional[int] = None  # Process the connections in self.shards belong to
+        self._snapshot_path: Optional[str] = None
+        self._lock = threading.RLock()
+
+    def start(self):
+        """Fork the shard processes; a no-op if they are already running
+
+        Call it while this process is still single-threaded. A fork copies
+        only the calling thread, so a lock (logging, a connection's) held by
+        another thread at that moment would stay locked forever in the shard.
+        The pipeline starts the shards while the app is imported, before any
+        server, warm-up, history or snapshot thread exists.
+        """
+        with self._lock:
+            if self.addresses:
+                return
+            if threading.active_count() > 1:
+                raise RuntimeError("Search shards must be started before any other thread, "
+                                   "i.e. while the app is imported")
+            self._socket_dir = tempfile.mkdtemp(prefix='search-shards-')
+            self.addresses = [os.path.join(self._socket_dir, f'shard{shard_no}.sock')
+                              for shard_no in range(self.num_shards)]
+            self._pids = [_start_shard(address, self._authkey) for address in self.addresses]
+            self._server_pid = os.getpid()
+            atexit.register(self.close)
+
+    def _clients(self) -> List[_ShardClient]:
+        """This process's connections to the shards, opened on first use"""
+        if self._owner_pid == os.getpid():
+            return self.shards
+        with self._lock:
+            if self._owner_pid != os.getpid():
+                if not self.addresses:
+                    raise ShardError("search shards are not running; call start() first")
+                # Connections inherited from the parent belong to it and are left alone
+                self.shards = [_ShardClient(shard_no, address, self._authkey)
+                               for shard_no, address in enumerate(self.addresses)]
+                self._owner_pid = os.getpid()
+        return self.shards
+
+    def _broadcast(self, operation: str, *args) -> List[Any]:
+        futures = [shard.call(operation, *args) for shard in self._clients()]
+        return [future.result() for future in futures]
+
+    def _scatter(self, operation: str, per_shard: List[Any]) -> List[Any]:
+        """Call operation on every shard that has a non-empty argument"""
+        futures = [shard.call(operation, argument) for shard, argument in zip(self._clients(), per_shard) if argument]
+        return [future.result() for future in futures]
+
+    def _partition(self, publications: Iterable) -> List[List[PublicationRow]]:
+        partitions: List[List[PublicationRow]] = [[] for _ in range(self.num_shards)]
+        for pub in publications:
+            partitions[shard_of(pub.id, self.num_shards)].append(PublicationRow.of(pub))
+        return partitions
+
+    def initialize(self):
+        """Initialize with publications from database"""
+        try:
+            self.build_index(db.session.query(*RECORD_COLUMNS).yield_per(STAGE_BATCH))
+            self.is_initialized = True
+            logger.info(f"Initialized sharded search with {self.get_stats()['total_documents']} publications "
+                        f"in {self.num_shards} shards")
+        except Exception as e:
+            logger.error(f"Error initializing sharded search: {e}")
+            self.is_initialized = False
+
+    def build_index(self, publications: Iterable):
+        """Stream publications to their shards, then build every shard's index"""
+        clients = self._clients()
+        with self._lock:
+            batches: List[List[PublicationRow]] = [[] for _ in clients]
+            pending: List[Future] = []
+            for pub in publications:
+                shard_no = shard_of(pub.id, self.num_shards)
+                batches[shard_no].append(PublicationRow.of(pub))
+                if len(batches[shard_no]) >= STAGE_BATCH:
+                    pending.append(clients[shard_no].call('stage', batches[shard_no]))
+                    batches[shard_no] = []
+            pending.extend(shard.call('stage', batch) for shard, batch in zip(clients, batches))
+            for future in pending:
+                future.result()
+            self._broadcast('build')
+            self._sync_corpus_stats(full=True)
+
+    def upsert_publications(self, publications: Iterable):
+        """Index new or changed publications in their shards (statistics are shared again by ``compile``)"""
+        self._scatter('upsert', self._partition(publications))
+
+    def remove_publications(self, pub_ids: Iterable[str]):
+        partitions: List[List[str]] = [[] for _ in range(self.num_shards)]
+        for pub_id in pub_ids:
+            partitions[shard_of(pub_id, self.num_shards)].append(pub_id)
+        self._scatter('remove', partitions)
+
+    def compact(self, max_tombstone_ratio: float = 0.2) -> bool:
+        return any(self._broadcast('compact', max_tombstone_ratio))
+
+    def compile(self):
+        """Share the changes of the corpus-wide statistics with every shard and rebuild their scoring matrices"""
+        with self._lock:
+            self._sync_corpus_stats()
+
+    def _sync_corpus_stats(self, full: bool = False):
+        """Sum the shards' statistics changes (or full statistics) and apply the sum on every shard
+
+        Each report is consumed by the one call that gathered it, so changes
+        made through different workers are each applied exactly once.
+        """
+        num_docs, total_length, doc_freqs = 0, 0, {}
+        for stats in self._broadcast('stats_delta', full):
+            num_docs += stats.num_docs
+            total_length += stats.total_length
+            for term, df in stats.doc_freqs.items():
+                doc_freqs[term] = doc_freqs.get(term, 0) + df
+        if not full:
+            doc_freqs = {term: change for term, change in doc_freqs.items() if change}
+        self._broadcast('apply_corpus_stats', CorpusStats(num_docs, total_length, doc_freqs), full)
+
+    def save_snapshot(self, path: str):
+        """Each shard pickles its own index next to path; path itself names the shard files"""
+        with self._lock:
+            self._broadcast_paths('save_snapshot', path)
+            temporary = f"{path}.tmp-{os.getpid()}"
+            with open(temporary, 'wb') as f:
+                pickle.dump({'format': SNAPSHOT_FORMAT, 'backend': 'sharded', 'shards': self.num_shards}, f)
+            os.replace(temporary, path)
+            self._snapshot_path = path
+
+    def load_snapshot(self, path: str) -> bool:
+        """Load the shard files written by ``save_snapshot`` into the shard processes"""
+        try:
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+        except Exception as e:
+            logger.error(f"Error loading keyword index snapshot {path}: {e}")
+            return False
+        if state.get('format') != SNAPSHOT_FORMAT or state.get('backend') != 'sharded' \
+                or state.get('shards') != self.num_shards:
+            logger.warning(f"Keyword index snapshot {path} has another format, backend or shard count, "
+                           f"rebuilding instead")
+            return False
+        with self._lock:
+            loaded = self._broadcast_paths('load_snapshot', path)
+            if False in loaded:
+                return False
+            # Another worker may already have loaded this snapshot into the shared shards
+            if any(loaded):
+                self._sync_corpus_stats(full=True)
+                logger.info(f"Loaded sharded keyword index snapshot into {self.num_shards} shards")
+            self._snapshot_path = path
+            self.is_initialized = True
+        return True
+
+    def _broadcast_paths(self, operation: str, path: str) -> List[Any]:
+        futures = [shard.call(operation, f"{path}.shard{shard.shard_no}") for shard in self._clients()]
+        return [future.result() for future in futures]
+
+    @property
+    def corpus_version(self) -> str:
+        """Same fingerprint as an unsharded index of the same publications (count and XOR combine per shard)"""
+        count, fingerprint = 0, 0
+        for version in self._broadcast('corpus_version'):
+            shard_count, shard_fingerprint = version.split('-')
+            count += int(shard_count)
+            fingerprint ^= int(shard_fingerprint, 16)
+        return f"{count}-{fingerprint:016x}"
+
+    def indexed_ids(self) -> Set[str]:
+        return set().union(*self._broadcast('indexed_ids'))
+
+    def matching_ids(self, search_filter: SearchFilter) -> Set[str]:
+        """IDs of the searchable publications the filter allows, from every shard's filter index"""
+        return set().union(*self._broadcast('matching_ids', search_filter))
+
+    def search(self, query: str, top_k: int = 5, search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """Keyword search across all shards"""
+        return self.search_many([query], top_k=top_k, search_filter=search_filter)[0]
+
+    def search_many(self, queries: List[str], top_k: int = 5,
+                    search_filter: Optional[SearchFilter] = None) -> List[List[Dict[str, Any]]]:
+        """Scatter the queries (and filter) to every shard and merge each query's per-shard top_k"""
+        if not self.is_initialized:
+            return [[] for _ in queries]
+        try:
+            per_shard = self._broadcast('search_many', queries, top_k, search_filter)
+        except ShardError as e:
+            logger.error(f"Sharded search failed: {e}")
+            return [[] for _ in queries]
+        all_results = []
+        for shard_results in zip(*per_shard):
+            # Ties are broken by publication ID since positions are per shard
+            merged = heapq.nsmallest(top_k, itertools.chain.from_iterable(shard_results),
+                                     key=lambda result: (-result['score'], result['id']))
+            for rank, result in enumerate(merged, start=1):
+                result['rank'] = rank
+            all_results.append(merged)
+        return all_results
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get search statistics"""
+        shard_stats = self._broadcast('get_stats')
+        return {
+            'total_documents': sum(stats['total_documents'] for stats in shard_stats),
+            'search_method': f'BM25 Inverted Index ({self.num_shards} shards)',
+            'index_terms': max((stats['index_terms'] for stats in shard_stats), default=0),
+            'tombstones': sum(stats['tombstones'] for stats in shard_stats),
+            'scoring': shard_stats[0]['scoring'] if shard_stats else 'postings',
+            'shards': [stats['total_documents'] for stats in shard_stats],
+            'initialized': self.is_initialized
+        }
+
+    def disconnect(self):
+        """Close this process's connections, e.g. in the gunicorn master before it forks workers"""
+        with self._lock:
+            if self._owner_pid == os.getpid():
+                for shard in self.shards:
+                    shard.close()
+            self.shards = []
+            self._owner_pid = None
+
+    def close(self):
+        """Disconnect, and stop the shard processes if this process started them"""
+        with self._lock:
+            self.disconnect()
+            if self._server_pid == os.getpid():
+                for pid in self._pids:
+                    try:
+                        os.kill(pid, signal.SIGTERM)
+                        os.waitpid(pid, 0)
+                    except (ProcessLookupError, ChildProcessError):
+                        pass
+                shutil.rmtree(self._socket_dir, ignore_errors=True)
+                self.addresses, self._pids, self._server_pid = [], [], None
+            self.is_initialized = False
+
+# Global sharded search instance
+sharded_search = ShardedSearch()
@@ -1,74 +1,280 @@
+import hashlib
 import logging
-import re
-from typing import List, Dict, Any
+import os
+import pickle
+import sys
+import threading
+from typing import List, Dict, Any, Iterable, Optional, Set, Tuple
+from inverted_index import InvertedIndex
+from metadata_filter import FilterIndex, SearchFilter
 from models import Publication
 from app import db
 
 logger = logging.getLogger(__name__)
 
+# 'matrix' scores queries with the vectorized NumPy BM25 matrix, 'postings' walks the posting lists in Python
+KEYWORD_SCORING = os.environ.get("KEYWORD_SCORING", "matrix").lower()
+# Bumped whenever the pickled snapshot layout changes; other formats are rebuilt from the database
+SNAPSHOT_FORMAT = 4
+EXCERPT_CHARS = 1000
+# The only columns search reads; loading them directly skips building ORM instances
+RECORD_COLUMNS = (Publication.id, Publication.title, Publication.username, Publication.license,
+                  Publication.description, Publication.created_at)
+
+
+class PublicationRecord:
+    """Search-side copy of a publication, independent of any database session and never modified
+
+    Only what results show is kept: the full description is indexed and then
+    dropped in favour of the preformatted result text. Usernames and licenses
+    repeat across publications and are interned.
+    """
+    __slots__ = ('id', 'title', 'username', 'license', 'text')
+    
+    def __init__(self, id: str, title: str, username: str, license: str, text: str):
+        self.id = id
+        self.title = title
+        self.username = username
+        self.license = license
+        self.text = text
+    
+    @classmethod
+    def of(cls, pub) -> "PublicationRecord":
+        """Record for a Publication, a column-projected row or anything with the same attributes"""
+        username = sys.intern(pub.username)
+        return cls(pub.id, pub.title, username, sys.intern(pub.license or ''),
+                   f"Title: {pub.title}\n\nAuthor: {username}\n\nDescription: {pub.description[:EXCERPT_CHARS]}...")
+    
+    def __reduce__(self):
+        return PublicationRecord, (self.id, self.title, self.username, self.license, self.text)
+
+
+def search_results(hits: List[Tuple[PublicationRecord, float]]) -> List[Dict[str, Any]]:
+    """Result dicts for ranked (record, score) pairs"""
+    return [{
+        'id': record.id,
+        'text': record.text,
+        'score': score,
+        'rank': rank,
+        'metadata': {
+            'title': record.title,
+            'username': record.username,
+            'license': record.license,
+            'pub_id': record.id
+        }
+    } for rank, (record, score) in enumerate(hits, start=1)]
+
+
+def publication_fingerprint(pub: Publication) -> int:
+    """64-bit hash of the publication fields that affect search results"""
+    content = f"{pub.id}\0{pub.title}\0{pub.username}\0{pub.license}\0{pub.description}"
+    return int.from_bytes(hashlib.blake2b(content.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
 class SimpleTextSearch:
     """Simple text-based search without embeddings for initial functionality"""
     
     def __init__(self):
-        self.publications = []
+        self.publications: List[Optional[PublicationRecord]] = []  # None where a publication was removed
+        self.positions: Dict[str, int] = {}  # Publication ID -> position in the index
+        self.index = InvertedIndex()
+        self.filters = FilterIndex()  # Metadata of every position, for filtered searches
         self.is_initialized = False
+        self._lock = threading.RLock()
+        # XOR of the indexed publications' fingerprints: order-independent and updatable per publication
+        self._fingerprints: Dict[str, int] = {}
+        self._corpus_fingerprint = 0
     
     def initialize(self):
         """Initialize with publications from database"""
         try:
-            self.publications = db.session.query(Publication).all()
+            # One column-projected query, streamed so full descriptions are never all held at once
+            rows = db.session.query(*RECORD_COLUMNS).yield_per(2000)
+            self.build_index(rows)
             self.is_initialized = True
-            logger.info(f"Initialized simple search with {len(self.publications)} publications")
+            logger.info(f"Initialized simple search with {len(self.positions)} publications")
         except Exception as e:
             logger.error(f"Error initializing simple search: {e}")
             self.is_initialized = False
     
-    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Simple text-based search using keyword matching"""
+    def build_index(self, publications: Iterable[Publication], compile: bool = True):
+        """Build the inverted index and publication records in one pass over the publications
+
+        ``compile=False`` leaves packing the scoring matrix to a later ``compile`` call.
+        """
+        index = InvertedIndex()
+        filters = FilterIndex()
+        records = []
+        fingerprints = {}
+        for pub in publications:
+            index.add_document(f"{pub.title} {pub.description}")
+            record = PublicationRecord.of(pub)
+            records.append(record)
+            filters.add(record.username, record.license, pub.created_at)
+            fingerprints[pub.id] = publication_fingerprint(pub)
+        if compile:
+            self._compile(index)
+        corpus_fingerprint = 0
+        for fingerprint in fingerprints.values():
+            corpus_fingerprint ^= fingerprint
+        with self._lock:
+            self.publications = records
+            self.positions = {record.id: i for i, record in enumerate(records)}
+            self.index = index
+            self.filters = filters
+            self._fingerprints = fingerprints
+            self._corpus_fingerprint = corpus_fingerprint
+    
+    def upsert_publications(self, publications: Iterable[Publication]):
+        """Index new or changed publications, tombstoning any previous version
+
+        Changes drop the scoring matrix; searches walk the postings until ``compile`` is called.
+        """
+        with self._lock:
+            for pub in publications:
+                previous = self.positions.get(pub.id)
+                if previous is not None:
+                    self.index.remove_document(previous)
+                    self.publications[previous] = None
+                self.positions[pub.id] = self.index.add_document(f"{pub.title} {pub.description}")
+                record = PublicationRecord.of(pub)
+                self.publications.append(record)
+                self.filters.add(record.username, record.license, pub.created_at)
+                fingerprint = publication_fingerprint(pub)
+                self._corpus_fingerprint ^= self._fingerprints.get(pub.id, 0) ^ fingerprint
+                self._fingerprints[pub.id] = fingerprint
+    
+    def remove_publications(self, pub_ids: Iterable[str]):
+        """Tombstone publications that no longer exist"""
+        with self._lock:
+            for pub_id in pub_ids:
+                position = self.positions.pop(pub_id, None)
+                if position is not None:
+                    self.index.remove_document(position)
+                    self.publications[position] = None
+                    self._corpus_fingerprint ^= self._fingerprints.pop(pub_id, 0)
+    
+    def compact(self, max_tombstone_ratio: float = 0.2) -> bool:
+        """Rebuild the postings without tombstones once they exceed the given share of the index"""
+        with self._lock:
+            if not self.index.deleted or len(self.index.deleted) <= max_tombstone_ratio * len(self.index.doc_lengths):
+                return False
+            removed = len(self.index.deleted)
+            self.index, keep = self.index.compacted()
+            self.publications = [self.publications[position] for position in keep]
+            self.filters = self.filters.compacted(keep, self.publications)
+            self.positions = {pub.id: i for i, pub in enumerate(self.publications)}
+        logger.info(f"Compacted keyword index, dropped {removed} tombstoned documents")
+        return True
+    
+    def compile(self):
+        """Rebuild the vectorized scoring matrix after upserts, removals or compaction"""
+        with self._lock:
+            self._compile(self.index)
+    
+    def save_snapshot(self, path: str):
+        """Pickle the index and publication records to path (written to a temporary file, then renamed)"""
+        with self._lock:
+            state = {
+                'format': SNAPSHOT_FORMAT,
+                'backend': 'memory',
+                'publications': self.publications,
+                'index': self.index,
+                'filters': self.filters,
+                'fingerprints': self._fingerprints
+            }
+            temporary = f"{path}.tmp-{os.getpid()}"
+            with open(temporary, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+    
+    def load_snapshot(self, path: str) -> bool:
+        """Replace the served index with one saved by ``save_snapshot``; searches switch over atomically"""
+        try:
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+        except Exception as e:
+            logger.error(f"Error loading keyword index snapshot {path}: {e}")
+            return False
+        if state.get('format') != SNAPSHOT_FORMAT or state.get('backend') != 'memory':
+            logger.warning(f"Keyword index snapshot {path} has another format or backend, rebuilding instead")
+            return False
+        publications = state['publications']
+        self._compile(state['index'])
+        corpus_fingerprint = 0
+        for fingerprint in state['fingerprints'].values():
+            corpus_fingerprint ^= fingerprint
+        with self._lock:
+            self.publications = publications
+            self.positions = {pub.id: i for i, pub in enumerate(publications) if pub is not None}
+            self.index = state['index']
+            self.filters = state['filters']
+            self._fingerprints = state['fingerprints']
+            self._corpus_fingerprint = corpus_fingerprint
+            self.is_initialized = True
+        logger.info(f"Loaded keyword index snapshot with {len(self.positions)} publications")
+        return True
+    
+    @staticmethod
+    def _compile(index: InvertedIndex):
+        """Pack the index into its vectorized scoring matrix unless already compiled or disabled"""
+        if KEYWORD_SCORING != 'matrix' or index.compiled:
+            return
+        try:
+            index.compile()
+        except Exception as e:
+            logger.error(f"Error compiling keyword scoring matrix, walking postings instead: {e}")
+    
+    @property
+    def corpus_version(self) -> str:
+        """Fingerprint of the indexed corpus; changes whenever a publication is added, changed or removed"""
+        with self._lock:
+            return f"{len(self._fingerprints)}-{self._corpus_fingerprint:016x}"
+    
+    def indexed_ids(self) -> Set[str]:
+        """IDs of the publications currently searchable"""
+        with self._lock:
+            return set(self.positions)
+    
+    def matching_ids(self, search_filter: SearchFilter) -> Set[str]:
+        """IDs of the searchable publications the filter allows"""
+        with self._lock:
+            publications = self.publications
+            selected = self.filters.select(search_filter, self.positions).tolist()
+            return {publications[position].id for position in selected if publications[position] is not None}
+    
+    def search(self, query: str, top_k: int = 5, search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """Keyword search ranked by BM25 over the inverted index"""
+        return self.search_many([query], top_k=top_k, search_filter=search_filter)[0]
+    
+    def search_many(self, queries: List[str], top_k: int = 5,
+                    search_filter: Optional[SearchFilter] = None) -> List[List[Dict[str, Any]]]:
+        """Keyword search for several queries in one pass over the index
+
+        A ``search_filter`` is resolved to candidate positions first, and
+        only those documents are scored.
+        """
         if not self.is_initialized:
-            return []
-        
-        query_words = query.lower().split()
-        scored_docs = []
-        
-        for pub in self.publications:
-            # Create searchable text
-            searchable_text = f"{pub.title} {pub.description}".lower()
-            
-            # Calculate simple relevance score
-            score = 0
-            for word in query_words:
-                if len(word) > 2:  # Ignore very short words
-                    score += searchable_text.count(word)
-            
-            if score > 0:
-                scored_docs.append({
-                    'id': pub.id,
-                    'text': f"Title: {pub.title}\n\nAuthor: {pub.username}\n\nDescription: {pub.description[:1000]}...",
-                    'score': score,
-                    'metadata': {
-                        'title': pub.title,
-                        'username': pub.username,
-                        'license': pub.license or '',
-                        'pub_id': pub.id
-                    }
-                })
-        
-        # Sort by relevance score
-        scored_docs.sort(key=lambda x: x['score'], reverse=True)
+            return [[] for _ in queries]
         
-        # Add rank
-        for i, doc in enumerate(scored_docs[:top_k]):
-            doc['rank'] = i + 1
+        with self._lock:
+            candidates = self.filters.select(search_filter, self.positions) if search_filter is not None else None
+            hits = [[(self.publications[doc_idx], score) for doc_idx, score in ranked]
+                    for ranked in self.index.search_many(queries, top_k=top_k, candidates=candidates)]
         
-        logger.debug(f"Found {len(scored_docs[:top_k])} relevant documents for query")
-        return scored_docs[:top_k]
+        all_results = [search_results(query_hits) for query_hits in hits]
+        logger.debug(f"Found {sum(len(results) for results in all_results)} relevant documents "
+                     f"for {len(queries)} queries")
+        return all_results
     
     def get_stats(self) -> Dict[str, Any]:
         """Get search statistics"""
         return {
-            'total_documents': len(self.publications),
-            'search_method': 'Simple Text Search',
+            'total_documents': len(self.positions),
+            'search_method': 'BM25 Inverted Index',
+            'index_terms': len(self.index.postings),
+            'tombstones': len(self.index.deleted),
+            'scoring': 'matrix' if self.index.compiled else 'postings',
             'initialized': self.is_initialized
         }
 
@@ -57,11 +57,19 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 
     // Form submission handling with loading state
-    const queryForm = document.querySelector('form[action*="ask_question"]');
+    const queryForm = document.querySelector('form[action*="ask"]');
+    const streamResult = document.getElementById('stream-result');
     if (queryForm) {
         queryForm.addEventListener('submit', function(e) {
             const submitBtn = this.querySelector('button[type="submit"]');
             
+            // Stream the answer in place when the browser supports Server-Sent Events
+            if (window.EventSource && streamResult && queryInput && queryInput.value.trim()) {
+                e.preventDefault();
+                streamAnswer(queryInput.value.trim(), submitBtn, queryForm);
+                return;
+            }
+            
             if (submitBtn) {
                 // Show loading state
                 submitBtn.innerHTML = '<i data-feather="loader"></i>';
@@ -85,7 +93,7 @@ document.addEventListener('DOMContentLoaded', function() {
         if ((e.ctrlKey || e.metaKey) && e.key === 'Enter' && queryInput === document.activeElement) {
             e.preventDefault();
             if (queryForm) {
-                queryForm.submit();
+                queryForm.requestSubmit();
             }
         }
         
@@ -123,6 +131,68 @@ function showToast(message, type = 'info') {
     }, 5000);
 }
 
+// Stream an answer from /api/ask/stream: sources arrive first, then the answer section by section
+function streamAnswer(query, submitBtn, fallbackForm) {
+    const result = document.getElementById('stream-result');
+    const answer = document.getElementById('stream-answer');
+    const sources = document.getElementById('stream-sources');
+    const timing = document.getElementById('stream-timing');
+    const submitHtml = submitBtn ? submitBtn.innerHTML : '';
+    let received = false;
+
+    answer.textContent = '';
+    sources.textContent = '';
+    timing.textContent = '';
+    result.classList.remove('d-none');
+    if (submitBtn) {
+        submitBtn.innerHTML = '<i data-feather="loader"></i>';
+        submitBtn.disabled = true;
+        feather.replace();
+    }
+
+    const finish = () => {
+        source.close();
+        if (submitBtn) {
+            submitBtn.innerHTML = submitHtml;
+            submitBtn.disabled = false;
+            feather.replace();
+        }
+    };
+
+    const source = new EventSource('/api/ask/stream?query=' + encodeURIComponent(query));
+
+    source.addEventListener('docs', function(e) {
+        received = true;
+        const data = JSON.parse(e.data);
+        if (data.retrieved_docs.length) {
+            sources.textContent = 'Sources: ' + data.retrieved_docs
+                .map(doc => doc.metadata.title + ' (' + doc.metadata.username + ')')
+                .join('; ');
+        }
+    });
+
+    source.addEventListener('token', function(e) {
+        answer.textContent += JSON.parse(e.data).text;
+    });
+
+    source.addEventListener('done', function(e) {
+        const data = JSON.parse(e.data);
+        timing.textContent = 'First byte ' + Math.round(data.ttfb * 1000) + ' ms · total ' +
+            Math.round(data.response_time * 1000) + ' ms';
+        finish();
+    });
+
+    source.addEventListener('error', function(e) {
+        finish();
+        if (e.data) {
+            showToast('Error processing your question: ' + JSON.parse(e.data).error, 'danger');
+        } else if (!received && fallbackForm) {
+            // The stream could not be opened; fall back to a regular form post
+            fallbackForm.submit();
+        }
+    });
+}
+
 // API call function for future enhancements
 async function askQuestion(query) {
     try {
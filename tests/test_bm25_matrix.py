@@ -0,0 +1,54 @@
+import copy
+
+import numpy as np
+import pytest
+
+import inverted_index
+from benchmarks.bench_bm25_matrix import same_ranking
+from benchmarks.corpus import SyntheticCorpus
+from inverted_index import InvertedIndex
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    return SyntheticCorpus(seed=7)
+
+
+@pytest.fixture(scope='module')
+def indexes(corpus):
+    """A compiled index (matrix scoring) and an uncompiled copy sharing its postings (posting-list walk)"""
+    index = InvertedIndex()
+    for pub in corpus.publications(400, description_words=80):
+        index.add_document(f"{pub.title} {pub.description}")
+    for doc_idx in range(0, 400, 9):
+        index.remove_document(doc_idx)
+    walker = copy.copy(index)
+    index.compile()
+    assert index.compiled and not walker.compiled
+    return index, walker
+
+
+@pytest.fixture(autouse=True)
+def always_use_matrix(monkeypatch):
+    monkeypatch.setattr(inverted_index, 'MATRIX_MIN_POSTINGS', 0)
+
+
+def test_matrix_scores_equal_postings_walk(corpus, indexes):
+    index, walker = indexes
+    queries = corpus.workload('head', 20) + corpus.workload('tail', 20)
+    for batch in (1, 8):
+        for offset in range(0, len(queries), batch):
+            expected = walker.search_many(queries[offset:offset + batch], top_k=400)
+            actual = index.search_many(queries[offset:offset + batch], top_k=400)
+            for query, want, got in zip(queries[offset:offset + batch], expected, actual):
+                assert same_ranking(want, got), query
+
+
+def test_matrix_scores_equal_postings_walk_within_candidates(corpus, indexes):
+    index, walker = indexes
+    candidates = np.arange(3, 400, 4, dtype=np.int64)
+    for query in corpus.workload('head', 10):
+        want = walker.search(query, top_k=50, candidates=candidates)
+        got = index.search(query, top_k=50, candidates=candidates)
+        assert same_ranking(want, got), query
+        assert all(doc_idx in set(candidates.tolist()) for doc_idx, _ in got)
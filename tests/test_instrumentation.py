@@ -0,0 +1,39 @@
+import re
+import time
+
+from flask import Flask, Response, stream_with_context
+
+from instrumentation import instrument_app, metrics, span
+
+
+def _sample(text: str, name: str, **labels: str) -> float:
+    label_text = ','.join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+    match = re.search(rf'^{name}{{{re.escape(label_text)}}} (\S+)$', text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_streamed_request_is_timed_until_its_body_is_sent():
+    app = Flask(__name__)
+    instrument_app(app)
+
+    @app.route('/stream')
+    def stream():
+        def generate():
+            with span('test_stream_stage'):
+                time.sleep(0.05)
+            yield 'event: done\ndata: {}\n\n'
+        return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
+    @app.route('/metrics')
+    def render_metrics():
+        return Response(metrics.render(), mimetype='text/plain')
+
+    client = app.test_client()
+    with client.get('/stream') as response:
+        assert response.get_data(as_text=True).startswith('event: done')
+
+    text = client.get('/metrics').get_data(as_text=True)
+    assert _sample(text, 'rag_http_request_seconds_count', endpoint='stream') == 1
+    assert _sample(text, 'rag_http_request_seconds_sum', endpoint='stream') >= 0.05
+    assert _sample(text, 'rag_http_requests_total', endpoint='stream', status='200') == 1
+    assert _sample(text, 'rag_stage_seconds_count', stage='test_stream_stage') == 1
@@ -0,0 +1,75 @@
+import random
+from collections import namedtuple
+from datetime import datetime, timedelta
+from itertools import product
+
+import pytest
+
+from metadata_filter import FilterIndex, SearchFilter
+
+START = datetime(2024, 1, 1)
+USERNAMES = ['ada', 'bob', 'cy', 'dee']
+LICENSES = ['mit', 'cc-by', '']
+Record = namedtuple('Record', 'username license')
+
+
+@pytest.fixture(scope='module')
+def records():
+    rng = random.Random(3)
+    return [(f"pub{i}", rng.choice(USERNAMES), rng.choice(LICENSES),
+             None if i % 11 == 0 else START + timedelta(days=rng.randrange(60)))
+            for i in range(300)]
+
+
+@pytest.fixture(scope='module')
+def filters(records):
+    index = FilterIndex()
+    for _, username, license, created_at in records:
+        index.add(username, license, created_at)
+    return index
+
+
+def naive_select(records, search_filter: SearchFilter):
+    allowed = []
+    for position, (pub_id, username, license, created_at) in enumerate(records):
+        if search_filter.ids and pub_id not in search_filter.ids:
+            continue
+        if search_filter.usernames and username not in search_filter.usernames:
+            continue
+        if search_filter.licenses and license not in search_filter.licenses:
+            continue
+        if search_filter.created_after is not None or search_filter.created_before is not None:
+            if created_at is None:
+                continue
+            if search_filter.created_after is not None and created_at < search_filter.created_after:
+                continue
+            if search_filter.created_before is not None and created_at >= search_filter.created_before:
+                continue
+        allowed.append(position)
+    return allowed
+
+
+ID_CHOICES = [frozenset(), frozenset({'pub0', 'pub5', 'pub42', 'pub299', 'missing'})]
+USERNAME_CHOICES = [frozenset(), frozenset({'ada'}), frozenset({'bob', 'cy'}), frozenset({'nobody'})]
+LICENSE_CHOICES = [frozenset(), frozenset({''}), frozenset({'mit', 'cc-by'})]
+AFTER_CHOICES = [None, START + timedelta(days=20)]
+BEFORE_CHOICES = [None, START + timedelta(days=45)]
+
+
+@pytest.mark.parametrize('ids,usernames,licenses,created_after,created_before',
+                         list(product(ID_CHOICES, USERNAME_CHOICES, LICENSE_CHOICES, AFTER_CHOICES, BEFORE_CHOICES)))
+def test_select_equals_naive_filter(records, filters, ids, usernames, licenses, created_after, created_before):
+    search_filter = SearchFilter(usernames, licenses, ids, created_after, created_before)
+    positions = {pub_id: position for position, (pub_id, *_) in enumerate(records)}
+    assert filters.select(search_filter, positions).tolist() == naive_select(records, search_filter)
+
+
+def test_compacted_select_equals_naive_filter(records, filters):
+    keep = [position for position in range(len(records)) if position % 3]
+    kept = [records[position] for position in keep]
+
+    compacted = filters.compacted(keep, [Record(username, license) for _, username, license, _ in kept])
+    positions = {pub_id: position for position, (pub_id, *_) in enumerate(kept)}
+    search_filter = SearchFilter(frozenset({'ada', 'dee'}), frozenset({'mit'}), frozenset(),
+                                 START + timedelta(days=10), None)
+    assert compacted.select(search_filter, positions).tolist() == naive_select(kept, search_filter)
@@ -0,0 +1,19 @@
+import pytest
+
+from benchmarks.bench_clean import fuzz_mismatches, legacy_clean_description
+from text_cleaning import clean_description
+
+
+@pytest.mark.parametrize('text', ["`#` heading", "**#**  x", "--DIV![a](b)IDER--", ":::you`tube`[a]{b}",
+                                  "![a](--DIVIDER--)", "# **bold** and *italic* with `code`\n\n\n\nnext"])
+def test_overlapping_markers_clean_like_the_legacy_cleaner(text):
+    assert clean_description(text) == legacy_clean_description(text)
+
+
+def test_random_markup_cleans_like_the_legacy_cleaner():
+    assert fuzz_mismatches(5000) == 0
+
+
+def test_long_description_is_truncated_like_the_legacy_cleaner():
+    text = "\n".join(f"## Section {i}\n**bold** `code` ![img](x.png) --DIVIDER--" for i in range(2000))
+    assert clean_description(text) == legacy_clean_description(text)
@@ -0,0 +1,83 @@
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional
+
+MAX_DESCRIPTION_LENGTH = 5000  # Keeps chunk sizes manageable
+
+# Every pattern below except BLANK_LINES is confined to a single line, which
+# is what makes cleaning a line-aligned prefix of a long description safe.
+# The passes run one after another in the legacy order (images, dividers,
+# bold, italic, code, headers, YouTube embeds) and are never merged: stripping
+# one kind of markup can create or break the markers of a later pass, so e.g.
+# "`#` heading" becomes "heading" and "--DIV![a](b)IDER--" a paragraph break.
+_IMAGES = re.compile(r'!\[.*?\]\(.*?\)')
+_BOLD = re.compile(r'\*\*(.*?)\*\*')
+_ITALIC = re.compile(r'\*(.*?)\*')
+_CODE = re.compile(r'`(.*?)`')
+_HEADERS = re.compile(r'#+ ')
+_YOUTUBE = re.compile(r':::youtube\[.*?\]\{.*?\}')
+_BLANK_LINES = re.compile(r'\n\s*\n')
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys: NFC unicode with collapsed whitespace"""
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+def _clean(text: str) -> str:
+    # Markers are only searched for when present; most descriptions have no inline code
+    cleaned = _IMAGES.sub('', text) if '![' in text else text
+    cleaned = cleaned.replace('--DIVIDER--', '\n\n')
+    if '*' in cleaned:
+        cleaned = _ITALIC.sub(r'\1', _BOLD.sub(r'\1', cleaned))
+    if '`' in cleaned:
+        cleaned = _CODE.sub(r'\1', cleaned)
+    cleaned = _HEADERS.sub('', cleaned)
+    if ':::' in cleaned:
+        cleaned = _YOUTUBE.sub('', cleaned)
+    return _BLANK_LINES.sub('\n\n', cleaned).strip()
+
+
+def _safe_cut(text: str, start: int) -> int:
+    """First line break at or after start that follows a non-space character, or -1"""
+    cut = text.find('\n', start)
+    while cut != -1 and text[cut - 1].isspace():
+        cut = text.find('\n', cut + 1)
+    return cut
+
+
+def clean_description(description: Optional[str], max_length: int = MAX_DESCRIPTION_LENGTH) -> str:
+    """Strip markdown, images and embeds from a description and truncate it
+
+    Long descriptions are cleaned a line-aligned prefix at a time, so only
+    about as much text as the truncated result needs is ever processed.
+    """
+    if not description:
+        return ""
+
+    budget = 2 * max_length
+    while budget < len(description):
+        cut = _safe_cut(description, budget)
+        if cut == -1:
+            break
+        cleaned = _clean(description[:cut])
+        if len(cleaned) > max_length:
+            return cleaned[:max_length] + "..."
+        budget *= 2
+
+    cleaned = _clean(description)
+    if len(cleaned) > max_length:
+        cleaned = cleaned[:max_length] + "..."
+    return cleaned
+
+
+def clean_descriptions(descriptions: Iterable[Optional[str]], workers: int = 1,
+                       chunksize: int = 64, executor: Optional[ProcessPoolExecutor] = None) -> List[str]:
+    """Clean many descriptions, spreading them across processes when workers > 1"""
+    if executor is not None:
+        return list(executor.map(clean_description, descriptions, chunksize=chunksize))
+    if workers <= 1:
+        return [clean_description(description) for description in descriptions]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(clean_description, descriptions, chunksize=chunksize))
@@ -1,79 +1,368 @@
 import os
 import logging
-import pickle
-from typing import List, Dict, Any, Optional
+import threading
+import time
+from itertools import chain
+from typing import List, Dict, Any, Iterable, Optional, Set
 import faiss
 import numpy as np
-from openai import OpenAI
+from chunk_store import ChunkStore
+from embedding_cache import EmbeddingCache
+from embedding_pipeline import EmbedBatchFn, EmbeddingIngestor
+from llm_generation import openai_client
 
 logger = logging.getLogger(__name__)
 
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+TRAINED_INDEX_TYPES = ('ivf_flat', 'ivf_pq')
+MIN_POINTS_PER_CENTROID = 39  # Below this FAISS k-means warns and clusters poorly
+# Filtered searches selecting at most this many chunks of an ID-mapped index compare them exactly;
+# a graph walk restricted by a selective IDSelector strands on unselected nodes and misses neighbours
+FILTER_EXACT_MAX = 4096
+
+def build_faiss_index(index_type: str, dim: int, metric: str = 'l2', nlist: int = 1024,
+                      pq_m: int = 64, pq_bits: int = 8, hnsw_m: int = 32,
+                      ef_construction: int = 200) -> "faiss.Index":
+    """Create an empty FAISS index of the requested type"""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+    if metric not in ('l2', 'ip'):
+        raise ValueError(f"Unknown metric '{metric}', expected 'l2' or 'ip'")
+    metric_type = faiss.METRIC_INNER_PRODUCT if metric == 'ip' else faiss.METRIC_L2
+    
+    if index_type == 'flat':
+        return faiss.IndexFlatIP(dim) if metric == 'ip' else faiss.IndexFlatL2(dim)
+    if index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, metric_type)
+        index.hnsw.efConstruction = ef_construction
+        return index
+    
+    quantizer = faiss.IndexFlatIP(dim) if metric == 'ip' else faiss.IndexFlatL2(dim)
+    if index_type == 'ivf_flat':
+        return faiss.IndexIVFFlat(quantizer, dim, nlist, metric_type)
+    # PQ sub-quantizers must divide the dimension; use the closest divisor not above pq_m
+    pq_m = max(m for m in range(1, min(pq_m, dim) + 1) if dim % m == 0)
+    return faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, pq_bits, metric_type)
+
 class VectorStore:
     """FAISS-based vector store for document embeddings"""
     
-    def __init__(self):
-        self.openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY", "your-api-key-here"))
+    def __init__(self, embedder: Optional[EmbedBatchFn] = None, cache: Optional[EmbeddingCache] = None,
+                 index_type: Optional[str] = None, metric: Optional[str] = None):
         self.index = None
-        self.documents = []
+        self.index_type = index_type or os.environ.get("VECTOR_INDEX_TYPE", "flat")
+        self.metric = metric or os.environ.get("VECTOR_METRIC", "l2")  # 'ip' = cosine on normalized vectors
+        self.nlist = int(os.environ.get("VECTOR_NLIST", 1024))
+        self.pq_m = int(os.environ.get("VECTOR_PQ_M", 64))
+        self.pq_bits = int(os.environ.get("VECTOR_PQ_BITS", 8))
+        self.hnsw_m = int(os.environ.get("VECTOR_HNSW_M", 32))
+        self.nprobe = int(os.environ.get("VECTOR_NPROBE", 16))
+        self.ef_search = int(os.environ.get("VECTOR_EF_SEARCH", 64))
+        self.train_sample_size = int(os.environ.get("VECTOR_TRAIN_SAMPLE", 50000))
+        self.documents: Dict[int, Dict[str, Any]] = {}  # FAISS id -> chunk (a ChunkStore once saved)
+        self._pub_chunks: Optional[Dict[str, List[int]]] = {}  # Publication ID -> FAISS ids of its chunks
+        self.tombstones: Set[int] = set()  # Deleted FAISS ids not yet compacted away
+        self.next_id = 0
+        self._lock = threading.RLock()
         self.embeddings_dim = 1536  # OpenAI text-embedding-3-small dimension
+        self.embedding_model = "text-embedding-3-small"
         self.index_file = "vector_store.faiss"
-        self.docs_file = "documents.pkl"
+        self.docs_file = "documents.chunks"
+        self.embedder = embedder or self.embed_texts
+        self.embedding_cache = cache or EmbeddingCache(
+            os.environ.get("EMBEDDING_CACHE_PATH", "embedding_cache.db"),
+            model=self.embedding_model,
+            query_capacity=int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", 1024))
+        )
+        self.ingestor = EmbeddingIngestor(
+            self.embedder,
+            batch_size=int(os.environ.get("EMBEDDING_BATCH_SIZE", 100)),
+            max_concurrency=int(os.environ.get("EMBEDDING_CONCURRENCY", 4)),
+            requests_per_minute=float(os.environ.get("EMBEDDING_RPM", 3000)),
+            tokens_per_minute=float(os.environ.get("EMBEDDING_TPM", 1000000)),
+            dimension=self.embeddings_dim,
+            cache=self.embedding_cache
+        )
+    
+    @property
+    def pub_chunks(self) -> Dict[str, List[int]]:
+        """Publication ID -> FAISS ids, grouped lazily after loading so startup stays cheap"""
+        if self._pub_chunks is None:
+            if isinstance(self.documents, ChunkStore):
+                self._pub_chunks = self.documents.pub_chunks()
+            else:
+                self._pub_chunks = {}
+                for doc_id, doc in self.documents.items():
+                    self._pub_chunks.setdefault(self._pub_id(doc), []).append(doc_id)
+        return self._pub_chunks
+    
+    @pub_chunks.setter
+    def pub_chunks(self, value: Optional[Dict[str, List[int]]]):
+        self._pub_chunks = value
+    
+    @property
+    def openai_client(self):
+        """The process-wide OpenAI client, shared with answer generation"""
+        return openai_client()
+    
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """Get embeddings for a batch of texts in a single OpenAI request"""
+        response = self.openai_client.embeddings.create(
+            model=self.embedding_model,
+            input=texts
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
     
     def get_embedding(self, text: str) -> List[float]:
         """Get embedding for a text using OpenAI API"""
         try:
-            response = self.openai_client.embeddings.create(
-                model="text-embedding-3-small",
-                input=text
-            )
-            return response.data[0].embedding
+            return self.embedder([text])[0]
         except Exception as e:
             logger.error(f"Error getting embedding: {e}")
             return [0.0] * self.embeddings_dim
     
-    def create_index(self, documents: List[Dict[str, Any]]):
-        """Create FAISS index from documents"""
-        logger.info(f"Creating vector index for {len(documents)} documents")
+    def get_query_embedding(self, query: str) -> List[float]:
+        """Get a query embedding, reusing recently asked queries from the cache"""
+        return self.get_query_embeddings([query])[0]
+    
+    def get_query_embeddings(self, queries: List[str]) -> List[List[float]]:
+        """Embed several queries, fetching the ones not in the cache with a single request"""
+        embeddings = [self.embedding_cache.get_query(query) for query in queries]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if not missing:
+            return embeddings
+        try:
+            fetched = self.embedder([queries[i] for i in missing])
+        except Exception as e:
+            logger.error(f"Error getting query embedding: {e}")
+            for i in missing:
+                embeddings[i] = [0.0] * self.embeddings_dim
+            return embeddings
+        for i, embedding in zip(missing, fetched):
+            embeddings[i] = embedding
+            self.embedding_cache.put_query(queries[i], embedding)
+        return embeddings
+    
+    def create_index(self, documents: Iterable[Dict[str, Any]]):
+        """Create FAISS index from documents, streaming batched embeddings into it
+
+        ``documents`` may be a lazy iterator; chunks are pulled only as fast
+        as they are embedded.
+        """
+        logger.info(f"Creating {self.index_type} vector index")
+        documents_by_id: Dict[int, Dict[str, Any]] = {}
         
-        # Generate embeddings for all documents with rate limiting
-        embeddings = []
-        self.documents = documents
+        def record(doc_stream):
+            for doc in doc_stream:
+                documents_by_id[len(documents_by_id)] = doc
+                yield doc
         
-        import time
-        for i, doc in enumerate(documents):
-            if i % 5 == 0:
-                logger.info(f"Processing document {i+1}/{len(documents)}")
-                # Add delay to respect rate limits
-                if i > 0:
-                    time.sleep(1)
-            
-            try:
-                embedding = self.get_embedding(doc['text'])
-                embeddings.append(embedding)
-            except Exception as e:
-                logger.warning(f"Failed to get embedding for document {i}: {e}")
-                # Use zero vector as fallback
-                embeddings.append([0.0] * self.embeddings_dim)
+        # Trained index types buffer the first vectors as their training sample
+        index = None
+        buffered = []
+        buffered_count = 0
+        offset = 0
+        start_time = time.perf_counter()
+        for embeddings_array in self._embed_documents(record(documents)):
+            batch_ids = np.arange(offset, offset + len(embeddings_array), dtype=np.int64)
+            offset += len(embeddings_array)
+            if index is not None:
+                index.add_with_ids(embeddings_array, batch_ids)
+            else:
+                buffered.append(embeddings_array)
+                buffered_count += len(embeddings_array)
+                if self.index_type not in TRAINED_INDEX_TYPES or buffered_count >= self.train_sample_size:
+                    index = self._start_index(np.vstack(buffered), np.arange(buffered_count, dtype=np.int64))
+                    buffered = []
+            logger.info(f"Indexed {offset} documents")
         
-        # Convert to numpy array
-        embeddings_array = np.array(embeddings, dtype=np.float32)
+        if index is None:
+            sample = np.vstack(buffered) if buffered else np.zeros((0, self.embeddings_dim), dtype=np.float32)
+            index = self._start_index(sample, np.arange(len(sample), dtype=np.int64))
         
-        # Create FAISS index
-        self.index = faiss.IndexFlatL2(self.embeddings_dim)
-        self.index.add(embeddings_array)
+        with self._lock:
+            self.index = index
+            self.documents = documents_by_id
+            self.pub_chunks = None
+            self.tombstones = set()
+            self.next_id = len(documents_by_id)
         
-        logger.info(f"Created FAISS index with {self.index.ntotal} vectors")
+        elapsed = time.perf_counter() - start_time
+        rate = index.ntotal / elapsed if elapsed else 0.0
+        logger.info(f"Created FAISS index with {index.ntotal} vectors in {elapsed:.1f}s ({rate:.1f} docs/s)")
         
         # Save index and documents
         self.save_index()
     
+    def upsert_documents(self, documents: Iterable[Dict[str, Any]]):
+        """Replace the chunks of the given documents' publications without rebuilding the index"""
+        documents = list(documents)
+        if not documents:
+            return
+        if self.index is None:
+            self.create_index(documents)
+            return
+        
+        # Embed outside the lock; unchanged chunks come straight from the embedding cache
+        vectors = list(self._embed_documents(documents))
+        with self._lock:
+            self._tombstone_publications({self._pub_id(doc) for doc in documents})
+            ids = np.arange(self.next_id, self.next_id + len(documents), dtype=np.int64)
+            self.next_id += len(documents)
+            self.index.add_with_ids(np.vstack(vectors), ids)
+            for doc_id, doc in zip(ids.tolist(), documents):
+                self.documents[doc_id] = doc
+                self.pub_chunks.setdefault(self._pub_id(doc), []).append(doc_id)
+        logger.info(f"Upserted {len(documents)} chunks into the vector index")
+    
+    def delete_publications(self, pub_ids: Iterable[str]):
+        """Tombstone every chunk of the given publications"""
+        with self._lock:
+            removed = self._tombstone_publications(pub_ids)
+        if removed:
+            logger.info(f"Tombstoned {removed} chunks in the vector index")
+    
+    def _tombstone_publications(self, pub_ids: Iterable[str]) -> int:
+        removed = 0
+        for pub_id in pub_ids:
+            for doc_id in self.pub_chunks.pop(pub_id, []):
+                self.documents.pop(doc_id, None)
+                self.tombstones.add(doc_id)
+                removed += 1
+        return removed
+    
+    def compact(self, max_tombstone_ratio: float = 0.2) -> bool:
+        """Physically drop tombstoned vectors once they exceed the given share of the index"""
+        with self._lock:
+            if self.index is None or not self.tombstones:
+                return False
+            if len(self.tombstones) <= max_tombstone_ratio * self.index.ntotal:
+                return False
+            removed = len(self.tombstones)
+            if self._index_kind() == 'hnsw':
+                # HNSW graphs cannot delete in place, so rebuild from the stored vectors
+                live_ids = np.array(sorted(self.documents), dtype=np.int64)
+                vectors = np.vstack([self.index.reconstruct(int(doc_id)) for doc_id in live_ids]) if len(live_ids) \
+                    else np.zeros((0, self.embeddings_dim), dtype=np.float32)
+                self.index = self._start_index(vectors, live_ids)
+            else:
+                self.index.remove_ids(np.fromiter(self.tombstones, dtype=np.int64))
+            self.tombstones = set()
+        logger.info(f"Compacted vector index, dropped {removed} tombstoned vectors")
+        self.save_index()
+        return True
+    
+    def indexed_ids(self) -> Set[str]:
+        """IDs of the publications that have chunks in the index"""
+        with self._lock:
+            return set(self.pub_chunks)
+    
+    @staticmethod
+    def _pub_id(doc: Dict[str, Any]) -> str:
+        return doc.get('metadata', {}).get('pub_id') or doc['id']
+    
+    def _embed_documents(self, documents: Iterable[Dict[str, Any]]):
+        """Yield prepared embedding batches for the documents, in order"""
+        for vectors in self.ingestor.iter_embeddings(doc['text'] for doc in documents):
+            yield self._prepare_vectors(vectors)
+    
+    def _prepare_vectors(self, vectors) -> np.ndarray:
+        """Convert embeddings to float32, normalizing them for inner-product search"""
+        embeddings_array = np.array(vectors, dtype=np.float32)
+        if embeddings_array.ndim == 1:
+            embeddings_array = embeddings_array.reshape(1, -1)
+        if self.metric == 'ip':
+            faiss.normalize_L2(embeddings_array)
+        return embeddings_array
+    
+    def _start_index(self, sample: np.ndarray, sample_ids: np.ndarray) -> "faiss.Index":
+        """Build the configured index keyed by FAISS id, train it on the sample and add the sample"""
+        if sample.shape[1]:
+            # Size the index from the embedder so injected models work too
+            self.embeddings_dim = sample.shape[1]
+            self.ingestor.dimension = self.embeddings_dim
+        
+        index_type = self.index_type
+        nlist = min(self.nlist, max(1, len(sample) // MIN_POINTS_PER_CENTROID))
+        if index_type == 'ivf_pq' and len(sample) < 2 ** self.pq_bits:
+            logger.warning(f"Only {len(sample)} training vectors for IVF-PQ, falling back to a flat index")
+            index_type = 'flat'
+        elif index_type in TRAINED_INDEX_TYPES and len(sample) == 0:
+            index_type = 'flat'
+        
+        index = build_faiss_index(index_type, self.embeddings_dim, metric=self.metric, nlist=nlist,
+                                  pq_m=self.pq_m, pq_bits=self.pq_bits, hnsw_m=self.hnsw_m)
+        if index_type not in TRAINED_INDEX_TYPES:
+            # IVF indexes store external ids natively; the others need an ID map
+            index = faiss.IndexIDMap2(index)
+        if not index.is_trained:
+            logger.info(f"Training {index_type} index ({nlist} lists) on {len(sample)} vectors")
+            index.train(sample)
+        self._apply_search_defaults(index)
+        if len(sample):
+            index.add_with_ids(sample, sample_ids)
+        return index
+    
+    @staticmethod
+    def _base_index(index) -> "faiss.Index":
+        """The index wrapped by the ID map"""
+        if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+            return faiss.downcast_index(index.index)
+        return index
+    
+    def _index_kind(self) -> str:
+        base = self._base_index(self.index)
+        if hasattr(base, 'hnsw'):
+            return 'hnsw'
+        return 'ivf' if faiss.try_extract_index_ivf(base) is not None else 'flat'
+    
+    def _apply_search_defaults(self, index):
+        """Set the default nprobe/efSearch on an index"""
+        base = self._base_index(index)
+        ivf = faiss.try_extract_index_ivf(base)
+        if ivf is not None:
+            ivf.nprobe = self.nprobe
+        if hasattr(base, 'hnsw'):
+            base.hnsw.efSearch = self.ef_search
+    
+    def _search_params(self, nprobe: Optional[int], ef_search: Optional[int], selector=None):
+        """Per-query search parameters, or None to use the index defaults
+
+        A ``selector`` (a FAISS IDSelector over external ids) limits the search to those vectors.
+        """
+        kind = self._index_kind()
+        if kind == 'ivf' and (nprobe is not None or selector is not None):
+            params = faiss.SearchParametersIVF(nprobe=self.nprobe if nprobe is None else nprobe)
+        elif kind == 'hnsw' and (ef_search is not None or selector is not None):
+            params = faiss.SearchParametersHNSW(efSearch=self.ef_search if ef_search is None else ef_search)
+        elif selector is not None:
+            params = faiss.SearchParameters()
+        else:
+            return None
+        if selector is not None:
+            params.sel = selector
+        return params
+    
     def load_index(self) -> bool:
-        """Load existing FAISS index and documents"""
+        """Load existing FAISS index and memory-map the chunk store"""
         try:
             if os.path.exists(self.index_file) and os.path.exists(self.docs_file):
-                self.index = faiss.read_index(self.index_file)
-                with open(self.docs_file, 'rb') as f:
-                    self.documents = pickle.load(f)
+                index = faiss.read_index(self.index_file)
+                id_mapped = isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)) or \
+                    faiss.try_extract_index_ivf(index) is not None
+                if not id_mapped:
+                    logger.warning("Vector index predates incremental updates, it needs to be rebuilt")
+                    return False
+                documents = ChunkStore.open(self.docs_file)
+                with self._lock:
+                    self.index = index
+                    self.metric = 'ip' if index.metric_type == faiss.METRIC_INNER_PRODUCT else 'l2'
+                    self.embeddings_dim = index.d
+                    self._apply_search_defaults(index)
+                    self.documents = documents
+                    self.pub_chunks = None
+                    self.tombstones = documents.tombstones
+                    self.next_id = documents.next_id
                 logger.info(f"Loaded FAISS index with {len(self.documents)} documents")
                 return True
         except Exception as e:
@@ -81,51 +370,112 @@ class VectorStore:
         return False
     
     def save_index(self):
-        """Save FAISS index and documents"""
+        """Save FAISS index and documents, then map the saved chunk store"""
         try:
-            if self.index is not None:
-                faiss.write_index(self.index, self.index_file)
-                with open(self.docs_file, 'wb') as f:
-                    pickle.dump(self.documents, f)
-                logger.info("Saved FAISS index and documents")
+            with self._lock:
+                if self.index is not None:
+                    faiss.write_index(self.index, self.index_file)
+                    ChunkStore.write(self.docs_file, self.documents, self.tombstones, self.next_id)
+                    # Serve from the mapped file so chunk texts stop occupying the heap
+                    self.documents = ChunkStore.open(self.docs_file)
+                    logger.info("Saved FAISS index and documents")
         except Exception as e:
             logger.error(f"Error saving index: {e}")
     
-    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
-        """Search for similar documents"""
+    def search(self, query: str, k: int = 5, nprobe: Optional[int] = None,
+               ef_search: Optional[int] = None, pub_ids: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """Search for similar documents
+
+        ``score`` is an L2 distance (lower is closer) or, with the 'ip' metric,
+        a cosine similarity (higher is closer). ``nprobe``/``ef_search``
+        override the IVF/HNSW accuracy-speed trade-off for this query.
+        ``pub_ids`` restricts the search to the chunks of those publications.
+        """
+        return self.search_many([query], k, nprobe=nprobe, ef_search=ef_search, pub_ids=pub_ids)[0]
+    
+    def search_many(self, queries: List[str], k: int = 5, nprobe: Optional[int] = None,
+                    ef_search: Optional[int] = None,
+                    pub_ids: Optional[Iterable[str]] = None) -> List[List[Dict[str, Any]]]:
+        """Search for several queries with one embedding request and one batched index search
+
+        With ``pub_ids``, an IDSelector over their chunks' FAISS ids is passed
+        to the index, which skips every other vector while searching instead
+        of filtering ranked results afterwards. Up to FILTER_EXACT_MAX selected
+        chunks of a flat or HNSW index are instead reconstructed and compared
+        directly, which is exact and cheaper than a walk over the whole index.
+        """
         if self.index is None:
             logger.error("Index not loaded")
+            return [[] for _ in queries]
+        if not queries:
             return []
         
         try:
-            # Get query embedding
-            query_embedding = self.get_embedding(query)
-            query_vector = np.array([query_embedding], dtype=np.float32)
+            # Get query embeddings
+            query_vectors = self._prepare_vectors(self.get_query_embeddings(queries))
+            # A zero vector means the embedding request failed and would return arbitrary neighbours
+            embedded = query_vectors.any(axis=1).tolist()
             
-            # Search
-            distances, indices = self.index.search(query_vector, k)
+            with self._lock:
+                selector = None
+                if pub_ids is None:
+                    # Over-fetch so tombstoned vectors can be skipped
+                    fetch = min(k + len(self.tombstones), self.index.ntotal)
+                else:
+                    # Tombstoned chunks are no longer listed per publication, so never selected
+                    pub_chunks = self.pub_chunks
+                    chunk_ids = np.fromiter(chain.from_iterable(pub_chunks.get(pub_id, ()) for pub_id in pub_ids),
+                                            dtype=np.int64)
+                    fetch = min(k, len(chunk_ids))
+                    if fetch > 0:
+                        selector = faiss.IDSelectorBatch(chunk_ids)
+                if fetch <= 0:
+                    return [[] for _ in queries]
+                if selector is not None and len(chunk_ids) <= FILTER_EXACT_MAX and \
+                        isinstance(self.index, faiss.IndexIDMap2):
+                    metric = faiss.METRIC_INNER_PRODUCT if self.metric == 'ip' else faiss.METRIC_L2
+                    distances, rows = faiss.knn(query_vectors, self.index.reconstruct_batch(chunk_ids), fetch,
+                                                metric=metric)
+                    indices = np.where(rows >= 0, chunk_ids[rows], -1)
+                else:
+                    distances, indices = self.index.search(query_vectors, fetch,
+                                                           params=self._search_params(nprobe, ef_search, selector))
+                documents = self.documents
             
-            # Return results
-            results = []
-            for i, (distance, idx) in enumerate(zip(distances[0], indices[0])):
-                if idx < len(self.documents):
-                    doc = self.documents[idx].copy()
-                    doc['score'] = float(distance)
-                    doc['rank'] = i + 1
+            # Return results, materializing chunk text only for the hits that are kept
+            all_results = []
+            for row, ok in enumerate(embedded):
+                results = []
+                for distance, idx in zip(distances[row].tolist(), indices[row].tolist()) if ok else ():
+                    document = documents.get(idx) if idx >= 0 else None
+                    if document is None:
+                        continue
+                    doc = document.copy()
+                    doc['score'] = distance
+                    doc['rank'] = len(results) + 1
                     results.append(doc)
+                    if len(results) == k:
+                        break
+                all_results.append(results)
             
-            logger.debug(f"Found {len(results)} similar documents for query")
-            return results
+            logger.debug(f"Found {sum(len(results) for results in all_results)} similar documents "
+                         f"for {len(queries)} queries")
+            return all_results
             
         except Exception as e:
             logger.error(f"Error searching: {e}")
-            return []
+            return [[] for _ in queries]
     
     def get_stats(self) -> Dict[str, Any]:
         """Get vector store statistics"""
         return {
             'total_documents': len(self.documents) if self.documents else 0,
             'index_size': self.index.ntotal if self.index else 0,
+            'tombstones': len(self.tombstones),
             'embedding_dimension': self.embeddings_dim,
-            'index_loaded': self.index is not None
+            'index_type': self.index_type,
+            'metric': self.metric,
+            'index_loaded': self.index is not None,
+            'ingestion': self.ingestor.get_stats(),
+            'embedding_cache': self.embedding_cache.get_stats()
         }